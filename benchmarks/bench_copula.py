@@ -0,0 +1,63 @@
+from empirical_copula import (
+    empirical_joint_pmf_details,
+    empirical_joint_pmf_from_codes,
+    joint_counts,
+)
+from empirical_copula.codes import factorize
+
+from .common import CARDINALITIES, DTYPES, MAX_DENSE_CELLS, SAMPLE_SIZES, make_samples
+
+
+class JointCounts:
+    params = [SAMPLE_SIZES, CARDINALITIES, DTYPES, [False, True]]
+    param_names = ['n_samples', 'cardinality', 'dtype', 'sparse']
+    timeout = 600
+
+    def setup(self, n_samples, cardinality, dtype, sparse):
+        if not sparse and cardinality ** 2 > MAX_DENSE_CELLS:
+            raise NotImplementedError('dense table too large')
+        self.samples = make_samples(n_samples, cardinality, dtype)
+
+    def time_joint_counts(self, n_samples, cardinality, dtype, sparse):
+        joint_counts(self.samples, sparse=sparse)
+
+    def peakmem_joint_counts(self, n_samples, cardinality, dtype, sparse):
+        joint_counts(self.samples, sparse=sparse)
+
+
+class EmpiricalJointPmfDetails:
+    params = [SAMPLE_SIZES, CARDINALITIES, DTYPES, [False, True]]
+    param_names = ['n_samples', 'cardinality', 'dtype', 'sparse']
+    timeout = 600
+
+    def setup(self, n_samples, cardinality, dtype, sparse):
+        if not sparse and cardinality ** 2 > MAX_DENSE_CELLS:
+            raise NotImplementedError('dense table too large')
+        self.samples = make_samples(n_samples, cardinality, dtype)
+
+    def time_empirical_joint_pmf_details(self, n_samples, cardinality, dtype, sparse):
+        empirical_joint_pmf_details(self.samples, sparse=sparse)
+
+    def peakmem_empirical_joint_pmf_details(self, n_samples, cardinality, dtype, sparse):
+        empirical_joint_pmf_details(self.samples, sparse=sparse)
+
+
+class EmpiricalJointPmfFromCodes:
+    params = [SAMPLE_SIZES, CARDINALITIES, [False, True]]
+    param_names = ['n_samples', 'cardinality', 'sparse']
+    timeout = 600
+
+    def setup(self, n_samples, cardinality, sparse):
+        if not sparse and cardinality ** 2 > MAX_DENSE_CELLS:
+            raise NotImplementedError('dense table too large')
+        samples = make_samples(n_samples, cardinality, 'int')
+        self.codes1, self.categories1 = factorize(samples['x'])
+        self.codes2, self.categories2 = factorize(samples['y'])
+
+    def time_empirical_joint_pmf_from_codes(self, n_samples, cardinality, sparse):
+        empirical_joint_pmf_from_codes(self.codes1, self.codes2, self.categories1,
+                                       self.categories2, sparse=sparse)
+
+    def peakmem_empirical_joint_pmf_from_codes(self, n_samples, cardinality, sparse):
+        empirical_joint_pmf_from_codes(self.codes1, self.codes2, self.categories1,
+                                       self.categories2, sparse=sparse)
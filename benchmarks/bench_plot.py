@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+
+from empirical_copula import empirical_joint_pmf  # noqa: E402
+from empirical_copula.plot import (  # noqa: E402
+    copula_pcolormesh, render_copula_figures, significance_copula_pcolormesh,
+)
+from empirical_copula.significance import significance_from_bootstrap  # noqa: E402
+
+from .common import make_samples  # noqa: E402
+
+
+class CopulaPlots:
+    params = [[2, 10, 100, 1000], [False, True]]
+    param_names = ['cardinality', 'fast']
+    timeout = 600
+
+    def setup(self, cardinality, fast):
+        samples = make_samples(10**5, cardinality, 'int')
+        self.pmf1, self.pmf2, self.empirical_pmf = empirical_joint_pmf(samples)
+        self.quantile_levels, _, self.significance = significance_from_bootstrap(
+            samples, None, [0.01, 0.1], method='analytic')
+
+    def teardown(self, cardinality, fast):
+        plt.close('all')
+
+    def _copula(self, fast):
+        fig = plt.figure(figsize=(8, 8))
+        copula_pcolormesh(fig, self.pmf1, self.pmf2, self.empirical_pmf, fast=fast)
+        fig.canvas.draw()
+
+    def _significance(self, fast):
+        fig = plt.figure(figsize=(8, 8))
+        significance_copula_pcolormesh(fig, self.pmf1, self.pmf2, self.significance,
+                                       self.quantile_levels, fast=fast)
+        fig.canvas.draw()
+
+    def time_copula_pcolormesh(self, cardinality, fast):
+        self._copula(fast)
+
+    def peakmem_copula_pcolormesh(self, cardinality, fast):
+        self._copula(fast)
+
+    def time_significance_copula_pcolormesh(self, cardinality, fast):
+        self._significance(fast)
+
+    def peakmem_significance_copula_pcolormesh(self, cardinality, fast):
+        self._significance(fast)
+
+
+class RenderCopulaFigures:
+    params = [[10, 100], [None, -1]]
+    param_names = ['cardinality', 'n_jobs']
+    timeout = 600
+
+    def setup(self, cardinality, n_jobs):
+        samples = make_samples(10**5, cardinality, 'int')
+        pmf1, pmf2, empirical_pmf = empirical_joint_pmf(samples)
+        self.directory = tempfile.TemporaryDirectory()
+        self.items = [(os.path.join(self.directory.name, f'copula_{i}.png'), pmf1, pmf2,
+                       empirical_pmf) for i in range(32)]
+
+    def teardown(self, cardinality, n_jobs):
+        self.directory.cleanup()
+
+    def time_render_copula_figures(self, cardinality, n_jobs):
+        render_copula_figures(self.items, n_jobs=n_jobs, fast=True)
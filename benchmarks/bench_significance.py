@@ -0,0 +1,112 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from empirical_copula.significance import (
+    _bootstrap_independently,
+    significance_from_bootstrap,
+    significance_from_bootstrap_pairs,
+)
+
+from .common import DTYPES, MAX_DENSE_CELLS, SAMPLE_SIZES, make_samples
+
+
+N_BOOTSTRAPS = [100, 10**4]
+# Largest number of bootstrapped counts (cells x bootstraps) kept in memory
+MAX_BOOTSTRAP_COUNTS = 10**8
+# Largest number of resampled values (samples x bootstraps) for the reference loop engine
+MAX_LOOP_SAMPLES = 10**8
+
+
+class BootstrapIndependently:
+    params = [SAMPLE_SIZES, [2, 100], DTYPES, N_BOOTSTRAPS, ['loop', 'vectorized']]
+    param_names = ['n_samples', 'cardinality', 'dtype', 'n_bootstraps', 'engine']
+    timeout = 1200
+
+    def setup(self, n_samples, cardinality, dtype, n_bootstraps, engine):
+        if cardinality ** 2 * n_bootstraps > MAX_BOOTSTRAP_COUNTS:
+            raise NotImplementedError('too many bootstrapped counts')
+        if engine == 'loop' and n_samples * n_bootstraps > MAX_LOOP_SAMPLES:
+            raise NotImplementedError('too slow for the loop engine')
+        self.samples = make_samples(n_samples, cardinality, dtype)
+
+    def time_bootstrap_independently(self, n_samples, cardinality, dtype, n_bootstraps, engine):
+        _bootstrap_independently(self.samples, n_bootstraps, engine=engine,
+                                 random_state=np.random.RandomState(0))
+
+    def peakmem_bootstrap_independently(self, n_samples, cardinality, dtype, n_bootstraps,
+                                        engine):
+        _bootstrap_independently(self.samples, n_bootstraps, engine=engine,
+                                 random_state=np.random.RandomState(0))
+
+
+class SignificanceFromBootstrap:
+    params = [
+        SAMPLE_SIZES,
+        [2, 100, 10**4],
+        DTYPES,
+        N_BOOTSTRAPS,
+        ['bootstrap', 'bootstrap_low_memory', 'bootstrap_sparse', 'analytic', 'permutation',
+         'permutation_sparse'],
+    ]
+    param_names = ['n_samples', 'cardinality', 'dtype', 'n_bootstraps', 'method']
+    timeout = 1200
+
+    def setup(self, n_samples, cardinality, dtype, n_bootstraps, method):
+        method, _, option = method.partition('_')
+        n_cells = cardinality ** 2
+        if option != 'sparse' and n_cells > MAX_DENSE_CELLS:
+            raise NotImplementedError('dense table too large')
+        if option == '' and method == 'bootstrap' and n_cells * n_bootstraps > MAX_BOOTSTRAP_COUNTS:
+            raise NotImplementedError('too many bootstrapped counts')
+        if method == 'analytic' and n_bootstraps != N_BOOTSTRAPS[0]:
+            raise NotImplementedError('n_bootstraps is not used by the analytic method')
+        self.samples = make_samples(n_samples, cardinality, dtype)
+        self.kwargs = {
+            'method': method,
+            'low_memory': option == 'low_memory',
+            'sparse': option == 'sparse',
+        }
+
+    def time_significance_from_bootstrap(self, n_samples, cardinality, dtype, n_bootstraps,
+                                         method):
+        significance_from_bootstrap(self.samples, n_bootstraps, [0.01, 0.1], random_state=0,
+                                    **self.kwargs)
+
+    def peakmem_significance_from_bootstrap(self, n_samples, cardinality, dtype, n_bootstraps,
+                                            method):
+        significance_from_bootstrap(self.samples, n_bootstraps, [0.01, 0.1], random_state=0,
+                                    **self.kwargs)
+
+
+class SignificanceFromBootstrapPairs:
+    """ All the pairs of columns of a wide table, at once or one pair at a time. """
+    params = [[10**5], [12, 50], [30], [2000], ['all_pairs', 'pair_by_pair']]
+    param_names = ['n_samples', 'n_columns', 'cardinality', 'n_bootstraps', 'method']
+    timeout = 1200
+
+    def setup(self, n_samples, n_columns, cardinality, n_bootstraps, method):
+        if method == 'pair_by_pair' and n_columns > 12:
+            raise NotImplementedError('too slow one pair at a time')
+        random_state = np.random.RandomState(0)
+        self.samples = pd.DataFrame({
+            f'v{i}': random_state.randint(cardinality, size=n_samples) for i in range(n_columns)
+        })
+
+    def _significance(self, n_bootstraps, method):
+        if method == 'all_pairs':
+            significance_from_bootstrap_pairs(self.samples, n_bootstraps, [0.01, 0.1],
+                                              random_state=0)
+        else:
+            for column1, column2 in itertools.combinations(self.samples.columns, 2):
+                significance_from_bootstrap(self.samples[[column1, column2]], n_bootstraps,
+                                            [0.01, 0.1], random_state=0, low_memory=True)
+
+    def time_significance_from_bootstrap_pairs(self, n_samples, n_columns, cardinality,
+                                               n_bootstraps, method):
+        self._significance(n_bootstraps, method)
+
+    def peakmem_significance_from_bootstrap_pairs(self, n_samples, n_columns, cardinality,
+                                                  n_bootstraps, method):
+        self._significance(n_bootstraps, method)
@@ -0,0 +1,33 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+
+SAMPLE_SIZES = [10**3, 10**5, 10**7]
+CARDINALITIES = [2, 100, 10**4]
+DTYPES = ['int', 'str', 'category']
+
+# Largest number of combinations of values for which dense tables are benchmarked
+MAX_DENSE_CELLS = 10**6
+
+
+@functools.lru_cache(maxsize=4)
+def make_samples(n_samples, cardinality, dtype, seed=0):
+    """ Samples of two dependent discrete variables, with `cardinality` values each.
+
+    The first variable has a geometric-like marginal distribution, and the second one is equal
+    to the first one half of the time, and uniformly distributed otherwise.
+    """
+    random_state = np.random.RandomState(seed)
+    x = np.minimum(random_state.geometric(p=min(0.5, 10 / cardinality), size=n_samples) - 1,
+                   cardinality - 1)
+    y = np.where(random_state.uniform(size=n_samples) < 0.5, x,
+                 random_state.randint(cardinality, size=n_samples))
+    samples = pd.DataFrame({'x': x, 'y': y})
+    if dtype == 'str':
+        labels = np.array([f'value_{i:05d}' for i in range(cardinality)], dtype=object)
+        samples = samples.apply(lambda column: labels[column.values])
+    elif dtype == 'category':
+        samples = samples.astype('category')
+    return samples
@@ -1,46 +1,145 @@
+import os
+
+import numpy as np
 import pandas as pd
 
+from empirical_copula.codes import (
+    _descending_order,
+    factorize,
+    joint_counts_from_codes,
+    marginal_counts_from_codes,
+    sparse_joint_counts_from_codes,
+)
+from empirical_copula.instrumentation import _stage
+
+
+def _split_weights(samples, weights):
+    """ Separate the frequency weights of the samples from the two observed variables.
+
+    Parameters
+    ----------
+    samples : DataFrame
+        The observed values of two discrete variables, and possibly a column of weights.
+    weights : None, label or array-like
+        None, the label of the column of `samples` holding the weights, or the weights of the
+        rows of `samples`.
+
+    Returns
+    -------
+    samples : DataFrame of size (n, 2)
+        The observed values of the two discrete variables.
+    weights : Series or None
+        The weights of the rows of `samples`, None if not weighted.
+    """
+    if weights is None:
+        return samples, None
+    if np.ndim(weights) == 0:
+        return samples.drop(columns=[weights]), samples[weights]
+    return samples, pd.Series(data=np.asarray(weights), index=samples.index)
+
 
-def empirical_marginal_pmf(samples):
+def empirical_marginal_pmf(samples, weights=None):
     """ Compute the empirical marginal probability of a discrete variable.
 
     Parameters
     ----------
     samples : Series
         The observed values of a discrete variable.
+    weights : Series or None
+        Number of times each value in `samples` was observed, e.g. the counts of a table
+        aggregated by value. Default is None, each value was observed once.
 
     Returns
     -------
     pmf : Series
         Empirical marginal probability of each value of the discrete variable.
     """
-    pmf = samples.value_counts(normalize=True)
+    codes, categories = factorize(samples)
+    counts = marginal_counts_from_codes(codes, len(categories), weights=weights)
+    return _marginal_pmf(counts, categories, samples.name)
+
+
+def _marginal_pmf(counts, categories, name):
+    """ Marginal pmf from the counts of each category, ordered by descending pmf values. """
+    order = _descending_order(counts)
+    pmf = pd.Series(data=counts[order] / counts.sum(), index=categories.take(order), name=name)
     return pmf
 
 
-def joint_counts(samples):
+def joint_counts(samples, sparse=False, weights=None):
     """ Compute the joint counts of two discrete variables.
 
     Parameters
     ----------
     samples : DataFrame of size (n, 2)
         The observed values of two discrete variables (two columns).
+    sparse : bool
+        If True, only return the counts of the observed combinations of values, as a Series
+        indexed by the values of the two variables. Memory then scales with the number of
+        observed combinations rather than with the number of possible ones.
+    weights : Series or None
+        Number of times each row of `samples` was observed, e.g. the counts of a table
+        aggregated by the two variables. Default is None, each row was observed once.
 
     Returns
     -------
-    counts : DataFrame
-        Counts for each combination of the values of the two variables.
+    counts : DataFrame or Series
+        Counts for each combination of the values of the two variables. If `sparse` is True, a
+        Series with a MultiIndex (value of the first variable, value of the second variable);
+        combinations that are not in the index have a count of 0.
     """
-    index_label = samples.columns[0]
-    columns_label = samples.columns[1]
-    counts = (
-        samples
-        .pivot_table(index=index_label, columns=columns_label, aggfunc='size', fill_value=0)
-    )
-    return counts
+    with _stage('joint_counts'):
+        index_label = samples.columns[0]
+        columns_label = samples.columns[1]
+        codes1, categories1 = factorize(samples[index_label])
+        codes2, categories2 = factorize(samples[columns_label])
+        return _joint_counts(codes1, codes2, categories1.rename(index_label),
+                             categories2.rename(columns_label), sparse=sparse, weights=weights)
+
 
+def _observed_in(codes, categories, complete):
+    """ Restrict the codes to the samples in `complete`, and drop the categories not in them.
 
-def independent_pmf(pmf1, pmf2):
+    The categories of categorical values are all kept.
+    """
+    codes = np.where(complete, codes, -1)
+    if isinstance(categories, pd.CategoricalIndex):
+        return codes, categories
+    observed = np.zeros(len(categories), dtype=bool)
+    observed[codes[complete]] = True
+    if observed.all():
+        return codes, categories
+    new_codes = np.cumsum(observed) - 1
+    return np.where(complete, new_codes[codes], -1), categories[observed]
+
+
+def _joint_counts(codes1, codes2, categories1, categories2, sparse=False, weights=None):
+    """ Joint counts from integer codes, as returned by `joint_counts`.
+
+    The names of `categories1` and `categories2` are used as names of the two variables.
+    """
+    if sparse:
+        rows, columns, counts = sparse_joint_counts_from_codes(
+            codes1, codes2, len(categories1), len(categories2), weights=weights)
+        index = pd.MultiIndex(
+            levels=[categories1, categories2],
+            codes=[rows, columns],
+            names=[categories1.name, categories2.name],
+            verify_integrity=False,
+        )
+        return pd.Series(data=counts, index=index.remove_unused_levels())
+
+    complete = (codes1 >= 0) & (codes2 >= 0)
+    if not complete.all():
+        # Values only observed together with a missing value are not in the table
+        codes1, categories1 = _observed_in(codes1, categories1, complete)
+        codes2, categories2 = _observed_in(codes2, categories2, complete)
+    counts = joint_counts_from_codes(codes1, codes2, len(categories1), len(categories2),
+                                     weights=weights)
+    return pd.DataFrame(data=counts, index=categories1, columns=categories2)
+
+
+def independent_pmf(pmf1, pmf2, cells=None):
     """ Joint probabilities of two variables, assuming they are independent.
 
     Parameters
@@ -49,13 +148,23 @@ def independent_pmf(pmf1, pmf2):
         The pmf values for each value of the first discrete variable.
     pmf2 : Series
         The pmf values for each value of the second discrete variable.
+    cells : MultiIndex or None
+        If given, only compute the joint probability of these combinations of values (value of
+        the first variable, value of the second variable).
 
     Returns
     -------
-    independent_pmf : DataFrame
+    independent_pmf : DataFrame or Series
         Joint probability of each combination of values of the two variables, assuming they are
-        independent.
+        independent. If `cells` is given, a Series indexed by `cells`.
     """
+    if cells is not None:
+        independent_pmf = pd.Series(
+            data=_level_values(pmf1, cells, 0) * _level_values(pmf2, cells, 1),
+            index=cells,
+        )
+        return independent_pmf
+
     independent_pmf = pd.DataFrame(
         data=pmf1.values[:, None] * pmf2.values[None, :],
         index=pmf1.index,
@@ -64,7 +173,17 @@ def independent_pmf(pmf1, pmf2):
     return independent_pmf
 
 
-def empirical_joint_pmf_details(samples):
+def _level_values(pmf, cells, level):
+    """ Values of `pmf` for each combination in `cells` at `level`, NaN if not in `pmf`.
+
+    Only the (few) values of the level are looked up in the index of `pmf`.
+    """
+    positions = pmf.index.get_indexer(cells.levels[level])
+    values = np.append(pmf.to_numpy(dtype=float), np.nan)[positions]
+    return np.append(values, np.nan)[cells.codes[level]]
+
+
+def empirical_joint_pmf_details(samples, sparse=False, weights=None):
     """ Compute the empirical joint probability of two variable.
 
     This version of `empirical_joint_pmf` also returns a dictionary with intermediate results.
@@ -73,6 +192,13 @@ def empirical_joint_pmf_details(samples):
     ----------
     samples : DataFrame of size (n, 2)
         The observed values of two discrete variables (two columns).
+    sparse : bool
+        If True, the joint results are Series only containing the observed combinations of
+        values, see `joint_counts`. The joint probability of the other combinations is 0.
+    weights : None, label or array-like
+        Number of times each row of `samples` was observed, e.g. the counts of a table
+        aggregated by the two variables. Either the label of a third column of `samples`, or
+        an array with one weight per row. Default is None, each row was observed once.
 
     Returns
     -------
@@ -80,7 +206,7 @@ def empirical_joint_pmf_details(samples):
         The pmf values for each value of the first discrete variable.
     pmf2 : Series
         The pmf values for each value of the second discrete variable.
-    empirical_pmf : DataFrame
+    empirical_pmf : DataFrame or Series
         Joint probability of each combination of values of the two variables.
     others : dict
         Dictionary containing intermediate results.
@@ -89,24 +215,106 @@ def empirical_joint_pmf_details(samples):
         `'ind_pmf'`: Joint probability of each combination of values of the two variables,
                      assuming they are independent.
     """
-    pmf1 = empirical_marginal_pmf(samples.iloc[:, 0])
-    pmf2 = empirical_marginal_pmf(samples.iloc[:, 1])
-    counts = joint_counts(samples)
-    joint_freq = counts / counts.sum().sum()
-    ind_pmf = independent_pmf(pmf1, pmf2)
-    empirical_pmf = joint_freq / ind_pmf
+    samples, weights = _split_weights(samples, weights)
+    codes1, categories1 = factorize(samples.iloc[:, 0])
+    codes2, categories2 = factorize(samples.iloc[:, 1])
+    return empirical_joint_pmf_from_codes(codes1, codes2, categories1, categories2,
+                                          names=samples.columns[:2], sparse=sparse,
+                                          weights=weights)
+
+
+def empirical_joint_pmf_from_codes(codes1, codes2, categories1, categories2, names=None,
+                                   sparse=False, weights=None):
+    """ Compute the empirical joint probability of two variables encoded as integer codes.
+
+    The values are not hashed again: the counts are computed on the integer codes, e.g. as
+    returned by `factorize`, or those of categorical data.
+
+    Parameters
+    ----------
+    codes1 : array of int
+        Integer code of the value of the first variable for each sample, -1 for missing values.
+    codes2 : array of int
+        Integer code of the value of the second variable for each sample, -1 for missing values.
+    categories1 : array-like
+        Values of the first variable; `codes1` indexes into it.
+    categories2 : array-like
+        Values of the second variable; `codes2` indexes into it.
+    names : list of two labels or None
+        Names of the two variables. Default is None, the variables are unnamed.
+    sparse : bool
+        If True, the joint results are Series only containing the observed combinations of
+        values, see `joint_counts`.
+    weights : array-like or None
+        Number of times each sample was observed. Default is None, each sample was observed once.
+
+    Returns
+    -------
+    pmf1, pmf2, empirical_pmf, others
+        The same values as `empirical_joint_pmf_details`. Categories that are never observed
+        have a marginal probability of 0.
+    """
+    name1, name2 = (None, None) if names is None else names
+    categories1 = pd.Index(categories1)
+    categories2 = pd.Index(categories2)
+    if weights is not None:
+        weights = np.asarray(weights)
+    with _stage('marginals'):
+        pmf1 = _marginal_pmf(marginal_counts_from_codes(codes1, len(categories1), weights),
+                             categories1, name1)
+        pmf2 = _marginal_pmf(marginal_counts_from_codes(codes2, len(categories2), weights),
+                             categories2, name2)
+    with _stage('joint_counts'):
+        counts = _joint_counts(np.asarray(codes1), np.asarray(codes2), categories1.rename(name1),
+                               categories2.rename(name2), sparse=sparse, weights=weights)
+    return _joint_pmf_details(pmf1, pmf2, counts)
+
+
+def _joint_pmf_details(pmf1, pmf2, counts):
+    """ Compute the empirical joint probability from the marginal pmfs and the joint counts.
+
+    Returns the same values as `empirical_joint_pmf_details`. If `counts` is a Series of the
+    counts of the observed combinations of values, the joint results are Series as well. The
+    joint results have the layout of `counts`; only the values of the two variables are looked
+    up in the pmfs.
+    """
+    if isinstance(counts, pd.Series):
+        ind_pmf = independent_pmf(pmf1, pmf2, cells=counts.index)
+        aligned_ind_pmf = ind_pmf.to_numpy()
+    else:
+        ind_pmf = independent_pmf(pmf1, pmf2)
+        aligned_ind_pmf = np.outer(pmf1.reindex(counts.index).to_numpy(),
+                                   pmf2.reindex(counts.columns).to_numpy())
+    values = counts.to_numpy()
+    joint_freq_values = values / values.sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        empirical_pmf_values = joint_freq_values / aligned_ind_pmf
+    joint_freq = _with_values(counts, joint_freq_values)
+    empirical_pmf = _with_values(counts, empirical_pmf_values)
 
     others = {'counts': counts, 'joint_freq': joint_freq, 'ind_pmf': ind_pmf}
     return pmf1, pmf2, empirical_pmf, others
 
 
-def empirical_joint_pmf(samples):
+def _with_values(counts, values):
+    """ A Series or DataFrame with the index (and columns) of `counts`, and `values`. """
+    if isinstance(counts, pd.Series):
+        return pd.Series(data=values, index=counts.index)
+    return pd.DataFrame(data=values, index=counts.index, columns=counts.columns)
+
+
+def empirical_joint_pmf(samples, sparse=False, weights=None):
     """ Compute the empirical joint probability of two variable.
 
     Parameters
     ----------
     samples : DataFrame of size (n, 2)
         The observed values of two discrete variables (two columns).
+    sparse : bool
+        If True, `empirical_pmf` is a Series only containing the observed combinations of
+        values, see `empirical_joint_pmf_details`.
+    weights : None, label or array-like
+        Number of times each row of `samples` was observed, see `empirical_joint_pmf_details`.
 
     Returns
     -------
@@ -114,10 +322,51 @@ def empirical_joint_pmf(samples):
         The pmf values for each value of the first discrete variable.
     pmf2 : Series
         The pmf values for each value of the second discrete variable.
-    empirical_pmf : DataFrame
+    empirical_pmf : DataFrame or Series
         Joint probability of each combination of values of the two variables.
     """
-    pmf1, pmf2, empirical_pmf, _ = empirical_joint_pmf_details(samples)
+    pmf1, pmf2, empirical_pmf, _ = empirical_joint_pmf_details(samples, sparse=sparse,
+                                                               weights=weights)
+    return pmf1, pmf2, empirical_pmf
+
+
+def empirical_joint_pmf_from_counts(counts):
+    """ Compute the empirical joint probability of two variables from their joint counts.
+
+    Parameters
+    ----------
+    counts : DataFrame or Series
+        Counts for each combination of the values of the two variables, as returned by
+        `joint_counts`: a table with the values of the first variable as index and of the
+        second variable as columns, or a Series indexed by the observed combinations of values.
+
+    Returns
+    -------
+    pmf1 : Series
+        The pmf values for each value of the first discrete variable.
+    pmf2 : Series
+        The pmf values for each value of the second discrete variable.
+    empirical_pmf : DataFrame or Series
+        Joint probability of each combination of values of the two variables, of the same kind
+        as `counts`.
+    """
+    if isinstance(counts, pd.Series):
+        counts1 = counts.groupby(level=0).sum()
+        counts2 = counts.groupby(level=1).sum()
+        names = counts.index.names
+    else:
+        counts1 = counts.sum(axis=1)
+        counts2 = counts.sum(axis=0)
+        names = [counts.index.name, counts.columns.name]
+    pmfs = []
+    for marginal_counts, name in zip([counts1, counts2], names):
+        pmf = (marginal_counts / marginal_counts.sum()).sort_index()
+        # Ties are ordered by value, as in `empirical_joint_pmf`
+        pmf = pmf.iloc[_descending_order(pmf.to_numpy())]
+        pmf.name = name
+        pmf.index.name = None
+        pmfs.append(pmf)
+    pmf1, pmf2, empirical_pmf, _ = _joint_pmf_details(pmfs[0], pmfs[1], counts)
     return pmf1, pmf2, empirical_pmf
 
 
@@ -142,5 +391,16 @@ def order_pmf(pmf, is_ordinal=False):
     if is_ordinal:
         ordered_pmf = pmf.sort_index(ascending=True)
     else:
-        ordered_pmf = pmf.sort_values(ascending=False)
+        ordered_pmf = pmf.iloc[_descending_order(pmf.to_numpy())]
     return ordered_pmf
+
+
+def _n_workers(n_jobs):
+    """ Number of workers for `n_jobs`, with the joblib convention that -1 means all CPUs. """
+    if n_jobs is None:
+        return 1
+    if n_jobs == 0 or n_jobs < -1:
+        raise ValueError(f'n_jobs must be None, a positive integer or -1, got {n_jobs!r}')
+    if n_jobs == -1:
+        return os.cpu_count() or 1
+    return n_jobs
@@ -0,0 +1,128 @@
+import collections
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+
+class NullCache:
+    """ Cache of the distributions of the counts under independence, in memory and on disk.
+
+    Under the 0-hypothesis of independence, the distribution of the counts of each combination
+    of values only depends on the number of samples and on the marginal distributions of the
+    two variables. Passing the same cache to `significance_from_bootstrap` or
+    `significance_from_counts` reuses the quantiles computed for identical marginals, with the
+    same method, number of bootstraps, quantile levels and seed, across calls and, with a
+    `directory`, across processes and runs.
+
+    Arrays are kept in memory and on disk up to a maximum size in bytes; the least recently used
+    ones are evicted first. On disk, each array is stored in the `.npy` binary format. A cache
+    can be shared by computations running in different threads.
+
+    Parameters
+    ----------
+    directory : str or None
+        Directory where the arrays are stored. Default is None, the cache is only in memory.
+    max_memory : int or None
+        Maximum number of bytes of the arrays kept in memory. None means no limit. Default is
+        2**28 (256 MiB).
+    max_disk : int or None
+        Maximum number of bytes of the files in `directory`. None means no limit. Default is
+        2**30 (1 GiB).
+
+    Examples
+    --------
+    >>> cache = NullCache('~/.cache/empirical_copula')
+    >>> significance_from_bootstrap(samples, 10000, [0.01, 0.1], random_state=0, cache=cache)
+    """
+
+    def __init__(self, directory=None, max_memory=2**28, max_disk=2**30):
+        if directory is not None:
+            directory = os.path.expanduser(directory)
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self._memory = collections.OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.RLock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npy')
+
+    def _remember(self, key, value):
+        """ Add an array to the memory cache, evicting the least recently used ones. """
+        if key in self._memory:
+            self._memory_size -= self._memory.pop(key).nbytes
+        if self.max_memory is not None and value.nbytes > self.max_memory:
+            return
+        self._memory[key] = value
+        self._memory_size += value.nbytes
+        while self.max_memory is not None and self._memory_size > self.max_memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= evicted.nbytes
+
+    def get(self, key):
+        """ The array stored for `key`, or None if it is not in the cache. """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            value = np.load(path)
+            # Mark the file as recently used
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        with self._lock:
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        """ Store the array `value` for `key`. """
+        value = np.asarray(value)
+        with self._lock:
+            self._remember(key, value)
+        if self.directory is None:
+            return
+        # Write to a temporary file first, so that other processes never read partial files
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, value)
+        os.replace(tmp_path, self._path(key))
+        self._evict_files()
+
+    def _evict_files(self):
+        """ Remove the least recently used files until the directory fits in `max_disk`. """
+        if self.max_disk is None:
+            return
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.npy'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """ Remove all arrays from the cache, in memory and on disk. """
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        if self.directory is None:
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy'):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,197 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def factorize(values):
+    """ Encode the values of a discrete variable as integer codes.
+
+    This is the only step that hashes the values; the counting functions of this module then
+    work on the integer codes. The codes and categories of categorical values are used directly,
+    without hashing the values again.
+
+    Parameters
+    ----------
+    values : array-like
+        The observed values of a discrete variable, e.g. a Series, an array or a Categorical.
+
+    Returns
+    -------
+    codes : array of int
+        Position of each value in `categories`, -1 for missing values.
+    categories : Index
+        The values of the variable: all the categories for categorical values, the sorted
+        observed values otherwise.
+    """
+    if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+        values = pd.Categorical(values)
+        codes = np.asarray(values.codes, dtype=np.intp)
+        categories = pd.CategoricalIndex(values.categories, dtype=values.dtype)
+        return codes, categories
+    codes, uniques = pd.factorize(np.asarray(values), sort=True)
+    return codes, _inferred_index(uniques)
+
+
+def _inferred_index(values):
+    """ Index of `values`, inferring the type of object values, e.g. integers, as pandas does
+    when grouping. """
+    values = pd.Series(values).infer_objects()
+    return pd.Index(values, dtype=values.dtype)
+
+
+def _bincount(keys, weights, minlength):
+    """ `np.bincount`, keeping integer counts for integer (or missing) weights. """
+    counts = np.bincount(keys, weights=weights, minlength=minlength)
+    if weights is not None and weights.dtype.kind in 'biu':
+        counts = counts.astype(np.int64)
+    return counts
+
+
+def marginal_counts_from_codes(codes, n_categories, weights=None):
+    """ Count the values of a discrete variable from their integer codes.
+
+    Parameters
+    ----------
+    codes : array of int
+        Integer code of each observed value, -1 for missing values.
+    n_categories : int
+        Number of possible values of the variable.
+    weights : array or None
+        Number of times each value was observed. Default is None, each value was observed once.
+
+    Returns
+    -------
+    counts : array of size (n_categories,)
+        Number of times each value was observed.
+    """
+    codes = np.asarray(codes)
+    if weights is not None:
+        weights = np.asarray(weights)
+    observed = codes >= 0
+    if not observed.all():
+        codes = codes[observed]
+        weights = None if weights is None else weights[observed]
+    return _bincount(codes, weights, n_categories)
+
+
+def _cell_keys(codes, n_categories, weights):
+    """ Flat index of the combination of values of the samples with all values observed.
+
+    The codes are combined in row-major order, e.g. `code1 * n_categories2 + code2`, so that
+    sorting the keys sorts the combinations lexicographically.
+    """
+    codes = [np.asarray(variable_codes) for variable_codes in codes]
+    if weights is not None:
+        weights = np.asarray(weights)
+    complete = np.logical_and.reduce([variable_codes >= 0 for variable_codes in codes])
+    if not complete.all():
+        codes = [variable_codes[complete] for variable_codes in codes]
+        weights = None if weights is None else weights[complete]
+    keys = codes[0].astype(np.int64)
+    for variable_codes, n in zip(codes[1:], n_categories[1:]):
+        keys *= n
+        keys += variable_codes
+    return keys, weights
+
+
+def joint_counts_from_codes(codes1, codes2, n_categories1, n_categories2, weights=None):
+    """ Count the combinations of values of two discrete variables from their integer codes.
+
+    Samples with a missing value (code -1) in either variable are not counted.
+
+    Parameters
+    ----------
+    codes1 : array of int
+        Integer code of the value of the first variable for each sample.
+    codes2 : array of int
+        Integer code of the value of the second variable for each sample.
+    n_categories1 : int
+        Number of possible values of the first variable.
+    n_categories2 : int
+        Number of possible values of the second variable.
+    weights : array or None
+        Number of times each sample was observed. Default is None, each sample was observed once.
+
+    Returns
+    -------
+    counts : array of size (n_categories1, n_categories2)
+        Number of times each combination of values was observed.
+    """
+    keys, weights = _cell_keys([codes1, codes2], [n_categories1, n_categories2], weights)
+    counts = _bincount(keys, weights, n_categories1 * n_categories2)
+    return counts.reshape(n_categories1, n_categories2)
+
+
+def sparse_joint_counts_from_codes(codes1, codes2, n_categories1, n_categories2, weights=None):
+    """ Count the observed combinations of values of two discrete variables.
+
+    Memory scales with the number of samples and of observed combinations, rather than with the
+    number of possible combinations, see `joint_counts_from_codes` for the parameters.
+
+    Returns
+    -------
+    rows : array of int
+        Code of the first variable of each observed combination.
+    columns : array of int
+        Code of the second variable of each observed combination.
+    counts : array
+        Number of times each combination was observed. The combinations are sorted by `rows`,
+        then by `columns`.
+    """
+    cells, counts = sparse_tensor_counts_from_codes(
+        [codes1, codes2], [n_categories1, n_categories2], weights=weights)
+    return cells[:, 0], cells[:, 1], counts
+
+
+def sparse_tensor_counts_from_codes(codes, n_categories, weights=None):
+    """ Count the observed combinations of values of any number of discrete variables.
+
+    The counts are a sparse tensor: memory scales with the number of samples and of observed
+    combinations, rather than with the number of possible combinations. Samples with a missing
+    value (code -1) in any variable are not counted.
+
+    Parameters
+    ----------
+    codes : list of arrays of int
+        For each variable, the integer code of its value for each sample.
+    n_categories : list of int
+        Number of possible values of each variable.
+    weights : array or None
+        Number of times each sample was observed. Default is None, each sample was observed once.
+
+    Returns
+    -------
+    cells : array of size (n_cells, n_variables)
+        Codes of the values of each observed combination, sorted lexicographically.
+    counts : array of size (n_cells,)
+        Number of times each combination was observed.
+    """
+    n_categories = [int(n) for n in n_categories]
+    n_cells = math.prod(n_categories)
+    if n_cells > np.iinfo(np.int64).max:
+        # The combinations cannot be numbered with 64-bit integers: sort the codes directly
+        complete = np.logical_and.reduce([np.asarray(c) >= 0 for c in codes])
+        stacked = np.stack([np.asarray(c)[complete] for c in codes], axis=1)
+        cells, inverse = np.unique(stacked, axis=0, return_inverse=True)
+        if weights is not None:
+            weights = np.asarray(weights)[complete]
+        return cells, _bincount(inverse.ravel(), weights, cells.shape[0])
+
+    keys, weights = _cell_keys(codes, n_categories, weights)
+    if n_cells <= keys.shape[0]:
+        # Counting all combinations is cheaper than sorting the keys
+        observed = np.bincount(keys, minlength=n_cells)
+        flat_cells = np.flatnonzero(observed)
+        counts = observed if weights is None else _bincount(keys, weights, n_cells)
+        counts = counts[flat_cells]
+    else:
+        flat_cells, inverse = np.unique(keys, return_inverse=True)
+        counts = _bincount(inverse, weights, flat_cells.shape[0])
+    cells = np.stack(np.unravel_index(flat_cells, n_categories), axis=1)
+    return cells, counts
+
+
+def _descending_order(values):
+    """ Indices sorting `values` in descending order, keeping the order of ties. """
+    return np.argsort(-np.asarray(values), kind='stable')
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+from empirical_copula import _split_weights, joint_counts
+from empirical_copula.instrumentation import _stage
+from empirical_copula.significance import _BLOCK_SIZE, _MAX_BATCH_ELEMENTS, _map_blocks
+
+
+def _observed_cells(samples_counts):
+    """ Counts of the combinations of values in `samples_counts`, as flat arrays.
+
+    Returns
+    -------
+    counts : array of size (n_cells,)
+        Count of each combination of values; for a table, only the observed ones.
+    rows : array of size (n_cells,)
+        Position of the value of the first variable of each combination.
+    columns : array of size (n_cells,)
+        Position of the value of the second variable of each combination.
+    n_values : tuple of int
+        Number of values of the first and second variable.
+    """
+    if isinstance(samples_counts, pd.Series):
+        index = samples_counts.index
+        rows, columns = np.asarray(index.codes[0]), np.asarray(index.codes[1])
+        n_values = (len(index.levels[0]), len(index.levels[1]))
+        return samples_counts.to_numpy(), rows, columns, n_values
+    table = samples_counts.to_numpy()
+    rows, columns = np.nonzero(table)
+    return table[rows, columns], rows, columns, table.shape
+
+
+class _GroupSums:
+    """ Sums of the counts of the cells with the same key, e.g. the same value of a variable. """
+
+    def __init__(self, keys, n_keys):
+        self.order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self.order]
+        if (self.order == np.arange(len(keys))).all():
+            # The cells are already grouped by key, e.g. the rows of a table
+            self.order = None
+        self.starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        self.keys = sorted_keys[self.starts]
+        self.n_keys = n_keys
+
+    def __call__(self, block):
+        """ Sums of the columns of `block`, of size (block size, n_keys). """
+        if self.order is not None:
+            block = block[:, self.order]
+        sums = np.zeros((block.shape[0], self.n_keys), dtype=block.dtype)
+        sums[:, self.keys] = np.add.reduceat(block, self.starts, axis=1)
+        return sums
+
+
+def _reciprocal(counts, scale=1.0):
+    """ `scale / counts` as float32, and 0 for counts of 0. """
+    reciprocal = np.zeros(counts.shape, dtype=np.float32)
+    np.divide(scale, counts, out=reciprocal, where=counts > 0, casting='same_kind')
+    return reciprocal
+
+
+def confidence_interval_from_counts(samples_counts, n_resamples, confidence=0.95,
+                                    random_state=np.random, n_jobs=None):
+    """ Compute confidence intervals of the empirical joint probability by resampling the
+    samples, from the joint counts of the two variables.
+
+    The samples are resampled jointly (case resampling), and the empirical joint probability is
+    recomputed on each resampled dataset, with its own marginals. Drawing samples with
+    replacement puts each resampled sample in an observed combination of values with its
+    observed frequency, so that the joint counts of a resampled dataset are multinomially
+    distributed, and are drawn directly without materializing the dataset. The cost thus
+    grows with the number of observed combinations, but not with the number of samples.
+
+    The intervals are the percentiles of the resampled empirical joint probabilities. A
+    combination of values that is not in a resampled dataset has an empirical joint probability
+    of 0 in it.
+
+    Parameters
+    ----------
+    samples_counts : DataFrame or Series
+        Counts for each combination of the values of the two variables, as returned by
+        `joint_counts`.
+    n_resamples : int
+        Number of resampled datasets. Memory grows as `n_resamples` times the number of
+        observed combinations of values (4 bytes each).
+    confidence : float
+        Confidence level of the intervals, between 0 and 1. Default is 0.95 .
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator. Default is `numpy.random`.
+    n_jobs : int or None
+        Number of threads used to draw the resampled datasets, see `_bootstrap_independently`.
+
+    Returns
+    -------
+    lower : DataFrame or Series
+        Lower bound of the confidence interval of the empirical joint probability of each
+        combination of values, in the layout of `empirical_pmf` as returned by
+        `empirical_joint_pmf_from_counts`.
+    upper : DataFrame or Series
+        Upper bound of the confidence interval, in the same layout.
+    """
+    counts, rows, columns, n_values = _observed_cells(samples_counts)
+    n_samples = int(counts.sum())
+    cells_pmf = counts / counts.sum()
+    row_sums = _GroupSums(rows, n_values[0])
+    column_sums = _GroupSums(columns, n_values[1])
+
+    def draw_block(generator, size):
+        resampled = generator.multinomial(n_samples, cells_pmf, size=size)
+        # joint_freq / (pmf1 * pmf2) = count * n_samples / (row count * column count), and 0
+        # for the combinations that are not in the resampled dataset
+        empirical_pmf = resampled.astype(np.float32)
+        empirical_pmf *= _reciprocal(row_sums(resampled), scale=n_samples)[:, rows]
+        empirical_pmf *= _reciprocal(column_sums(resampled))[:, columns]
+        return empirical_pmf
+
+    n_cells = counts.shape[0]
+    resampled_pmfs = np.empty((n_resamples, n_cells), dtype=np.float32)
+    block_size = max(1, min(_BLOCK_SIZE, _MAX_BATCH_ELEMENTS // max(1, n_cells)))
+    start = 0
+    for block in _map_blocks(draw_block, n_resamples, block_size, random_state, n_jobs):
+        resampled_pmfs[start:start + block.shape[0]] = block
+        start += block.shape[0]
+
+    with _stage('quantile_estimation'):
+        alpha = (1.0 - confidence) / 2.0
+        bounds = np.quantile(resampled_pmfs, [alpha, 1.0 - alpha], axis=0).astype(np.float64)
+
+    if isinstance(samples_counts, pd.Series):
+        return tuple(pd.Series(data=bound, index=samples_counts.index) for bound in bounds)
+    intervals = []
+    for bound in bounds:
+        table = np.zeros(n_values)
+        table[rows, columns] = bound
+        intervals.append(pd.DataFrame(data=table, index=samples_counts.index,
+                                      columns=samples_counts.columns))
+    return tuple(intervals)
+
+
+def confidence_interval_from_bootstrap(samples, n_resamples, confidence=0.95,
+                                       random_state=np.random, n_jobs=None, sparse=False,
+                                       weights=None):
+    """ Compute confidence intervals of the empirical joint probability by resampling the
+    samples.
+
+    Unlike `significance_from_bootstrap`, which tests the observed counts against the
+    0-hypothesis of independence, this gives the uncertainty of the observed empirical joint
+    probability itself, see `confidence_interval_from_counts`.
+
+    Parameters
+    ----------
+    samples : DataFrame
+        Pandas DataFrame with two columns, each row representing a sample from two
+        discrete random variables.
+    n_resamples : int
+        Number of resampled datasets.
+    confidence : float
+        Confidence level of the intervals, between 0 and 1. Default is 0.95 .
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator. Default is `numpy.random`.
+    n_jobs : int or None
+        Number of threads used to draw the resampled datasets, see `_bootstrap_independently`.
+    sparse : bool
+        If True, the intervals are Series only containing the observed combinations of values,
+        see `empirical_joint_pmf`.
+    weights : None, label or array-like
+        Number of times each row of `samples` was observed, see `significance_from_bootstrap`.
+
+    Returns
+    -------
+    lower : DataFrame or Series
+        Lower bound of the confidence interval of the empirical joint probability of each
+        combination of values, in the layout of `empirical_pmf` as returned by
+        `empirical_joint_pmf`.
+    upper : DataFrame or Series
+        Upper bound of the confidence interval, in the same layout.
+    """
+    samples, weights = _split_weights(samples, weights)
+    samples_counts = joint_counts(samples, sparse=sparse, weights=weights)
+    return confidence_interval_from_counts(samples_counts, n_resamples, confidence=confidence,
+                                           random_state=random_state, n_jobs=n_jobs)
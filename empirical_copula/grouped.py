@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+from empirical_copula import _split_weights
+from empirical_copula.codes import _descending_order, factorize
+
+
+def _factorize_by_pooled_pmf(values, valid, weights):
+    """ Encode the values of a variable, in order of decreasing pmf over all the groups.
+
+    Returns
+    -------
+    codes : array of size (n,)
+        Integer code of each value, -1 for missing values.
+    uniques : Index
+        The values of the variable, in the order of the codes.
+    """
+    codes, uniques = factorize(values)
+    observed = valid & (codes >= 0)
+    observed_weights = None if weights is None else weights[observed]
+    pooled_counts = np.bincount(codes[observed], weights=observed_weights, minlength=len(uniques))
+    order = _descending_order(pooled_counts)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    codes = np.where(codes >= 0, rank[np.maximum(codes, 0)], -1)
+    return codes, uniques.take(order)
+
+
+def grouped_empirical_joint_pmf_details(samples, by, weights=None):
+    """ Compute the empirical joint probability of two variables for each group of samples.
+
+    The marginal pmfs, joint counts and joint probabilities of all the groups are computed in a
+    single counting pass. The results of all the groups share the same values of the two
+    variables, in the same order, so that they can be compared and plotted consistently: the
+    values are ordered by decreasing pmf over all the samples, and the values that are not
+    observed in a group have a pmf of 0 in that group.
+
+    Parameters
+    ----------
+    samples : DataFrame of size (n, 3)
+        The observed values of two discrete variables, and the column `by`.
+    by : label
+        Label of the column of `samples` with the group of each sample.
+    weights : None, label or array-like
+        Number of times each row of `samples` was observed, see `empirical_joint_pmf_details`.
+
+    Returns
+    -------
+    results : dict
+        For each group, in sorted order, the tuple `(pmf1, pmf2, empirical_pmf, others)` as
+        returned by `empirical_joint_pmf_details` on the samples of the group, but with the
+        values of all the groups. The joint probability of combinations of values where one of
+        the values is not observed in the group is undefined (NaN).
+    """
+    samples, weights = _split_weights(samples, weights)
+    if weights is not None:
+        weights = weights.to_numpy()
+    group_codes, groups = pd.factorize(samples[by].to_numpy(), sort=True)
+    samples = samples.drop(columns=[by])
+    label1, label2 = samples.columns
+    valid = group_codes >= 0
+
+    codes1, values1 = _factorize_by_pooled_pmf(samples[label1], valid, weights)
+    codes2, values2 = _factorize_by_pooled_pmf(samples[label2], valid, weights)
+    n_groups, n1, n2 = len(groups), len(values1), len(values2)
+    dtype = np.int64 if weights is None else np.result_type(weights.dtype, np.int64)
+
+    def count(keys, observed, size):
+        observed_weights = None if weights is None else weights[observed]
+        counts = np.bincount(keys[observed], weights=observed_weights, minlength=size)
+        return counts.astype(dtype)
+
+    # As in `empirical_joint_pmf_details`, the marginals count the samples where the variable
+    # is observed, the joint counts the ones where both variables are
+    observed1 = valid & (codes1 >= 0)
+    observed2 = valid & (codes2 >= 0)
+    marginal_counts1 = count(group_codes * n1 + codes1, observed1, n_groups * n1)
+    marginal_counts2 = count(group_codes * n2 + codes2, observed2, n_groups * n2)
+    counts = count((group_codes * n1 + codes1) * n2 + codes2, observed1 & observed2,
+                   n_groups * n1 * n2)
+
+    marginal_counts1 = marginal_counts1.reshape(n_groups, n1)
+    marginal_counts2 = marginal_counts2.reshape(n_groups, n2)
+    counts = counts.reshape(n_groups, n1, n2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pmfs1 = marginal_counts1 / marginal_counts1.sum(axis=1, keepdims=True)
+        pmfs2 = marginal_counts2 / marginal_counts2.sum(axis=1, keepdims=True)
+        joint_freqs = counts / counts.sum(axis=(1, 2), keepdims=True)
+        ind_pmfs = pmfs1[:, :, None] * pmfs2[:, None, :]
+        empirical_pmfs = joint_freqs / ind_pmfs
+
+    index = pd.Index(values1, name=label1)
+    columns = pd.Index(values2, name=label2)
+
+    def table(data, named=True):
+        if named:
+            return pd.DataFrame(data=data, index=index, columns=columns)
+        return pd.DataFrame(data=data, index=values1, columns=values2)
+
+    results = {}
+    for i, group in enumerate(groups):
+        pmf1 = pd.Series(data=pmfs1[i], index=values1, name=label1)
+        pmf2 = pd.Series(data=pmfs2[i], index=values2, name=label2)
+        others = {
+            'counts': table(counts[i]),
+            'joint_freq': table(joint_freqs[i]),
+            'ind_pmf': table(ind_pmfs[i], named=False),
+        }
+        results[group] = (pmf1, pmf2, table(empirical_pmfs[i]), others)
+    return results
+
+
+def grouped_empirical_joint_pmf(samples, by, weights=None):
+    """ Compute the empirical joint probability of two variables for each group of samples.
+
+    Parameters
+    ----------
+    samples : DataFrame of size (n, 3)
+        The observed values of two discrete variables, and the column `by`.
+    by : label
+        Label of the column of `samples` with the group of each sample.
+    weights : None, label or array-like
+        Number of times each row of `samples` was observed, see `empirical_joint_pmf_details`.
+
+    Returns
+    -------
+    results : dict
+        For each group, in sorted order, the tuple `(pmf1, pmf2, empirical_pmf)`, with the
+        values of all the groups, see `grouped_empirical_joint_pmf_details`.
+    """
+    results = grouped_empirical_joint_pmf_details(samples, by, weights=weights)
+    return {group: details[:3] for group, details in results.items()}
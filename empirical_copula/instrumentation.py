@@ -0,0 +1,195 @@
+import contextlib
+import contextvars
+import time
+import tracemalloc
+
+import pandas as pd
+
+
+# Profiler recording the stages of the computations of the current context, if any
+_active_profiler = contextvars.ContextVar('empirical_copula_profiler', default=None)
+# Event set to stop the computations of the current context, if any
+_cancel_event = contextvars.ContextVar('empirical_copula_cancel_event', default=None)
+
+
+class ComputationCancelled(Exception):
+    """ Raised in a computation that was cancelled, see `cancellable`. """
+
+
+class Profiler:
+    """ Record the wall time and peak memory of the stages of the computation, and its progress.
+
+    The profiler is active in a `with` block, and records the functions of `empirical_copula`
+    called in it, in the same thread. The stages are:
+    `'marginals'`: Marginal pmfs of the two variables.
+    `'joint_counts'`: Joint counts of the two variables.
+    `'resampling'`: Drawing the bootstrapped datasets.
+    `'quantile_estimation'`: Quantiles of the counts under independence.
+    `'threshold_assignment'`: Significance labels of the observed counts.
+    `'plotting'`: Building copula plots.
+
+    The times and memory of a stage include those of the stages nested in it, e.g. of
+    `'joint_counts'` within `'resampling'` with the `'loop'` bootstrap engine. Peak memory is
+    the maximum memory allocated during the stage on top of the memory allocated at its start,
+    as traced by `tracemalloc`.
+
+    Parameters
+    ----------
+    callback : callable or None
+        Function called with a dictionary for each event, for example to export the metrics as
+        they are recorded. At the end of a stage:
+        `{'event': 'stage', 'stage': name, 'wall_time': seconds, 'peak_memory': bytes}`.
+        After each block of bootstrapped datasets:
+        `{'event': 'progress', 'stage': 'resampling', 'done': n_done, 'total': n_total,
+          'elapsed': seconds, 'eta': seconds}`.
+    trace_memory : bool
+        If True (default), trace memory allocations with `tracemalloc` to measure the peak
+        memory of each stage, which slows down allocations. If False, `peak_memory` is None.
+
+    Attributes
+    ----------
+    stages : dict
+        For each stage, in the order they first ended, a dictionary with the number of
+        `'calls'`, the total `'wall_time'` in seconds, and the maximum `'peak_memory'` in bytes.
+    progress : dict or None
+        The last progress event.
+
+    Examples
+    --------
+    >>> with Profiler(callback=print) as profiler:
+    ...     significance_from_bootstrap(samples, 10000, [0.01, 0.1])
+    >>> profiler.to_frame()
+    """
+
+    def __init__(self, callback=None, trace_memory=True):
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.progress = None
+        self._stack = []
+        self._progress_start = None
+        self._started_tracing = False
+        self._token = None
+
+    def __enter__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._token = _active_profiler.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _active_profiler.reset(self._token)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _emit(self, event):
+        if self.callback is not None:
+            self.callback(event)
+
+    def _traced_memory(self):
+        """ Current and peak traced memory, resetting the peak; None if not measured. """
+        if not (self.trace_memory and tracemalloc.is_tracing()
+                and hasattr(tracemalloc, 'reset_peak')):
+            return None, None
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        return current, peak
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """ Record a stage of the computation. Nested calls for the same stage are ignored. """
+        if any(frame['name'] == name for frame in self._stack):
+            yield
+            return
+        current, peak = self._traced_memory()
+        if self._stack and peak is not None:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+        frame = {'name': name, 'memory': current, 'peak': current, 'start': time.perf_counter()}
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - frame['start']
+            _, peak = self._traced_memory()
+            self._stack.pop()
+            peak_memory = None
+            if peak is not None:
+                frame['peak'] = max(frame['peak'], peak)
+                peak_memory = frame['peak'] - frame['memory']
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], frame['peak'])
+            self._record(name, wall_time, peak_memory)
+
+    def _record(self, name, wall_time, peak_memory):
+        record = self.stages.setdefault(name, {'calls': 0, 'wall_time': 0.0,
+                                               'peak_memory': peak_memory})
+        record['calls'] += 1
+        record['wall_time'] += wall_time
+        if peak_memory is not None:
+            record['peak_memory'] = max(record['peak_memory'], peak_memory)
+        self._emit({'event': 'stage', 'stage': name, 'wall_time': wall_time,
+                    'peak_memory': peak_memory})
+
+    def report_progress(self, done, total):
+        """ Record that `done` out of `total` bootstrapped datasets have been drawn. """
+        now = time.perf_counter()
+        if done == 0 or self._progress_start is None:
+            self._progress_start = now
+        elapsed = now - self._progress_start
+        eta = elapsed * (total - done) / done if done > 0 else None
+        self.progress = {'event': 'progress', 'stage': 'resampling', 'done': done,
+                         'total': total, 'elapsed': elapsed, 'eta': eta}
+        self._emit(self.progress)
+
+    def to_frame(self):
+        """ The recorded stages as a DataFrame, with one row per stage. """
+        return pd.DataFrame.from_dict(self.stages, orient='index',
+                                      columns=['calls', 'wall_time', 'peak_memory'])
+
+
+def _stage(name):
+    """ Context manager recording a stage with the active profiler, if any. """
+    profiler = _active_profiler.get()
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name)
+
+
+@contextlib.contextmanager
+def cancellable(event):
+    """ Stop the computations in the `with` block as soon as `event` is set.
+
+    The computations check `event` after each block of bootstrapped datasets, and raise
+    `ComputationCancelled` if it is set, e.g. from another thread. Like a `Profiler`, the
+    event applies to the functions of `empirical_copula` called in the block, in the same
+    thread.
+
+    Parameters
+    ----------
+    event : threading.Event
+        Event to set to cancel the computations.
+
+    Examples
+    --------
+    >>> event = threading.Event()
+    >>> with cancellable(event):
+    ...     significance_from_bootstrap(samples, 10**6, [0.01, 0.1])
+    """
+    token = _cancel_event.set(event)
+    try:
+        yield event
+    finally:
+        _cancel_event.reset(token)
+
+
+def _progress(done, total):
+    """ Report the progress of the resampling to the active profiler, if any, and stop if the
+    computation was cancelled. """
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise ComputationCancelled(f'Cancelled after {done} of {total} datasets')
+    profiler = _active_profiler.get()
+    if profiler is not None:
+        profiler.report_progress(done, total)
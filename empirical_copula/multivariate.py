@@ -0,0 +1,350 @@
+import numpy as np
+import pandas as pd
+
+from empirical_copula import _marginal_pmf, _split_weights, empirical_joint_pmf_from_counts
+from empirical_copula.codes import factorize, sparse_tensor_counts_from_codes
+from empirical_copula.instrumentation import _stage
+from empirical_copula.significance import (
+    _assign_significance,
+    _binomial_cells_histogram,
+    _binomial_ppf,
+    _quantile_levels,
+)
+
+
+def multivariate_joint_counts(samples, weights=None):
+    """ Compute the joint counts of any number of discrete variables, as a sparse tensor.
+
+    Only the observed combinations of values are stored, so that memory scales with their number
+    rather than with the number of possible combinations, which grows exponentially with the
+    number of variables.
+
+    Parameters
+    ----------
+    samples : DataFrame of size (n, n_variables)
+        The observed values of the discrete variables (one column each).
+    weights : None, label or array-like
+        Number of times each row of `samples` was observed, see `empirical_joint_pmf_details`.
+
+    Returns
+    -------
+    counts : Series
+        Counts of the observed combinations of values, with a MultiIndex with one level per
+        variable, in lexicographic order. Combinations that are not in the index have a count of
+        0; samples with a missing value in any of the variables are not counted. With two
+        variables, the same as `joint_counts` with `sparse=True`.
+    """
+    samples, weights = _split_weights(samples, weights)
+    with _stage('joint_counts'):
+        codes, categories = zip(*[factorize(samples.iloc[:, i])
+                                  for i in range(samples.shape[1])])
+        cells, counts = sparse_tensor_counts_from_codes(
+            codes, [len(variable_categories) for variable_categories in categories],
+            weights=weights)
+        index = pd.MultiIndex(
+            levels=list(categories),
+            codes=list(cells.T),
+            names=list(samples.columns),
+            verify_integrity=False,
+        )
+        return pd.Series(data=counts, index=index.remove_unused_levels())
+
+
+def _level_groups(names, groups):
+    """ Positions of the variables of each group in `names`, see `multivariate_independent_pmf`.
+    """
+    if groups is None:
+        return [[level] for level in range(len(names))]
+    level_groups = []
+    for group in groups:
+        missing = [name for name in group if name not in names]
+        if missing:
+            raise ValueError(f'Unknown variables {missing} in groups, expected some of {names}')
+        level_groups.append([names.index(name) for name in group])
+    grouped = [level for group in level_groups for level in group]
+    if len(set(grouped)) != len(grouped):
+        raise ValueError('Each variable can only be in one group')
+    level_groups.extend([level] for level in range(len(names)) if level not in grouped)
+    return level_groups
+
+
+def _group_pmf(cells, counts, levels):
+    """ Joint marginal probability of the variables at `levels`, for each cell of `cells`. """
+    if len(levels) == 1:
+        keys = np.asarray(cells.codes[levels[0]])
+    else:
+        group_codes = np.stack([cells.codes[level] for level in levels], axis=1)
+        _, keys = np.unique(group_codes, axis=0, return_inverse=True)
+        keys = keys.ravel()
+    group_counts = np.bincount(keys, weights=counts)
+    return group_counts[keys] / counts.sum()
+
+
+def multivariate_independent_pmf(samples_counts, groups=None):
+    """ Joint probabilities of the observed combinations of values, assuming independence.
+
+    By default, all the variables are assumed to be mutually independent, and the probability
+    of a combination of values is the product of the marginal probabilities of its values.
+    With `groups`, only the groups of variables are assumed to be independent from each other,
+    e.g. `groups=[['A', 'B'], ['C']]` for the 0-hypothesis that A and B are jointly independent
+    of C, whatever the dependence between A and B.
+
+    Parameters
+    ----------
+    samples_counts : Series
+        Counts of the observed combinations of values, as returned by
+        `multivariate_joint_counts`.
+    groups : list of lists of labels or None
+        Groups of variables that are independent from each other. Variables that are not in
+        any group are independent from all the others. Default is None, all the variables are
+        independent.
+
+    Returns
+    -------
+    independent_pmf : Series
+        Joint probability of each observed combination of values under independence, with the
+        index of `samples_counts`. The probability of each group of values is its marginal
+        probability in `samples_counts`.
+    """
+    cells = samples_counts.index
+    counts = samples_counts.to_numpy()
+    independent_pmf = np.ones(counts.shape[0])
+    for levels in _level_groups(list(cells.names), groups):
+        independent_pmf *= _group_pmf(cells, counts, levels)
+    return pd.Series(data=independent_pmf, index=cells)
+
+
+def multivariate_empirical_joint_pmf_details(samples, groups=None, weights=None):
+    """ Compute the empirical joint probability of any number of discrete variables.
+
+    The empirical copula is the ratio of the joint probability of each observed combination of
+    values to its probability under independence, see `multivariate_independent_pmf`.
+
+    Parameters
+    ----------
+    samples : DataFrame of size (n, n_variables)
+        The observed values of the discrete variables (one column each).
+    groups : list of lists of labels or None
+        Groups of variables that are independent from each other under the 0-hypothesis, see
+        `multivariate_independent_pmf`. Default is None, all the variables are independent.
+    weights : None, label or array-like
+        Number of times each row of `samples` was observed, see `empirical_joint_pmf_details`.
+
+    Returns
+    -------
+    pmfs : list of Series
+        The pmf values for each value of each variable, in the order of the columns.
+    empirical_pmf : Series
+        Joint probability of each observed combination of values, relative to its probability
+        under independence, indexed as the counts returned by `multivariate_joint_counts`.
+    others : dict
+        Dictionary containing intermediate results.
+        `'counts'`: Joint counts of each observed combination
+        `'joint_freq'`: Joint frequency of each observed combination
+        `'ind_pmf'`: Joint probability of each observed combination under independence.
+    """
+    counts = multivariate_joint_counts(samples, weights=weights)
+    cells = counts.index
+    values = counts.to_numpy()
+    with _stage('marginals'):
+        pmfs = []
+        for level, (categories, name) in enumerate(zip(cells.levels, cells.names)):
+            marginal_counts = np.bincount(cells.codes[level], weights=values,
+                                          minlength=len(categories))
+            pmfs.append(_marginal_pmf(marginal_counts, categories.rename(None), name))
+        ind_pmf = multivariate_independent_pmf(counts, groups=groups)
+    joint_freq = counts / values.sum()
+    empirical_pmf = pd.Series(data=joint_freq.to_numpy() / ind_pmf.to_numpy(), index=cells)
+
+    others = {'counts': counts, 'joint_freq': joint_freq, 'ind_pmf': ind_pmf}
+    return pmfs, empirical_pmf, others
+
+
+def multivariate_empirical_joint_pmf(samples, groups=None, weights=None):
+    """ Compute the empirical joint probability of any number of discrete variables.
+
+    Parameters
+    ----------
+    samples : DataFrame of size (n, n_variables)
+        The observed values of the discrete variables (one column each).
+    groups : list of lists of labels or None
+        Groups of variables that are independent from each other under the 0-hypothesis, see
+        `multivariate_independent_pmf`. Default is None, all the variables are independent.
+    weights : None, label or array-like
+        Number of times each row of `samples` was observed, see `empirical_joint_pmf_details`.
+
+    Returns
+    -------
+    pmfs : list of Series
+        The pmf values for each value of each variable, in the order of the columns.
+    empirical_pmf : Series
+        Joint probability of each observed combination of values, relative to its probability
+        under independence.
+    """
+    pmfs, empirical_pmf, _ = multivariate_empirical_joint_pmf_details(samples, groups=groups,
+                                                                      weights=weights)
+    return pmfs, empirical_pmf
+
+
+def multivariate_significance_from_counts(samples_counts, n_bootstraps, p_levels_low,
+                                          groups=None, random_state=np.random,
+                                          method='bootstrap', n_jobs=None):
+    """ Compute thresholds for significance under the 0-hypothesis of independence, from the
+    joint counts of any number of variables.
+
+    Resampling the groups of variables independently from each other puts each sample in a
+    combination of values with its probability under independence, see
+    `multivariate_independent_pmf`. The bootstrapped counts of each observed combination are
+    thus binomially distributed, and are drawn directly from that distribution, as with
+    `sparse=True` in `significance_from_bootstrap`.
+
+    Parameters
+    ----------
+    samples_counts : Series
+        Counts of the observed combinations of values, as returned by
+        `multivariate_joint_counts`.
+    n_bootstraps : int
+        Number of bootstrapped datasets. Ignored if `method` is `'analytic'`.
+    p_levels_low: list of floats
+        List of significance levels for the low tail, between 0 and 0.5 .
+        The function adds significance levels for the high tail.
+    groups : list of lists of labels or None
+        Groups of variables that are independent from each other under the 0-hypothesis, see
+        `multivariate_independent_pmf`. Default is None, all the variables are independent.
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator. Default is `numpy.random`.
+    method : {'bootstrap', 'analytic'}
+        `'bootstrap'` (default) draws the bootstrapped counts, `'analytic'` uses the quantiles
+        of their binomial distribution directly.
+    n_jobs : int or None
+        Number of threads used to draw the bootstrapped datasets, see `_bootstrap_independently`.
+
+    Returns
+    -------
+    quantile_levels : list of floats
+        List of significance levels for the low and high tail.
+    quantile_levels_labels : list of int
+        List of labels for the significance levels.
+    significance : Series
+        The significance label of each observed combination of values, with the index of
+        `samples_counts`.
+    """
+    quantile_levels, quantile_levels_labels = _quantile_levels(p_levels_low)
+    with _stage('marginals'):
+        n_samples = samples_counts.to_numpy().sum()
+        cells_pmf = multivariate_independent_pmf(samples_counts, groups=groups).to_numpy()
+
+    if method == 'analytic':
+        quantiles = _binomial_ppf(n_samples, cells_pmf, quantile_levels)
+    elif method == 'bootstrap':
+        histogram = _binomial_cells_histogram(n_samples, cells_pmf, n_bootstraps, random_state,
+                                              n_jobs=n_jobs)
+        quantiles = histogram.quantile(quantile_levels).T
+    else:
+        raise ValueError(f"Unknown method {method!r}, expected 'bootstrap' or 'analytic'")
+
+    significance = _assign_significance(samples_counts, quantiles, p_levels_low)
+    return quantile_levels, quantile_levels_labels, significance
+
+
+def multivariate_significance_from_bootstrap(samples, n_bootstraps, p_levels_low, groups=None,
+                                             random_state=np.random, method='bootstrap',
+                                             n_jobs=None, weights=None):
+    """ Compute thresholds for significance under the 0-hypothesis of independence of any
+    number of variables.
+
+    Parameters
+    ----------
+    samples : DataFrame of size (n, n_variables)
+        The observed values of the discrete variables (one column each).
+    n_bootstraps : int
+        Number of bootstrapped datasets. Ignored if `method` is `'analytic'`.
+    p_levels_low: list of floats
+        List of significance levels for the low tail, between 0 and 0.5 .
+        The function adds significance levels for the high tail.
+    groups : list of lists of labels or None
+        Groups of variables that are independent from each other under the 0-hypothesis, see
+        `multivariate_independent_pmf`. Default is None, all the variables are independent.
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator. Default is `numpy.random`.
+    method : {'bootstrap', 'analytic'}
+        How to compute the distribution of the counts under independence, see
+        `multivariate_significance_from_counts`.
+    n_jobs : int or None
+        Number of threads used to draw the bootstrapped datasets, see `_bootstrap_independently`.
+    weights : None, label or array-like
+        Number of times each row of `samples` was observed, see `significance_from_bootstrap`.
+
+    Returns
+    -------
+    quantile_levels, quantile_levels_labels, significance
+        See `multivariate_significance_from_counts`. Only the observed combinations of values
+        are labelled; the others have a count of 0.
+    """
+    samples_counts = multivariate_joint_counts(samples, weights=weights)
+    return multivariate_significance_from_counts(
+        samples_counts, n_bootstraps, p_levels_low, groups=groups, random_state=random_state,
+        method=method, n_jobs=n_jobs)
+
+
+def conditional_joint_counts(samples_counts, given, sparse=False):
+    """ Joint counts of two variables, given the values of all the other variables.
+
+    The result is a 2D slice of the counts, in the format of `joint_counts`, so that it can be
+    passed on to `empirical_joint_pmf_from_counts` or `significance_from_counts` to analyze the
+    dependence between the two variables given the values of the others.
+
+    Parameters
+    ----------
+    samples_counts : Series
+        Counts of the observed combinations of values, as returned by
+        `multivariate_joint_counts`.
+    given : dict
+        The value of each variable but two, by label.
+    sparse : bool
+        If True, return the counts of the observed combinations of values only, as with
+        `sparse=True` in `joint_counts`.
+
+    Returns
+    -------
+    counts : DataFrame or Series
+        Counts of each combination of values of the two remaining variables, in the order of
+        the levels of `samples_counts`, for the samples with the given values.
+    """
+    names = list(samples_counts.index.names)
+    missing = [name for name in given if name not in names]
+    if missing:
+        raise ValueError(f'Unknown variables {missing}, expected some of {names}')
+    if len(names) - len(given) != 2:
+        raise ValueError('`given` must fix the values of all the variables but two')
+    counts = samples_counts.xs(tuple(given.values()), level=list(given))
+    counts.index = counts.index.remove_unused_levels()
+    if sparse:
+        return counts
+    return counts.unstack(fill_value=0)
+
+
+def conditional_empirical_joint_pmf(samples_counts, given):
+    """ Empirical joint probability of two variables, given the values of all the others.
+
+    Examples
+    --------
+    >>> counts = multivariate_joint_counts(samples[['quality', 'price', 'region']])
+    >>> pmf1, pmf2, empirical_pmf = conditional_empirical_joint_pmf(counts, {'region': 'north'})
+    >>> copula_pcolormesh(fig, pmf1, pmf2, empirical_pmf)
+
+    Parameters
+    ----------
+    samples_counts : Series
+        Counts of the observed combinations of values, as returned by
+        `multivariate_joint_counts`.
+    given : dict
+        The value of each variable but two, by label.
+
+    Returns
+    -------
+    pmf1, pmf2, empirical_pmf
+        The same values as `empirical_joint_pmf` on the samples with the given values, see
+        `conditional_joint_counts`.
+    """
+    return empirical_joint_pmf_from_counts(conditional_joint_counts(samples_counts, given))
@@ -0,0 +1,176 @@
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from empirical_copula import _n_workers
+from empirical_copula.codes import factorize, marginal_counts_from_codes
+
+
+# Maximum number of joint keys computed at once when counting the pairs of a column
+_MAX_BATCH_ELEMENTS = 2 ** 24
+
+
+def _factorize_columns(samples, columns):
+    """ Encode each column once as integer codes, and compute its empirical marginal pmf.
+
+    Returns
+    -------
+    codes : array of size (n, n_columns)
+        Integer code of the value of each column for each sample, -1 for missing values.
+    uniques : list of Index
+        Values of each column, see `factorize`; the codes of the column index into it.
+    pmfs : list of Series
+        Empirical marginal pmf of each column, in the order of `uniques`.
+    """
+    codes = np.empty((samples.shape[0], len(columns)), dtype=np.int64)
+    uniques = []
+    pmfs = []
+    for i, column in enumerate(columns):
+        codes[:, i], column_uniques = factorize(samples[column])
+        counts = marginal_counts_from_codes(codes[:, i], len(column_uniques))
+        uniques.append(column_uniques)
+        pmfs.append(pd.Series(data=counts / counts.sum(), index=column_uniques, name=column))
+    return codes, uniques, pmfs
+
+
+def _pairs_joint_counts(codes, n_categories, first, seconds):
+    """ Joint counts of column `first` with each of the columns `seconds`, in a single pass.
+
+    Returns
+    -------
+    counts : list of arrays
+        For each of `seconds`, joint counts of size (n_categories[first], n_categories[second]).
+    """
+    n_first = n_categories[first]
+    sizes = n_first * n_categories[seconds]
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    # Samples with missing values go to an extra bin at the end
+    keys = codes[:, first, None] * n_categories[seconds] + codes[:, seconds] + offsets[:-1]
+    missing = (codes[:, first, None] < 0) | (codes[:, seconds] < 0)
+    keys[missing] = offsets[-1]
+    flat_counts = np.bincount(keys.ravel(), minlength=offsets[-1] + 1)
+    counts = [
+        flat_counts[start:stop].reshape(n_first, -1)
+        for start, stop in zip(offsets[:-1], offsets[1:])
+    ]
+    return counts
+
+
+def _observed_categories(counts, categories):
+    """ Which categories are observed in the joint counts, see `_observed_in`.
+
+    The categories of categorical values are all kept.
+    """
+    if isinstance(categories, pd.CategoricalIndex):
+        return np.ones(len(categories), dtype=bool)
+    return counts > 0
+
+
+def all_pairs_empirical_joint_pmf(samples, columns=None, n_jobs=None):
+    """ Compute the empirical joint probability of every pair of columns.
+
+    Each column is encoded and its marginal pmf computed only once, and the joint counts of a
+    column with all the following ones are computed in a single counting pass.
+
+    Parameters
+    ----------
+    samples : DataFrame of size (n, n_columns)
+        The observed values of discrete variables (one per column).
+    columns : list or None
+        The columns to pair. Default is all the columns of `samples`.
+    n_jobs : int or None
+        Number of threads counting pairs in parallel. None (default) or 1 uses the calling
+        thread only, -1 uses all CPUs.
+
+    Returns
+    -------
+    results : dict
+        For each pair of columns `(column1, column2)`, with `column1` before `column2` in
+        `columns`, the tuple `(pmf1, pmf2, empirical_pmf)` as returned by `empirical_joint_pmf`
+        on `samples[[column1, column2]]`.
+    """
+    if columns is None:
+        columns = samples.columns.tolist()
+    codes, uniques, pmfs = _factorize_columns(samples, columns)
+    n_categories = np.array([len(u) for u in uniques])
+
+    def count_pairs(first):
+        seconds = np.arange(first + 1, len(columns))
+        if len(seconds) == 0:
+            return []
+        # Limit the number of joint keys computed at once
+        batch_size = max(1, _MAX_BATCH_ELEMENTS // max(1, codes.shape[0]))
+        counts = []
+        for start in range(0, len(seconds), batch_size):
+            counts.extend(_pairs_joint_counts(codes, n_categories, first,
+                                              seconds[start:start + batch_size]))
+        return counts
+
+    n_workers = _n_workers(n_jobs)
+    if n_workers == 1:
+        all_counts = list(map(count_pairs, range(len(columns))))
+    else:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            all_counts = list(executor.map(count_pairs, range(len(columns))))
+
+    ordered_pmfs = [pmf.sort_values(ascending=False) for pmf in pmfs]
+    results = {}
+    pairs = itertools.combinations(range(len(columns)), 2)
+    for (first, second), counts in zip(pairs, itertools.chain.from_iterable(all_counts)):
+        # As in `joint_counts`, values only observed together with a missing value of the other
+        # column are not in the table
+        observed1 = _observed_categories(counts.sum(axis=1), uniques[first])
+        observed2 = _observed_categories(counts.sum(axis=0), uniques[second])
+        counts = counts[np.ix_(observed1, observed2)]
+        pmf1, pmf2 = pmfs[first].values[observed1], pmfs[second].values[observed2]
+        with np.errstate(invalid='ignore'):
+            empirical_pmf = counts / counts.sum() / (pmf1[:, None] * pmf2[None, :])
+        # As in `empirical_joint_pmf`, values never observed together with a value of the other
+        # column have an undefined copula
+        empirical_pmf[counts.sum(axis=1) == 0, :] = np.nan
+        empirical_pmf[:, counts.sum(axis=0) == 0] = np.nan
+        empirical_pmf = pd.DataFrame(
+            data=empirical_pmf,
+            index=pd.Index(uniques[first][observed1], name=columns[first]),
+            columns=pd.Index(uniques[second][observed2], name=columns[second]),
+        )
+        results[(columns[first], columns[second])] = (
+            ordered_pmfs[first], ordered_pmfs[second], empirical_pmf)
+    return results
+
+
+def summarize_pairs(results):
+    """ Summarize the dependency between the variables of each pair, to rank the pairs.
+
+    Parameters
+    ----------
+    results : dict
+        For each pair of variables, the tuple `(pmf1, pmf2, empirical_pmf)`, as returned by
+        `all_pairs_empirical_joint_pmf`.
+
+    Returns
+    -------
+    summary : DataFrame
+        For each pair (rows), the columns:
+        `'max_abs_log_copula'`: Maximum absolute value of the log10 empirical copula over the
+                                observed combinations of values.
+        `'mutual_information'`: Mutual information between the two variables, in nats.
+        Pairs are sorted by decreasing mutual information.
+    """
+    rows = []
+    for pmf1, pmf2, empirical_pmf in results.values():
+        copula = empirical_pmf.values
+        ind_pmf = (pmf1.loc[empirical_pmf.index].values[:, None]
+                   * pmf2.loc[empirical_pmf.columns].values[None, :])
+        observed = copula > 0
+        log_copula = np.log(copula[observed])
+        rows.append({
+            'max_abs_log_copula': np.abs(log_copula).max() / np.log(10),
+            'mutual_information': (ind_pmf[observed] * copula[observed] * log_copula).sum(),
+        })
+    index = pd.MultiIndex.from_tuples(list(results.keys()), names=['variable1', 'variable2'])
+    summary = pd.DataFrame(rows, index=index, columns=['max_abs_log_copula', 'mutual_information'])
+    summary = summary.sort_values('mutual_information', ascending=False)
+    return summary
@@ -1,8 +1,38 @@
+from concurrent.futures import ProcessPoolExecutor
+import functools
+
+from matplotlib import rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
 from matplotlib.colors import ListedColormap
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties
 import numpy as np
+import pandas as pd
+
+from empirical_copula import _n_workers
+from empirical_copula.instrumentation import _stage
+
+
+# Figure reused by all the renderings of a process, see `_render_copula_figure`
+_figure = None
+
 
+def _thin_positions(positions, min_spacing):
+    """ Indices of a subset of the sorted `positions` that are at least `min_spacing` apart.
 
-def _create_copula_axes(fig, pmf1, pmf2, grid_lw, annotation_fontsize=15):
+    Positions are kept greedily from the first one on.
+    """
+    kept = []
+    last = -np.inf
+    for i, position in enumerate(positions):
+        if position - last >= min_spacing:
+            kept.append(i)
+            last = position
+    return np.array(kept, dtype=int)
+
+
+def _create_copula_axes(fig, pmf1, pmf2, grid_lw, annotation_fontsize=15, fast=False):
     """ Function to create the axes for the copula plot.
 
     Parameters
@@ -17,6 +47,9 @@ def _create_copula_axes(fig, pmf1, pmf2, grid_lw, annotation_fontsize=15):
         Line width of the grid lines. Default is 2.
     annotation_fontsize : int
         Font size of the category annotation next to the axis.
+    fast : bool
+        If True, draw the grid lines as a single collection and only show the tick labels and
+        the category annotations that do not overlap, see `copula_pcolormesh`.
 
     Returns
     -------
@@ -29,43 +62,85 @@ def _create_copula_axes(fig, pmf1, pmf2, grid_lw, annotation_fontsize=15):
     """
     cdf1 = pmf1.cumsum()
     labels1 = cdf1.index.tolist()
-    values1 = [0.0] + cdf1.values.tolist()
+    values1 = np.concatenate([[0.0], cdf1.values])
 
     cdf2 = pmf2.cumsum()
     labels2 = cdf2.index.tolist()
-    values2 = [0.0] + cdf2.values.tolist()
+    values2 = np.concatenate([[0.0], cdf2.values])
 
     ax = fig.add_axes([0, 0, 1, 1])
     ax.set_aspect(1)
 
     xticks = values1
+    yticks = values2
+    centers1 = (values1[:-1] + values1[1:]) / 2
+    centers2 = (values2[:-1] + values2[1:]) / 2
+    if fast:
+        # Minimum spacing of the labels in data units, assuming that the copula fills the
+        # shortest side of the figure
+        axis_length = min(fig.get_size_inches()) * 72
+        tick_size = FontProperties(size=rcParams['xtick.labelsize']).get_size_in_points()
+        tick_spacing = 1.5 * tick_size / axis_length
+        xticks = xticks[_thin_positions(xticks, tick_spacing)]
+        yticks = yticks[_thin_positions(yticks, tick_spacing)]
+        # Annotations are written horizontally, their width is estimated from their length
+        max_length = max(len(str(label)) for label in labels1)
+        kept1 = _thin_positions(centers1,
+                                0.6 * (max_length + 1) * annotation_fontsize / axis_length)
+        kept2 = _thin_positions(centers2, annotation_fontsize / axis_length)
+        centers1, labels1 = centers1[kept1], [labels1[i] for i in kept1]
+        centers2, labels2 = centers2[kept2], [labels2[i] for i in kept2]
+
+        segments = [[(x, 0.0), (x, 1.0)] for x in values1]
+        segments += [[(0.0, y), (1.0, y)] for y in values2]
+        ax.add_collection(LineCollection(segments, colors='k', linewidths=grid_lw))
+    else:
+        for x in xticks:
+            ax.axvline(x, color='k', lw=grid_lw)
+        for y in yticks:
+            ax.axhline(y, color='k', lw=grid_lw)
+
     xticks_labels = [f'{t:.02f}' for t in xticks]
     ax.set_xticks(xticks)
     ax.set_xticklabels(xticks_labels, rotation=90)
-    for x in xticks:
-        ax.axvline(x, color='k', lw=grid_lw)
     trans = ax.get_xaxis_transform()  # x in data units, y in axes fraction
-    for x0, x1, label in zip(xticks[:-1], xticks[1:], labels1):
-        ax.annotate(label, xy=((x0 + x1) / 2, -0.15), xycoords=trans, fontsize=annotation_fontsize,
+    for x, label in zip(centers1, labels1):
+        ax.annotate(label, xy=(x, -0.15), xycoords=trans, fontsize=annotation_fontsize,
                     verticalalignment='top', horizontalalignment='center')
 
-    yticks = values2
     yticks_labels = [f'{t:.02f}' for t in yticks]
     ax.set_yticks(yticks)
     ax.set_yticklabels(yticks_labels)
-    for y in yticks:
-        ax.axhline(y, color='k', lw=grid_lw)
     trans = ax.get_yaxis_transform()  # y in data units, x in axes fraction
-    for y0, y1, label in zip(yticks[:-1], yticks[1:], labels2):
-        ax.annotate(label, xy=(-0.15, (y0 + y1) / 2), xycoords=trans, fontsize=annotation_fontsize,
+    for y, label in zip(centers2, labels2):
+        ax.annotate(label, xy=(-0.15, y), xycoords=trans, fontsize=annotation_fontsize,
                     verticalalignment='center', horizontalalignment='right')
 
     y_mesh, x_mesh = np.meshgrid(values2, values1)
     return ax, x_mesh, y_mesh
 
 
+def _reorder_data(pmf1, pmf2, data, fill_value=0.0):
+    """ Re-order `data` to match the ordering of the indices of `pmf1` and `pmf2`.
+
+    `data` is a DataFrame, or a Series indexed by the observed combinations of values, as
+    returned with `sparse=True`. Combinations missing from a Series are set to `fill_value`.
+    """
+    if not isinstance(data, pd.Series):
+        return data.loc[pmf1.index, pmf2.index]
+
+    rows = pmf1.index.get_indexer(data.index.get_level_values(0))
+    columns = pmf2.index.get_indexer(data.index.get_level_values(1))
+    # Combinations with values outside of the pmfs are not plotted
+    plotted = (rows >= 0) & (columns >= 0)
+    dense = np.full((len(pmf1), len(pmf2)), fill_value, dtype=np.result_type(data.dtype,
+                                                                             fill_value))
+    dense[rows[plotted], columns[plotted]] = data.values[plotted]
+    return dense
+
+
 def copula_pcolormesh(fig, pmf1, pmf2, data, grid_lw=2,
-                      annotation_fontsize=15, **pcolormesh_kwargs):
+                      annotation_fontsize=15, fill_value=0.0, fast=False, **pcolormesh_kwargs):
     """ Create a copula plot.
 
     The values in `data` are re-ordered according to the ordering of the indices of `pmf1` and
@@ -79,37 +154,73 @@ def copula_pcolormesh(fig, pmf1, pmf2, data, grid_lw=2,
         The pmf values for each value of the first discrete variable.
     pmf2 : Series
         The pmf values for each value of the second discrete variable.
-    data : DataFrame
+    data : DataFrame or Series
         A value to plot for each combination of the values of the x-axis variable (index) and of
-        the y-axis variable (columns)
+        the y-axis variable (columns). Alternatively, a Series with the values of the observed
+        combinations only, indexed by (x-axis value, y-axis value), as returned by
+        `empirical_joint_pmf` with `sparse=True`.
     grid_lw : int
         Line width of the grid lines. Default is 2.
     annotation_fontsize : int
         Font size of the category annotation next to the axis.
+    fill_value : float
+        Value plotted for the combinations missing from `data`, if it is a Series. Default is 0,
+        the empirical copula of combinations that were never observed.
+    fast : bool
+        If True, use a rendering path suited to variables with many values: the grid lines are
+        drawn as a single collection, tick labels and category annotations that would overlap
+        are left out, and the cells are drawn as a single rasterized image with `pcolorfast`
+        instead of one polygon per cell with `pcolormesh`. Default is False.
 
     **pcolormesh_kwargs : dict
-        Additional keyword arguments are passed on to `pcolormesh`.
+        Additional keyword arguments are passed on to `pcolormesh`, or to `pcolorfast` if
+        `fast` is True.
 
     Returns
     -------
     ax : Axes
        Matplotlib Axes object
-    pcm : QuadMesh
-       Matplotlib object returned by `pcolormesh`.
+    pcm : QuadMesh or PcolorImage
+       Matplotlib object returned by `pcolormesh`, or by `pcolorfast` if `fast` is True.
     """
 
-    # Re-order data to match pmf1, pmf2
-    data = data.loc[pmf1.index, pmf2.index]
-    # Create axes for the copula plot
-    ax, x_mesh, y_mesh = _create_copula_axes(fig, pmf1, pmf2, grid_lw=grid_lw,
-                                             annotation_fontsize=annotation_fontsize)
-    # Plot the copula data on a pcolormesh
-    pcm = ax.pcolormesh(x_mesh, y_mesh, data, **pcolormesh_kwargs)
-    return ax, pcm
+    with _stage('plotting'):
+        # Re-order data to match pmf1, pmf2
+        data = _reorder_data(pmf1, pmf2, data, fill_value=fill_value)
+        # Create axes for the copula plot
+        ax, x_mesh, y_mesh = _create_copula_axes(fig, pmf1, pmf2, grid_lw=grid_lw,
+                                                 annotation_fontsize=annotation_fontsize, fast=fast)
+        if fast:
+            # The cells form a rectilinear grid, drawn as a single image rather than one
+            # polygon per cell
+            pcolormesh_kwargs.setdefault('rasterized', True)
+            pcm = ax.pcolorfast(x_mesh[:, 0], y_mesh[0, :], np.asarray(data).T,
+                                **pcolormesh_kwargs)
+        else:
+            # Plot the copula data on a pcolormesh
+            pcm = ax.pcolormesh(x_mesh, y_mesh, data, **pcolormesh_kwargs)
+        return ax, pcm
+
+
+@functools.lru_cache(maxsize=None)
+def _significance_colors(n_levels):
+    """ Colors of `n_levels` significance levels in each tail, and of the level in between. """
+    colors_neg = [(0.0, g, 1.0) for g in np.linspace(0, 1, n_levels)]
+    colors_pos = [(1.0, g, 0.0) for g in reversed(np.linspace(0, 1, n_levels))]
+    return tuple(colors_neg + [(0.5, 0.5, 0.5)] + colors_pos)
+
+
+def _significance_cmap(n_levels):
+    """ Discrete colormap for `n_levels` significance levels in each tail.
+
+    A new colormap is returned at each call, so that changes to it (e.g. `set_bad`) do not
+    affect other plots.
+    """
+    return ListedColormap(list(_significance_colors(n_levels)))
 
 
 def significance_copula_pcolormesh(fig, pmf1, pmf2, significance, quantile_levels, grid_lw=2,
-                                   annotation_fontsize=15, **pcolormesh_kwargs):
+                                   annotation_fontsize=15, fast=False, **pcolormesh_kwargs):
     """ Create a copula plot from significance data.
 
     The significance copula plot has a colormap specialized to display low- and high-tail
@@ -123,10 +234,11 @@ def significance_copula_pcolormesh(fig, pmf1, pmf2, significance, quantile_level
         The pmf values for each value of the first discrete variable.
     pmf2 : Series
         The pmf values for each value of the second discrete variable.
-    significance : DataFrame
+    significance : DataFrame or Series
         A value to plot for each combination of the values of the x-axis variable (index) and of
         the y-axis variable (columns). These values will usually be generated from the function
-        `significance_from_bootstrap`.
+        `significance_from_bootstrap`. If a Series of the observed combinations only, the
+        combinations that were never observed are shown at the lowest significance level.
     quantile_levels : list of floats
         List of significance levels for the low and high tail. These values will usually be
         generated from the function `significance_from_bootstrap`.
@@ -134,8 +246,12 @@ def significance_copula_pcolormesh(fig, pmf1, pmf2, significance, quantile_level
         Line width of the grid lines. Default is 2.
     annotation_fontsize : int
         Font size of the category annotation next to the axis.
+    fast : bool
+        If True, use the rendering path for variables with many values, see
+        `copula_pcolormesh`. Default is False.
     **pcolormesh_kwargs : dict
-        Additional keyword arguments are passed on to `pcolormesh`.
+        Additional keyword arguments are passed on to `pcolormesh`, or to `pcolorfast` if
+        `fast` is True.
 
     Returns
     -------
@@ -145,22 +261,91 @@ def significance_copula_pcolormesh(fig, pmf1, pmf2, significance, quantile_level
        Matplotlib object returned by `pcolormesh`.
     """
 
-    n_levels = len(quantile_levels) // 2
+    with _stage('plotting'):
+        n_levels = len(quantile_levels) // 2
+        significance_cmap = _significance_cmap(n_levels)
 
-    # Create specialized discrete colormap
-    colors_neg = [[0.0, g, 1.0] for g in np.linspace(0, 1, n_levels)]
-    colors_pos = [[1.0, g, 0.0] for g in reversed(np.linspace(0, 1, n_levels))]
-    colors_levels = colors_neg + [[0.5,0.5,0.5]] + colors_pos
-    significance_cmap = ListedColormap(colors_levels)
-
-    ax, pcm = copula_pcolormesh(
-        fig, pmf1, pmf2, significance,
-        vmin=-n_levels-0.5, vmax=n_levels + 0.5, cmap=significance_cmap, grid_lw=grid_lw,
-        annotation_fontsize=annotation_fontsize, **pcolormesh_kwargs,
-    )
-    cbar = fig.colorbar(pcm, ax=ax)
-    cbar.ax.set_yticks(np.arange(-n_levels, n_levels+1))
-    cbar.ax.set_yticklabels(quantile_levels)
-    cbar.set_label('significance level', fontsize=15, rotation=270)
+        ax, pcm = copula_pcolormesh(
+            fig, pmf1, pmf2, significance,
+            vmin=-n_levels-0.5, vmax=n_levels + 0.5, cmap=significance_cmap, grid_lw=grid_lw,
+            annotation_fontsize=annotation_fontsize, fill_value=-n_levels, fast=fast,
+            **pcolormesh_kwargs,
+        )
+        cbar = fig.colorbar(pcm, ax=ax)
+        cbar.ax.set_yticks(np.arange(-n_levels, n_levels+1))
+        cbar.ax.set_yticklabels(quantile_levels)
+        cbar.set_label('significance level', fontsize=15, rotation=270)
 
     return significance_cmap
+
+
+def _render_copula_figure(kind, figsize, dpi, savefig_kwargs, plot_kwargs, item):
+    """ Render one copula figure to a file, on the figure reused by the current process. """
+    global _figure
+    if _figure is None:
+        _figure = Figure()
+        FigureCanvasAgg(_figure)
+    _figure.clear()
+    _figure.set_size_inches(figsize)
+    _figure.set_dpi(dpi)
+
+    filename, *args = item
+    if kind == 'copula':
+        copula_pcolormesh(_figure, *args, **plot_kwargs)
+    else:
+        significance_copula_pcolormesh(_figure, *args, **plot_kwargs)
+    _figure.savefig(filename, dpi=dpi, **savefig_kwargs)
+    _figure.clear()
+    return filename
+
+
+def render_copula_figures(items, kind='copula', n_jobs=None, figsize=(8, 8), dpi=100,
+                          savefig_kwargs=None, chunksize=1, **plot_kwargs):
+    """ Render many copula plots to files, in parallel processes.
+
+    The figures are drawn with the Agg backend, independently of the current matplotlib
+    backend, and every process reuses the same Figure object for all of its plots.
+
+    Parameters
+    ----------
+    items : iterable of tuples
+        For `kind='copula'`, tuples `(filename, pmf1, pmf2, data)` with the arguments of
+        `copula_pcolormesh`. For `kind='significance'`, tuples
+        `(filename, pmf1, pmf2, significance, quantile_levels)` with the arguments of
+        `significance_copula_pcolormesh`.
+    kind : {'copula', 'significance'}
+        Type of plot. Default is `'copula'`.
+    n_jobs : int or None
+        Number of processes rendering in parallel. None (default) or 1 renders in the calling
+        process, -1 uses all CPUs.
+    figsize : tuple of floats
+        Size of the figures in inches. Default is (8, 8).
+    dpi : float
+        Resolution of the files. Default is 100.
+    savefig_kwargs : dict or None
+        Keyword arguments passed on to `Figure.savefig`. Default is `{'bbox_inches': 'tight'}`,
+        so that the category annotations outside of the axes are included.
+    chunksize : int
+        Number of figures sent to a process at once. Larger values reduce the communication
+        overhead for many small plots. Default is 1.
+    **plot_kwargs : dict
+        Additional keyword arguments are passed on to `copula_pcolormesh` or
+        `significance_copula_pcolormesh`, e.g. `fast=True`.
+
+    Returns
+    -------
+    filenames : list
+        The names of the files written, in the order of `items`.
+    """
+    if kind not in ('copula', 'significance'):
+        raise ValueError(f"Unknown kind of plot {kind!r}, expected 'copula' or 'significance'")
+    if savefig_kwargs is None:
+        savefig_kwargs = {'bbox_inches': 'tight'}
+    render = functools.partial(_render_copula_figure, kind, figsize, dpi, savefig_kwargs,
+                               plot_kwargs)
+
+    n_workers = _n_workers(n_jobs)
+    if n_workers == 1:
+        return list(map(render, items))
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(render, items, chunksize=chunksize))
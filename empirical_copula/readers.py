@@ -0,0 +1,134 @@
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import glob
+import os
+
+import numpy as np
+
+from empirical_copula import _n_workers
+from empirical_copula.streaming import CopulaAccumulator
+
+
+def _accumulate(read, columns, tasks):
+    """ Accumulate the counts of the partitions `tasks`, each read with `read(task)`. """
+    accumulator = CopulaAccumulator()
+    accumulator.columns = list(columns)
+    for task in tasks:
+        values1, values2 = read(task)
+        accumulator._add(*accumulator._encode_values(values1, values2))
+    return accumulator
+
+
+def _map_reduce(read, columns, tasks, n_jobs=None):
+    """ Accumulate the counts of all partitions, split in contiguous runs across processes.
+
+    Each process only holds one partition at a time, and returns the accumulated counts of its
+    partitions, which are merged in the calling process.
+    """
+    n_workers = min(_n_workers(n_jobs), max(1, len(tasks)))
+    accumulate = functools.partial(_accumulate, read, columns)
+    if n_workers == 1:
+        return accumulate(tasks)
+
+    runs = [[tasks[i] for i in run] for run in np.array_split(np.arange(len(tasks)), n_workers)]
+    accumulator = CopulaAccumulator()
+    accumulator.columns = list(columns)
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for partial_accumulator in executor.map(accumulate, runs):
+            accumulator.merge(partial_accumulator)
+    return accumulator
+
+
+def _parquet_files(path):
+    """ The Parquet files at `path`: a file, a directory of files, or a list of files. """
+    if isinstance(path, (list, tuple)):
+        return list(path)
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True))
+    return [path]
+
+
+def _read_parquet_row_group(columns, task):
+    import pyarrow.parquet as pq
+
+    path, row_group = task
+    table = pq.ParquetFile(path).read_row_group(row_group, columns=list(columns))
+    return [table.column(column).to_numpy() for column in columns]
+
+
+def copula_accumulator_from_parquet(path, columns, n_jobs=None):
+    """ Accumulate the counts of two discrete variables stored in Parquet files.
+
+    The files are read one row group at a time, so that memory is bounded by the size of the
+    row groups rather than by the size of the dataset. Requires `pyarrow`.
+
+    Parameters
+    ----------
+    path : str or list of str
+        A Parquet file, a directory containing Parquet files, or a list of Parquet files.
+    columns : list of two labels
+        Names of the columns with the values of the two discrete variables.
+    n_jobs : int or None
+        Number of processes reading row groups in parallel. None (default) or 1 reads in the
+        calling process, -1 uses all CPUs.
+
+    Returns
+    -------
+    accumulator : CopulaAccumulator
+        The counts of all the samples. Use its `result` method to compute the empirical joint
+        probability, or `significance` for the thresholds for significance.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('Reading Parquet files requires pyarrow') from None
+
+    tasks = []
+    for filename in _parquet_files(path):
+        n_row_groups = pq.ParquetFile(filename).metadata.num_row_groups
+        tasks.extend((filename, row_group) for row_group in range(n_row_groups))
+    read = functools.partial(_read_parquet_row_group, tuple(columns))
+    return _map_reduce(read, columns, tasks, n_jobs=n_jobs)
+
+
+def _read_npy_slice(paths, task):
+    start, stop = task
+    return [np.load(path, mmap_mode='r')[start:stop] for path in paths]
+
+
+def copula_accumulator_from_npy(path1, path2, columns=None, chunk_size=10**6, n_jobs=None):
+    """ Accumulate the counts of two discrete variables stored in `.npy` files.
+
+    The files are memory-mapped, and counted `chunk_size` samples at a time, so that memory is
+    bounded by the size of the chunks rather than by the size of the dataset. The arrays must
+    have a dtype that can be memory-mapped, i.e. not `object`.
+
+    Parameters
+    ----------
+    path1 : str
+        `.npy` file with the values of the first discrete variable.
+    path2 : str
+        `.npy` file with the values of the second discrete variable, of the same length.
+    columns : list of two labels or None
+        Names of the two variables. Default is the names of the files, without extension.
+    chunk_size : int
+        Number of samples counted at once. Default is 10**6.
+    n_jobs : int or None
+        Number of processes counting chunks in parallel. None (default) or 1 counts in the
+        calling process, -1 uses all CPUs.
+
+    Returns
+    -------
+    accumulator : CopulaAccumulator
+        The counts of all the samples, see `copula_accumulator_from_parquet`.
+    """
+    if columns is None:
+        columns = [os.path.splitext(os.path.basename(path))[0] for path in (path1, path2)]
+    n_samples = np.load(path1, mmap_mode='r').shape[0]
+    if np.load(path2, mmap_mode='r').shape[0] != n_samples:
+        raise ValueError('The two arrays must have the same length')
+
+    tasks = [(start, min(start + chunk_size, n_samples))
+             for start in range(0, n_samples, chunk_size)]
+    read = functools.partial(_read_npy_slice, (path1, path2))
+    return _map_reduce(read, columns, tasks, n_jobs=n_jobs)
@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+
+from empirical_copula.codes import _descending_order, factorize, sparse_tensor_counts_from_codes
+
+
+def _variable_axes(samples_counts):
+    """ Names of the variables of `samples_counts`, see `rebin_counts`. """
+    if isinstance(samples_counts, pd.Series):
+        return list(samples_counts.index.names)
+    return [samples_counts.index.name, samples_counts.columns.name]
+
+
+def _variable_values(samples_counts, variable):
+    """ The values of `variable` in `samples_counts`, and the codes of the cells into them. """
+    names = _variable_axes(samples_counts)
+    if variable not in names:
+        raise ValueError(f'Unknown variable {variable!r}, expected one of {names}')
+    position = names.index(variable)
+    if isinstance(samples_counts, pd.Series):
+        index = samples_counts.index
+        return position, index.levels[position], np.asarray(index.codes[position])
+    values = samples_counts.index if position == 0 else samples_counts.columns
+    return position, values, np.arange(len(values))
+
+
+def _marginal_counts(samples_counts, variable):
+    """ Values of `variable` and their total count in `samples_counts`. """
+    position, values, codes = _variable_values(samples_counts, variable)
+    if isinstance(samples_counts, pd.Series):
+        counts = np.bincount(codes, weights=samples_counts.to_numpy(), minlength=len(values))
+    else:
+        counts = samples_counts.to_numpy().sum(axis=1 - position)
+    return values, counts
+
+
+def _map_values(values, mapping):
+    """ New value of each of `values`; values that are not in a dict-like mapping are kept. """
+    if callable(mapping) and not isinstance(mapping, pd.Series):
+        return values.map(mapping)
+    return values.map(lambda value: mapping.get(value, value))
+
+
+def _rebin_axis(counts, codes, n_values, axis):
+    """ Sum the rows (axis 0) or columns (axis 1) of `counts` with the same new code. """
+    kept = codes >= 0
+    counts = np.moveaxis(counts, axis, 0)[kept]
+    rebinned = np.zeros((n_values,) + counts.shape[1:], dtype=counts.dtype)
+    np.add.at(rebinned, codes[kept], counts)
+    return np.moveaxis(rebinned, 0, axis)
+
+
+def rebin_counts(samples_counts, mappings):
+    """ Merge the values of variables in joint counts, e.g. into bins or coarser categories.
+
+    The counts of the values mapped to the same new value are summed, without going back to the
+    samples. Only the distinct values of each variable are mapped, so that rebinning is fast
+    even for very large datasets.
+
+    The rebinned counts can be passed on to `empirical_joint_pmf_from_counts`,
+    `significance_from_counts` or `pvalues_from_counts`. Under independence, the bootstrapped
+    counts of merged values are distributed as if they were drawn from the merged marginal
+    distributions, so that the null distribution of the rebinned counts is exactly the one
+    computed from them. With a `NullCache`, it is only computed once per granularity.
+
+    Parameters
+    ----------
+    samples_counts : DataFrame or Series
+        Joint counts, as returned by `joint_counts` (or as `others['counts']` of
+        `empirical_joint_pmf_details`), or by `multivariate_joint_counts`.
+    mappings : dict
+        For each variable to rebin, by label, the new value of each value: a dict, a Series or
+        a function. Values that are not in a dict or Series are kept; values mapped to None
+        (or NaN) are dropped.
+
+    Returns
+    -------
+    rebinned_counts : DataFrame or Series
+        Joint counts of the new values, in the same format as `samples_counts`, with the new
+        values of each rebinned variable sorted.
+    """
+    names = _variable_axes(samples_counts)
+    if isinstance(samples_counts, pd.Series):
+        index = samples_counts.index
+        levels = list(index.levels)
+        codes = [np.asarray(level_codes) for level_codes in index.codes]
+        for variable, mapping in mappings.items():
+            position, values, _ = _variable_values(samples_counts, variable)
+            new_codes, levels[position] = factorize(_map_values(values, mapping))
+            codes[position] = np.append(new_codes, -1)[codes[position]]
+        cells, counts = sparse_tensor_counts_from_codes(
+            codes, [len(level) for level in levels], weights=samples_counts.to_numpy())
+        index = pd.MultiIndex(levels=levels, codes=list(cells.T), names=names,
+                              verify_integrity=False)
+        return pd.Series(data=counts, index=index.remove_unused_levels())
+
+    counts = samples_counts.to_numpy()
+    axes = [samples_counts.index, samples_counts.columns]
+    for variable, mapping in mappings.items():
+        position, values, _ = _variable_values(samples_counts, variable)
+        new_codes, new_values = factorize(_map_values(values, mapping))
+        counts = _rebin_axis(counts, new_codes, len(new_values), position)
+        axes[position] = new_values.rename(variable)
+    return pd.DataFrame(data=counts, index=axes[0], columns=axes[1])
+
+
+def merge_rare_categories(samples_counts, variable, min_pmf=None, max_categories=None,
+                          other='other'):
+    """ Merge the rare values of a variable in joint counts into a single category.
+
+    Parameters
+    ----------
+    samples_counts : DataFrame or Series
+        Joint counts, see `rebin_counts`.
+    variable : label
+        The variable whose rare values are merged.
+    min_pmf : float or None
+        Merge the values with a marginal probability smaller than `min_pmf`.
+    max_categories : int or None
+        Keep at most `max_categories` categories, including the merged one: all values but the
+        `max_categories - 1` most frequent ones are merged.
+    other : label
+        Value of the merged category. Default is `'other'`.
+
+    Returns
+    -------
+    rebinned_counts : DataFrame or Series
+        Joint counts with the rare values merged, in the same format as `samples_counts`.
+    """
+    values, counts = _marginal_counts(samples_counts, variable)
+    rare = np.zeros(len(values), dtype=bool)
+    if min_pmf is not None:
+        rare |= counts < min_pmf * counts.sum()
+    if max_categories is not None and len(values) > max_categories:
+        rare[_descending_order(counts)[max_categories - 1:]] = True
+    if rare.sum() < 2:
+        # Merging a single value would only rename it
+        return samples_counts
+    mapping = dict(zip(values[rare], [other] * int(rare.sum())))
+    return rebin_counts(samples_counts, {variable: mapping})
+
+
+def _apportion_bins(masses, n_bins):
+    """ Number of bins of each group of values, proportional to their total counts `masses`.
+
+    Each group gets at least one bin, or, if there are fewer bins than groups, only the
+    heaviest groups get one.
+    """
+    n_group_bins = np.zeros(len(masses), dtype=np.int64)
+    if n_bins < len(masses):
+        n_group_bins[np.argsort(-masses, kind='stable')[:n_bins]] = 1
+        return n_group_bins
+    n_group_bins += 1
+    # Largest remainder method for the other bins
+    shares = masses / max(masses.sum(), 1) * (n_bins - len(masses))
+    n_group_bins += np.floor(shares).astype(np.int64)
+    remainders = shares - np.floor(shares)
+    n_remaining = n_bins - n_group_bins.sum()
+    n_group_bins[np.argsort(-remainders, kind='stable')[:n_remaining]] += 1
+    return n_group_bins
+
+
+def _quantile_bins(counts, n_bins):
+    """ Bin of each of the sorted values with `counts`, see `quantile_bin_categories`.
+
+    Returns
+    -------
+    bins : array
+        Non-decreasing bin number of each value.
+    """
+    # Values more frequent than the average bin of the other values get their own bin
+    heavy = np.zeros(len(counts), dtype=bool)
+    while True:
+        n_light_bins = n_bins - np.count_nonzero(heavy)
+        new = ~heavy & (counts * n_light_bins > counts[~heavy].sum())
+        if not new.any():
+            break
+        heavy |= new
+    # The other values are split between the heavy ones into runs of consecutive values
+    run_starts = np.flatnonzero(np.r_[True, heavy[1:] | heavy[:-1]])
+    run_stops = np.r_[run_starts[1:], len(counts)]
+    light_runs = [(start, stop) for start, stop in zip(run_starts, run_stops)
+                  if not heavy[start]]
+    n_run_bins = dict(zip(
+        light_runs,
+        _apportion_bins(np.array([counts[start:stop].sum() for start, stop in light_runs]),
+                        n_light_bins),
+    ))
+    bins = np.empty(len(counts), dtype=np.int64)
+    next_bin = 0
+    for start, stop in zip(run_starts, run_stops):
+        n_bins_run = n_run_bins.get((start, stop), 1)
+        if n_bins_run == 0:
+            # Runs without a bin are merged with the previous (or next) heavy value
+            bins[start:stop] = max(next_bin - 1, 0)
+            continue
+        # Each value goes to the bin of the quantile of the run at which its counts start
+        run_counts = counts[start:stop]
+        run_start = (np.cumsum(run_counts) - run_counts) / max(run_counts.sum(), 1)
+        bins[start:stop] = next_bin + np.minimum((run_start * n_bins_run).astype(np.int64),
+                                                 n_bins_run - 1)
+        next_bin += n_bins_run
+    return bins
+
+
+def quantile_bin_categories(samples_counts, variable, n_bins):
+    """ Bin the values of an ordinal variable in joint counts into quantiles.
+
+    The sorted values are split into at most `n_bins` bins of consecutive values, with about the
+    same marginal probability each. A value more frequent than the average bin takes a bin of its
+    own, and the other values are split into the remaining bins, so that there can be fewer bins.
+
+    Parameters
+    ----------
+    samples_counts : DataFrame or Series
+        Joint counts, see `rebin_counts`.
+    variable : label
+        The ordinal variable to bin.
+    n_bins : int
+        Maximum number of bins.
+
+    Returns
+    -------
+    rebinned_counts : DataFrame or Series
+        Joint counts of the bins, in the same format as `samples_counts`. Each bin is labelled
+        by the closed `Interval` from its smallest to its largest value.
+    """
+    values, counts = _marginal_counts(samples_counts, variable)
+    order = np.argsort(values)
+    values = values.take(order)
+    counts = counts[order]
+    bins = _quantile_bins(counts, n_bins)
+    first = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    last = np.r_[first[1:] - 1, len(values) - 1]
+    labels = [pd.Interval(values[i], values[j], closed='both') for i, j in zip(first, last)]
+    mapping = dict(zip(values, np.repeat(labels, np.diff(np.r_[first, len(values)]))))
+    return rebin_counts(samples_counts, {variable: mapping})
@@ -0,0 +1,221 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import functools
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+from empirical_copula import empirical_joint_pmf
+from empirical_copula.instrumentation import ComputationCancelled, cancellable
+from empirical_copula.significance import significance_from_bootstrap
+
+
+def dataset_fingerprint(samples):
+    """ Key identifying the content of `samples`, to recognize requests on the same data.
+
+    The key depends on the column names, dtypes and values, but not on the index.
+
+    Parameters
+    ----------
+    samples : DataFrame or Series
+        The data.
+
+    Returns
+    -------
+    key : str
+        Hexadecimal digest of the data.
+    """
+    if isinstance(samples, pd.Series):
+        samples = samples.to_frame()
+    hasher = hashlib.sha256()
+    hasher.update(repr((list(samples.columns), [str(dtype) for dtype in samples.dtypes])).encode())
+    hasher.update(pd.util.hash_pandas_object(samples, index=False).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+
+def _request_value(value):
+    """ Hashable representation of an argument of a request. """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return ('data', dataset_fingerprint(value))
+    if isinstance(value, np.ndarray):
+        digest = hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+        return ('array', value.dtype.str, value.shape, digest)
+    if isinstance(value, (list, tuple)):
+        return tuple(_request_value(item) for item in value)
+    if isinstance(value, dict):
+        return tuple((key, _request_value(item)) for key, item in sorted(value.items()))
+    try:
+        hash(value)
+    except TypeError:
+        # The object is kept alive by the computation as long as the key is in use
+        return ('id', id(value))
+    return value
+
+
+def _select(samples, columns):
+    return samples if columns is None else samples[list(columns)]
+
+
+def _dataset_key(samples, columns):
+    return dataset_fingerprint(_select(samples, columns))
+
+
+def _run(event, func, samples, columns, args, kwargs):
+    """ Call `func` in a worker thread, stopping when `event` is set. """
+    if event.is_set():
+        raise ComputationCancelled('Cancelled before starting')
+    with cancellable(event):
+        return func(_select(samples, columns), *args, **kwargs)
+
+
+class _Computation:
+    """ A running computation, and the number of requests waiting for it. """
+
+    def __init__(self, executor_future, future, event):
+        self.executor_future = executor_future
+        self.future = future
+        self.event = event
+        self.n_waiters = 0
+
+
+class CopulaService:
+    """ Run the computations of `empirical_copula` from asyncio code, e.g. in a web service.
+
+    The computations run in a pool of threads, so that they do not block the event loop.
+    Concurrent identical requests, with the same function, data and arguments, are merged into
+    a single computation, whose result is returned to all of them. When all the requests
+    waiting for a computation are cancelled, e.g. because clients disconnected or timed out
+    with `asyncio.wait_for`, the computation stops at the end of the current block of
+    bootstrapped datasets, see `cancellable`.
+
+    The data of a request is identified by `dataset_fingerprint`, computed in the default
+    executor of the event loop, or by the `dataset_key` given with the request, e.g. the name
+    and version of a dataset. The result of a merged computation is shared by the requests, and
+    should not be modified in place.
+
+    Parameters
+    ----------
+    max_workers : int or None
+        Maximum number of computations running at the same time, see `ThreadPoolExecutor`.
+        Ignored if `executor` is given.
+    executor : ThreadPoolExecutor or None
+        Executor running the computations. It must run them in threads of this process, so that
+        they can be cancelled. Default is None, a new executor is created and shut down by
+        `close`.
+    cache : NullCache or None
+        Cache of the distributions under independence passed to `significance_from_bootstrap`,
+        unless a request passes its own. Default is None.
+
+    Examples
+    --------
+    >>> async with CopulaService(max_workers=4) as service:
+    ...     pmf1, pmf2, empirical_pmf = await service.empirical_joint_pmf(
+    ...         data, columns=['age', 'city'])
+    ...     _, _, significance = await service.significance_from_bootstrap(
+    ...         data, 10000, [0.01, 0.1], columns=['age', 'city'], random_state=0)
+    """
+
+    def __init__(self, max_workers=None, executor=None, cache=None):
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers,
+                                          thread_name_prefix='empirical_copula')
+        self.executor = executor
+        self.cache = cache
+        self._running = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """ Cancel the running computations, and shut down the executor if it was created by the
+        service. """
+        for computation in list(self._running.values()):
+            computation.event.set()
+            # Computations still queued in the executor never start
+            computation.executor_future.cancel()
+            computation.future.cancel()
+        self._running.clear()
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
+
+    def _forget(self, key, computation, future=None):
+        if self._running.get(key) is computation:
+            del self._running[key]
+
+    def _start(self, key, func, samples, columns, args, kwargs):
+        event = threading.Event()
+        # Profilers active in the request also record the computation
+        context = contextvars.copy_context()
+        executor_future = self.executor.submit(context.run, _run, event, func, samples, columns,
+                                               args, kwargs)
+        future = asyncio.wrap_future(executor_future)
+        computation = _Computation(executor_future, future, event)
+        future.add_done_callback(functools.partial(self._forget, key, computation))
+        self._running[key] = computation
+        return computation
+
+    async def run(self, func, samples, *args, columns=None, dataset_key=None, **kwargs):
+        """ Compute `func(samples[columns], *args, **kwargs)` in a worker thread.
+
+        Parameters
+        ----------
+        func : callable
+            A function of `empirical_copula` (or one calling them), taking the samples as first
+            argument.
+        samples : DataFrame
+            The data.
+        args
+            Other positional arguments of `func`.
+        columns : list or None
+            Columns of `samples` passed to `func`. Default is None, all columns.
+        dataset_key : hashable or None
+            Key identifying the content of `samples`. Default is None, the key is computed by
+            `dataset_fingerprint`.
+        kwargs
+            Keyword arguments of `func`.
+
+        Returns
+        -------
+        result
+            The return value of `func`.
+        """
+        if dataset_key is None:
+            loop = asyncio.get_running_loop()
+            dataset_key = await loop.run_in_executor(None, _dataset_key, samples, columns)
+        key = (func, dataset_key, _request_value(columns), _request_value(args),
+               _request_value(kwargs))
+        computation = self._running.get(key)
+        if computation is None:
+            computation = self._start(key, func, samples, columns, args, kwargs)
+        computation.n_waiters += 1
+        try:
+            return await asyncio.shield(computation.future)
+        except asyncio.CancelledError:
+            computation.n_waiters -= 1
+            if computation.n_waiters == 0:
+                computation.event.set()
+                computation.executor_future.cancel()
+                computation.future.cancel()
+                self._forget(key, computation)
+            raise
+
+    async def empirical_joint_pmf(self, samples, columns=None, dataset_key=None, **kwargs):
+        """ Compute the empirical joint probability, see `empirical_copula.empirical_joint_pmf`
+        and `run`. """
+        return await self.run(empirical_joint_pmf, samples, columns=columns,
+                              dataset_key=dataset_key, **kwargs)
+
+    async def significance_from_bootstrap(self, samples, n_bootstraps, p_levels_low,
+                                          columns=None, dataset_key=None, **kwargs):
+        """ Compute thresholds for significance under the 0-hypothesis of independence, see
+        `empirical_copula.significance.significance_from_bootstrap` and `run`. """
+        kwargs.setdefault('cache', self.cache)
+        return await self.run(significance_from_bootstrap, samples, n_bootstraps, p_levels_low,
+                              columns=columns, dataset_key=dataset_key, **kwargs)
@@ -1,10 +1,497 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import itertools
+
 import numpy as np
 import pandas as pd
+from scipy.special import gammaln, xlog1py, xlogy
+from scipy.stats import binom
+
+from empirical_copula import _n_workers, _split_weights, joint_counts
+from empirical_copula.codes import factorize, marginal_counts_from_codes
+from empirical_copula.instrumentation import _progress, _stage
+
+
+# Maximum number of cell counts drawn at once by the vectorized bootstrap engine
+_MAX_BATCH_ELEMENTS = 2 ** 24
+# Maximum number of bootstrapped datasets drawn from each independent random stream
+_BLOCK_SIZE = 1024
+# Maximum number of histogram bins of the pairs drawn together by
+# `significance_from_bootstrap_pairs`
+_MAX_PAIRS_HISTOGRAM_BINS = 2 ** 22
+# Counts further than `_TAIL_WIDTH` times (their standard deviation + 1) from their mean have a
+# negligible probability (below 1e-20), and are never drawn by `_CountDistributions`
+_TAIL_WIDTH = 10
+
+
+def _seed_sequence(random_state):
+    """ Root `SeedSequence` from which the random streams of the bootstrap blocks are spawned.
+
+    Parameters
+    ----------
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator. Generators are advanced to draw the root entropy.
+
+    Returns
+    -------
+    seed_sequence : SeedSequence
+    """
+    if isinstance(random_state, np.random.SeedSequence):
+        return random_state
+    if random_state is None or isinstance(random_state, (int, np.integer)):
+        return np.random.SeedSequence(random_state)
+    if isinstance(random_state, np.random.Generator):
+        entropy = random_state.integers(2 ** 32, size=4)
+    else:
+        # `numpy.random.RandomState` or the `numpy.random` module
+        entropy = random_state.randint(2 ** 32, size=4, dtype=np.int64)
+    return np.random.SeedSequence([int(e) for e in entropy])
+
+
+def _map_blocks(draw_block, n_bootstraps, block_size, random_state, n_jobs=None):
+    """ Call `draw_block(generator, size)` on consecutive blocks of bootstrapped datasets.
+
+    Every block of `block_size` datasets gets its own random stream, spawned from
+    `random_state`. The results only depend on the seed and not on how many workers draw the
+    blocks.
+
+    Parameters
+    ----------
+    draw_block : callable
+        Function called with a `numpy.random.Generator` and the number of datasets in the block.
+    n_bootstraps : int
+        Total number of bootstrapped datasets.
+    block_size : int
+        Number of bootstrapped datasets in each block.
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator, see `_seed_sequence`.
+    n_jobs : int or None
+        Number of threads drawing blocks in parallel. None or 1 draws in the calling thread, -1
+        uses all CPUs.
+
+    Yields
+    ------
+    result
+        The return value of `draw_block` for each block, in block order.
+    """
+    sizes = [min(block_size, n_bootstraps - start) for start in range(0, n_bootstraps, block_size)]
+    # Spawned one at a time, the streams are the same as spawned all at once, but the first block
+    # starts without delay for very large `n_bootstraps`
+    seed_sequence = _seed_sequence(random_state)
+    seeds = (seed_sequence.spawn(1)[0] for _ in sizes)
+    done = 0
+    _progress(done, n_bootstraps)
+
+    def run(seed, size):
+        return draw_block(np.random.default_rng(seed), size)
+
+    n_workers = _n_workers(n_jobs)
+    if n_workers == 1:
+        for seed, size in zip(seeds, sizes):
+            with _stage('resampling'):
+                block = run(seed, size)
+            done += size
+            _progress(done, n_bootstraps)
+            yield block
+        return
+
+    # Keep a bounded number of blocks in flight, so that memory does not grow with
+    # `n_bootstraps` when results are consumed as they come
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        pending = []
+        for seed, size in zip(seeds, sizes):
+            pending.append((executor.submit(run, seed, size), size))
+            if len(pending) < 2 * n_workers:
+                continue
+            future, size = pending.pop(0)
+            with _stage('resampling'):
+                block = future.result()
+            done += size
+            _progress(done, n_bootstraps)
+            yield block
+        for future, size in pending:
+            with _stage('resampling'):
+                block = future.result()
+            done += size
+            _progress(done, n_bootstraps)
+            yield block
+
+
+def _encode(samples):
+    """ Encode the two columns of `samples` as integer codes.
+
+    Rows with missing values are dropped, as they are by `joint_counts`.
+
+    Parameters
+    ----------
+    samples : DataFrame
+        Pandas DataFrame with two columns, each row representing a sample from two
+        discrete random variables.
+
+    Returns
+    -------
+    codes1 : array
+        Integer code of the value of the first variable for each sample.
+    codes2 : array
+        Integer code of the value of the second variable for each sample.
+    uniques1 : Index
+        Values of the first variable, see `factorize`; `codes1` indexes into it.
+    uniques2 : Index
+        Values of the second variable, see `factorize`; `codes2` indexes into it.
+    """
+    samples = samples.dropna()
+    codes1, uniques1 = factorize(samples.iloc[:, 0])
+    codes2, uniques2 = factorize(samples.iloc[:, 1])
+    return codes1, codes2, uniques1, uniques2
+
+
+def _bootstrap_loop(samples, n_bootstraps, random_state, n_jobs=None, weights=None):
+    """ Reference bootstrap engine, resampling one dataset at a time in the calling thread. """
+    col1, col2 = samples.columns
+    if weights is None:
+        n_samples, p = samples.shape[0], None
+    else:
+        n_samples, p = int(weights.sum()), weights.values / weights.sum()
+    bootstrap_counts = []
+    _progress(0, n_bootstraps)
+    for i in range(n_bootstraps):
+        with _stage('resampling'):
+            bootstrap_samples = pd.DataFrame(
+                data={
+                    col1: random_state.choice(samples[col1], size=n_samples, replace=True, p=p),
+                    col2: random_state.choice(samples[col2], size=n_samples, replace=True, p=p),
+                }
+            )
+            counts = joint_counts(bootstrap_samples)
+            bootstrap_counts.append(counts.unstack())
+        _progress(i + 1, n_bootstraps)
+
+    bootstrap_counts = pd.concat(bootstrap_counts, axis=1).fillna(0)
+    return bootstrap_counts
+
+
+def _independent_cells(samples, weights=None):
+    """ Probability of each combination of values when resampling the two columns independently.
+
+    Returns
+    -------
+    n_samples : int
+        Number of samples in each bootstrapped dataset.
+    cells_pmf : array
+        Probability of each combination of values, in the order of `cells`.
+    cells : MultiIndex
+        Combinations of values of the second and first variable, ordered as in
+        `joint_counts(samples).unstack()`, i.e. with the first variable varying fastest.
+    """
+    col1, col2 = samples.columns
+    with _stage('marginals'):
+        codes1, codes2, uniques1, uniques2 = _encode(samples)
+        if weights is not None:
+            weights = weights[samples.notna().all(axis=1)].values
+        counts1 = marginal_counts_from_codes(codes1, len(uniques1), weights=weights)
+        counts2 = marginal_counts_from_codes(codes2, len(uniques2), weights=weights)
+        n_samples = int(counts1.sum())
+        pmf1 = counts1 / counts1.sum()
+        pmf2 = counts2 / counts2.sum()
+    cells_pmf = (pmf2[:, None] * pmf1[None, :]).ravel()
+    cells = pd.MultiIndex.from_product([uniques2, uniques1], names=[col2, col1])
+    return n_samples, cells_pmf, cells
+
+
+def _multinomial_blocks(n_samples, cells_pmf, n_bootstraps, random_state, n_jobs=None):
+    """ Draw the joint counts of bootstrapped datasets, in blocks of size (block size, n_cells).
+
+    Resampling the two columns independently puts each bootstrapped sample in cell (i, j) with
+    probability pmf1[i] * pmf2[j], independently of all other samples. The joint counts of a
+    bootstrapped dataset are thus distributed as a multinomial over the cells, which can be
+    drawn directly without materializing the resampled datasets.
+
+    The blocks are drawn with independent random streams, see `_map_blocks`.
+    """
+    def draw_block(generator, size):
+        return generator.multinomial(n_samples, cells_pmf, size=size)
+
+    n_cells = cells_pmf.shape[0]
+    block_size = max(1, min(_BLOCK_SIZE, _MAX_BATCH_ELEMENTS // n_cells))
+    return _map_blocks(draw_block, n_bootstraps, block_size, random_state, n_jobs=n_jobs)
+
+
+def _bootstrap_vectorized(samples, n_bootstraps, random_state, n_jobs=None, weights=None):
+    """ Vectorized bootstrap engine, drawing the joint counts of many datasets at once. """
+    n_samples, cells_pmf, cells = _independent_cells(samples, weights=weights)
+    counts = np.empty((cells_pmf.shape[0], n_bootstraps), dtype=np.int64)
+    start = 0
+    for block in _multinomial_blocks(n_samples, cells_pmf, n_bootstraps, random_state, n_jobs):
+        counts[:, start:start + block.shape[0]] = block.T
+        start += block.shape[0]
+
+    bootstrap_counts = pd.DataFrame(data=counts, index=cells)
+    return bootstrap_counts
+
+
+class _CountsHistogram:
+    """ Running histogram of the bootstrapped counts of each cell.
+
+    Each cell only has bins for the range of counts observed in it, so that the memory used is
+    proportional to the sum over the cells of their range of counts, and does not grow with the
+    number of bootstrapped datasets. Quantiles computed from the histogram are exactly those of
+    the accumulated counts.
+    """
+
+    def __init__(self, n_cells):
+        self.n_cells = n_cells
+        self.n_bootstraps = 0
+        # The bins of all cells are stored one after the other in a flat array: bin
+        # `starts[c] + k` holds the number of times `offset[c] + k` was observed in cell `c`, for
+        # `k` smaller than `width[c]`
+        self.offset = np.zeros(n_cells, dtype=np.int64)
+        self.width = np.zeros(n_cells, dtype=np.int64)
+        self.starts = np.zeros(n_cells + 1, dtype=np.int64)
+        self.histogram = np.zeros(0, dtype=np.int32)
+
+    def _extend(self, low, high):
+        """ Extend the bins so that each cell covers the counts from `low` to `high`. """
+        if self.n_bootstraps > 0:
+            low = np.minimum(low, self.offset)
+            high = np.maximum(high, self.offset + self.width - 1)
+            if (low == self.offset).all() and (high - low + 1 == self.width).all():
+                return
+        width = high - low + 1
+        starts = np.zeros(self.n_cells + 1, dtype=np.int64)
+        np.cumsum(width, out=starts[1:])
+        histogram = np.zeros(starts[-1], dtype=np.int32)
+        if self.n_bootstraps > 0:
+            # Move the bins of each cell to their new position
+            shift = starts[:-1] + (self.offset - low) - self.starts[:-1]
+            positions = np.arange(self.histogram.shape[0]) + np.repeat(shift, self.width)
+            histogram[positions] = self.histogram
+        self.offset = low
+        self.width = width
+        self.starts = starts
+        self.histogram = histogram
+
+    def update(self, counts):
+        """ Add the counts of a block of bootstrapped datasets, of size (block size, n_cells). """
+        with _stage('quantile_estimation'):
+            self._extend(counts.min(axis=0), counts.max(axis=0))
+            bins = counts - (self.offset - self.starts[:-1])
+            self.histogram += np.bincount(
+                bins.ravel(), minlength=self.histogram.shape[0]).astype(np.int32)
+            self.n_bootstraps += counts.shape[0]
+
+    def merge(self, other):
+        """ Add the counts accumulated in `other`, a `_CountsHistogram` of the same cells. """
+        with _stage('quantile_estimation'):
+            self._extend(other.offset, other.offset + other.width - 1)
+            if (self.offset == other.offset).all() and (self.width == other.width).all():
+                self.histogram += other.histogram
+            else:
+                shift = self.starts[:-1] + (other.offset - self.offset) - other.starts[:-1]
+                positions = np.arange(other.histogram.shape[0]) + np.repeat(shift, other.width)
+                self.histogram[positions] += other.histogram
+            self.n_bootstraps += other.n_bootstraps
+
+    def take(self, cells):
+        """ `_CountsHistogram` of the cells at positions `cells`. """
+        histogram = _CountsHistogram(len(cells))
+        histogram.n_bootstraps = self.n_bootstraps
+        histogram.offset = self.offset[cells]
+        histogram.width = self.width[cells]
+        np.cumsum(histogram.width, out=histogram.starts[1:])
+        shift = self.starts[cells] - histogram.starts[:-1]
+        positions = np.arange(histogram.starts[-1]) + np.repeat(shift, histogram.width)
+        histogram.histogram = self.histogram[positions]
+        return histogram
+
+    def _cumulative(self):
+        """ Cumulative sum of the flat bins, starting with 0: the number of counts of cell `c`
+        smaller than `offset[c] + k` is `cumulative[starts[c] + k] - cumulative[starts[c]]`. """
+        cumulative = np.zeros(self.histogram.shape[0] + 1, dtype=np.int64)
+        np.cumsum(self.histogram, out=cumulative[1:])
+        return cumulative
 
-from empirical_copula import joint_counts
+    def quantile(self, levels):
+        """ Quantiles of the counts of each cell, as an array of size (n_cells, n_levels).
 
+        Quantiles are linearly interpolated between order statistics, as in
+        `DataFrame.quantile`.
+        """
+        with _stage('quantile_estimation'):
+            cumulative = self._cumulative()
+            base = cumulative[self.starts[:-1]]
 
-def _bootstrap_independently(samples, n_bootstraps, random_state=np.random):
+            def order_statistic(k):
+                # The k-th order statistic is in the first bin with more than k counts up to it;
+                # the flat cumulative sum is sorted, and cell `c` has all its counts in its bins
+                position = np.searchsorted(cumulative[1:], base + k, side='right')
+                return self.offset + (position - self.starts[:-1])
+
+            quantiles = np.empty((self.n_cells, len(levels)))
+            for i, level in enumerate(levels):
+                position = level * (self.n_bootstraps - 1)
+                below = int(np.floor(position))
+                above = min(below + 1, self.n_bootstraps - 1)
+                fraction = position - below
+                value_below = order_statistic(below)
+                value_above = order_statistic(above) if fraction > 0 else value_below
+                quantiles[:, i] = value_below + fraction * (value_above - value_below)
+        return quantiles
+
+    def tail_counts(self, values):
+        """ Number of accumulated counts of each cell at or below, and at or above, `values`.
+
+        Parameters
+        ----------
+        values : array of size (n_cells,)
+            A count for each cell.
+
+        Returns
+        -------
+        n_below : array of size (n_cells,)
+            Number of accumulated counts smaller than or equal to the value of each cell.
+        n_above : array of size (n_cells,)
+            Number of accumulated counts larger than or equal to the value of each cell.
+        """
+        cumulative = self._cumulative()
+        first = self.starts[:-1]
+        base = cumulative[first]
+        position = np.asarray(values, dtype=np.int64) - self.offset
+        n_below = cumulative[first + np.clip(position + 1, 0, self.width)] - base
+        n_above = self.n_bootstraps - (cumulative[first + np.clip(position, 0, self.width)] - base)
+        return n_below, n_above
+
+
+class _CountDistributions:
+    """ Independent distributions of the counts of cells, from which the histogram of the counts
+    of many datasets is drawn at once.
+
+    The histogram of the counts of a cell in `size` datasets drawn independently is multinomial,
+    over the possible counts of the cell. It is drawn directly, at a cost that grows with the
+    range of likely counts of each cell, rather than with the number of datasets.
+
+    This is only valid for statistics of each cell separately, as computed by
+    `_CountsHistogram`, since the counts of different cells are drawn independently.
+
+    Parameters
+    ----------
+    mean : array of size (n_cells,)
+        Mean count of each cell.
+    std : array of size (n_cells,)
+        Standard deviation of the count of each cell.
+    lower : array of size (n_cells,)
+        Smallest possible count of each cell.
+    upper : array of size (n_cells,)
+        Largest possible count of each cell.
+    log_pmf : callable
+        Function called with an array of cell positions and an array of counts, broadcast
+        together, returning the logarithm of the probability of each count in its cell, up to a
+        constant for each cell.
+    n_first : int or None
+        If given, the first `n_first` cells are drawn before the others, so that their
+        histograms are the same as for distributions of these cells only.
+    """
+
+    def __init__(self, mean, std, lower, upper, log_pmf, n_first=None):
+        margin = _TAIL_WIDTH * (std + 1)
+        self.low = np.maximum(lower, np.floor(mean - margin)).astype(np.int64)
+        high = np.minimum(upper, np.ceil(mean + margin)).astype(np.int64)
+        self.width = high - self.low + 1
+        self.starts = np.zeros(len(self.width) + 1, dtype=np.int64)
+        np.cumsum(self.width, out=self.starts[1:])
+        self.log_pmf = log_pmf
+        self.chunks = []
+        n_first = len(self.width) if n_first is None else n_first
+        for group in [np.arange(n_first), np.arange(n_first, len(self.width))]:
+            # Draw cells of similar width together, padding them to the widest one
+            order = group[np.argsort(self.width[group], kind='stable')]
+            start = 0
+            while start < len(order):
+                max_width = self.width[order[start]] * 5 // 4 + 8
+                # Smaller batches than when drawing counts, as each count takes several
+                # temporaries
+                max_cells = max(1, _MAX_BATCH_ELEMENTS // 8 // max_width)
+                stop = start + 1
+                while (stop < len(order) and stop - start < max_cells
+                       and self.width[order[stop]] <= max_width):
+                    stop += 1
+                self.chunks.append(order[start:stop])
+                start = stop
+
+    def _pmf(self, cells):
+        """ Probability of the counts of `cells`, as an array of size (n_cells, width): count
+        `low[cells[i]] + k` has probability `pmf[i, k]`. """
+        width = self.width[cells]
+        offsets = np.arange(width.max())[None, :]
+        # Padding repeats the largest count of each cell, before being given probability 0
+        values = self.low[cells, None] + np.minimum(offsets, width[:, None] - 1)
+        log_pmf = self.log_pmf(cells[:, None], values)
+        log_pmf[offsets >= width[:, None]] = -np.inf
+        pmf = np.exp(log_pmf - log_pmf.max(axis=1, keepdims=True))
+        pmf /= pmf.sum(axis=1, keepdims=True)
+        return pmf
+
+    def draw_histogram(self, generator, size):
+        """ `_CountsHistogram` of the counts of `size` datasets. """
+        bins = np.empty(self.starts[-1], dtype=np.int32)
+        for cells in self.chunks:
+            pmf = self._pmf(cells)
+            counts = generator.multinomial(size, pmf)
+            offsets = np.arange(pmf.shape[1])[None, :]
+            inside = offsets < self.width[cells, None]
+            bins[(self.starts[cells, None] + offsets)[inside]] = counts[inside]
+        histogram = _CountsHistogram(len(self.width))
+        histogram.n_bootstraps = size
+        histogram.offset, histogram.width, histogram.starts = self.low, self.width, self.starts
+        histogram.histogram = bins
+        return histogram
+
+
+def _hypergeometric_distributions(n_samples, row_counts, column_counts, n_first=None):
+    """ `_CountDistributions` of the counts of cells when pairing at random `n_samples` samples,
+    `row_counts` of which have the value of the first variable of each cell, and
+    `column_counts` the value of the second variable. """
+    row_counts = np.asarray(row_counts, dtype=np.int64)
+    column_counts = np.asarray(column_counts, dtype=np.int64)
+    mean = row_counts * column_counts / n_samples
+    variance = (mean * (n_samples - row_counts) * (n_samples - column_counts)
+                / (n_samples * max(n_samples - 1, 1)))
+
+    def log_pmf(cells, values):
+        rows, columns = row_counts[cells], column_counts[cells]
+        # The terms that only depend on the cell cancel out when normalizing
+        return -(gammaln(values + 1.0) + gammaln(rows - values + 1.0)
+                 + gammaln(columns - values + 1.0)
+                 + gammaln(n_samples - rows - columns + values + 1.0))
+
+    return _CountDistributions(mean, np.sqrt(variance),
+                               np.maximum(0, row_counts + column_counts - n_samples),
+                               np.minimum(row_counts, column_counts), log_pmf,
+                               n_first=n_first)
+
+
+def _binomial_distributions(n_samples, cells_pmf):
+    """ `_CountDistributions` of the counts of cells with probabilities `cells_pmf`, an array of
+    size (n_cells,), in `n_samples` independent draws. """
+    mean = n_samples * cells_pmf
+    std = np.sqrt(mean * (1 - cells_pmf))
+
+    def log_pmf(cells, values):
+        pmf = cells_pmf[cells]
+        # The terms that only depend on the cell cancel out when normalizing
+        return (xlogy(values, pmf) + xlog1py(n_samples - values, -pmf)
+                - gammaln(values + 1.0) - gammaln(n_samples - values + 1.0))
+
+    return _CountDistributions(mean, std, 0, n_samples, log_pmf)
+
+
+_BOOTSTRAP_ENGINES = {
+    'loop': _bootstrap_loop,
+    'vectorized': _bootstrap_vectorized,
+}
+
+
+def _bootstrap_independently(samples, n_bootstraps, random_state=np.random, engine='vectorized',
+                             n_jobs=None, weights=None):
     """ Create datasets with empirical distribution as samples but all dependencies removed.
 
     The two columns of `samples` are sampled with repetition, independently and with number of
@@ -20,8 +507,21 @@ def _bootstrap_independently(samples, n_bootstraps, random_state=np.random):
         a number of unique values per column much smaller than the number of samples.
     n_bootstraps : int
         Number of bootstrapped datasets.
-    random_state : numpy.RandomState
-        Random number generator. Default is `numpy.random`.
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator. Default is `numpy.random`. The `'vectorized'` engine
+        spawns an independent `numpy.random.Generator` for each block of bootstrapped datasets
+        from it; the `'loop'` engine requires a `RandomState` or `numpy.random`.
+    engine : {'vectorized', 'loop'}
+        `'vectorized'` (default) draws the joint counts of all bootstrapped datasets in large
+        batches, without building the resampled datasets. `'loop'` resamples and counts one
+        dataset at a time, and is kept as a reference implementation.
+    n_jobs : int or None
+        Number of threads drawing bootstrapped datasets in parallel with the `'vectorized'`
+        engine. None (default) or 1 uses the calling thread only, -1 uses all CPUs. For a given
+        seed, the result is identical for any number of threads.
+    weights : Series or None
+        Number of times each row of `samples` was observed. The bootstrapped datasets have as
+        many samples as the total weight, drawn from the weighted marginal distributions.
 
     Returns
     -------
@@ -31,23 +531,369 @@ def _bootstrap_independently(samples, n_bootstraps, random_state=np.random):
         bootstrap resampling.
 
     """
-    col1, col2 = samples.columns
-    bootstrap_counts = []
-    for _ in range(n_bootstraps):
-        bootstrap_samples = pd.DataFrame(
-            data={
-                col1: random_state.choice(samples[col1], size=samples.shape[0], replace=True),
-                col2: random_state.choice(samples[col2], size=samples.shape[0], replace=True),
-            }
+    try:
+        bootstrap_engine = _BOOTSTRAP_ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Unknown bootstrap engine {engine!r}, expected one of "
+                         f"{sorted(_BOOTSTRAP_ENGINES)}")
+    return bootstrap_engine(samples, n_bootstraps, random_state, n_jobs=n_jobs, weights=weights)
+
+
+def _quantile_levels(p_levels_low):
+    """ Quantile levels and their labels for the low and high tail, see
+    `significance_from_bootstrap`. """
+    n_levels = len(p_levels_low)
+    p_levels_high = [1.0 - l for l in reversed(p_levels_low)]
+    quantile_levels = p_levels_low + [0] + p_levels_high
+    quantile_levels_labels = (
+            [-(n_levels - i) for i in range(n_levels)]
+            + [0]
+            + [i+1 for i in range(n_levels)]
+    )
+    return quantile_levels, quantile_levels_labels
+
+
+def _align_quantiles(samples_counts, quantiles):
+    """ Align quantiles of the bootstrapped counts with the observed counts.
+
+    Parameters
+    ----------
+    samples_counts : DataFrame
+        Observed counts for each combination of values of the two variables.
+    quantiles : DataFrame
+        Quantiles for each combination of values (rows, as in the output of
+        `_bootstrap_independently`) and quantile level (columns).
+
+    Returns
+    -------
+    quantiles : array
+        Quantiles as an array of size (n_quantiles, n1, n2).
+    """
+    cells = pd.MultiIndex.from_product([samples_counts.columns, samples_counts.index])
+    quantiles = quantiles.reindex(cells)
+    n1, n2 = samples_counts.shape
+    quantiles = quantiles.values.reshape(n2, n1, quantiles.shape[1]).transpose(2, 1, 0)
+    return quantiles
+
+
+def _cells_pmf(samples_counts):
+    """ Probability of each combination of values when resampling the two variables
+    independently.
+
+    Parameters
+    ----------
+    samples_counts : DataFrame or Series
+        Observed joint counts, as returned by `joint_counts`.
+
+    Returns
+    -------
+    n_samples : int
+        Number of samples.
+    cells_pmf : array
+        Probability of each combination of values, of the same shape as `samples_counts`.
+    """
+    with _stage('marginals'):
+        n_samples = samples_counts.values.sum()
+        if isinstance(samples_counts, pd.Series):
+            pmf1 = samples_counts.groupby(level=0).sum() / n_samples
+            pmf2 = samples_counts.groupby(level=1).sum() / n_samples
+            cells_pmf = (pmf1.reindex(samples_counts.index.get_level_values(0)).values
+                         * pmf2.reindex(samples_counts.index.get_level_values(1)).values)
+        else:
+            counts = samples_counts.values
+            pmf1 = counts.sum(axis=1) / n_samples
+            pmf2 = counts.sum(axis=0) / n_samples
+            cells_pmf = pmf1[:, None] * pmf2[None, :]
+    return n_samples, cells_pmf
+
+
+def _analytic_quantiles(samples_counts, quantile_levels):
+    """ Quantiles of the counts under independence, as an array of size (n_quantiles, n1, n2),
+    or (n_quantiles, n_cells) for sparse counts.
+
+    Resampling the two variables independently puts each sample in cell (i, j) with probability
+    pmf1[i] * pmf2[j], so that the counts of each cell are binomially distributed.
+    """
+    n_samples, cells_pmf = _cells_pmf(samples_counts)
+    return _binomial_ppf(n_samples, cells_pmf, quantile_levels)
+
+
+def _binomial_ppf(n_samples, cells_pmf, quantile_levels):
+    """ Quantiles of the binomial counts of cells with probabilities `cells_pmf`, as an array of
+    size (n_quantiles,) + `cells_pmf.shape`. """
+    levels = np.asarray(quantile_levels, dtype=float).reshape((-1,) + (1,) * cells_pmf.ndim)
+    with _stage('quantile_estimation'):
+        quantiles = binom.ppf(levels, n_samples, cells_pmf[None])
+    return quantiles
+
+
+def _binomial_quantiles(samples_counts, n_bootstraps, quantile_levels, random_state,
+                        n_jobs=None):
+    """ Bootstrap quantiles of sparse counts, as an array of size (n_quantiles, n_cells).
+
+    Only the distribution of the counts of each cell matters for its quantiles. The bootstrapped
+    counts of each observed cell are drawn from their binomial distribution, without drawing the
+    unobserved cells.
+    """
+    histogram = _binomial_histogram(samples_counts, n_bootstraps, random_state, n_jobs=n_jobs)
+    return histogram.quantile(quantile_levels).T
+
+
+def _binomial_histogram(samples_counts, n_bootstraps, random_state, n_jobs=None):
+    """ `_CountsHistogram` of the bootstrapped counts of each cell of sparse counts. """
+    n_samples, cells_pmf = _cells_pmf(samples_counts)
+    return _binomial_cells_histogram(n_samples, cells_pmf, n_bootstraps, random_state,
+                                     n_jobs=n_jobs)
+
+
+def _binomial_cells_histogram(n_samples, cells_pmf, n_bootstraps, random_state, n_jobs=None):
+    """ `_CountsHistogram` of binomial counts of `n_samples` draws in cells with probabilities
+    `cells_pmf`, an array of size (n_cells,). """
+
+    def draw_block(generator, size):
+        return generator.binomial(n_samples, cells_pmf, size=(size, cells_pmf.shape[0]))
+
+    histogram = _CountsHistogram(cells_pmf.shape[0])
+    block_size = max(1, min(_BLOCK_SIZE, _MAX_BATCH_ELEMENTS // cells_pmf.shape[0]))
+    for block in _map_blocks(draw_block, n_bootstraps, block_size, random_state, n_jobs):
+        histogram.update(block)
+    return histogram
+
+
+def _multinomial_quantiles(samples_counts, n_bootstraps, quantile_levels, random_state,
+                           n_jobs=None, low_memory=False):
+    """ Bootstrap quantiles of dense counts, as an array of size (n_quantiles, n1, n2).
+
+    The joint counts of the bootstrapped datasets are drawn as in `_bootstrap_independently`
+    with the `'vectorized'` engine. With `low_memory`, they are accumulated in a
+    `_CountsHistogram` rather than kept in memory; the quantiles are the same.
+    """
+    n_samples, cells_pmf = _cells_pmf(samples_counts)
+    n1, n2 = cells_pmf.shape
+    # Draw the cells in the order of `_bootstrap_independently`, first variable varying fastest
+    blocks = _multinomial_blocks(n_samples, cells_pmf.T.ravel(), n_bootstraps, random_state,
+                                 n_jobs)
+    if low_memory:
+        histogram = _CountsHistogram(n1 * n2)
+        for block in blocks:
+            histogram.update(block)
+        quantiles = histogram.quantile(quantile_levels)
+    else:
+        bootstrap_counts = pd.DataFrame(np.concatenate(list(blocks)))
+        with _stage('quantile_estimation'):
+            quantiles = bootstrap_counts.quantile(quantile_levels).values.T
+    quantiles = quantiles.reshape(n2, n1, len(quantile_levels)).transpose(2, 1, 0)
+    return quantiles
+
+
+def _permutation_quantiles(samples_counts, n_permutations, quantile_levels, random_state,
+                           n_jobs=None):
+    """ Quantiles of the counts of permuted datasets, as an array of size (n_quantiles, n1, n2),
+    or (n_quantiles, n_cells) for sparse counts.
+
+    The counts are accumulated in a `_CountsHistogram`, so memory does not grow with the
+    number of permutations.
+    """
+    histogram = _permutation_histogram(samples_counts, n_permutations, random_state,
+                                       n_jobs=n_jobs)
+    quantiles = histogram.quantile(quantile_levels).T
+    return quantiles.reshape((len(quantile_levels),) + samples_counts.shape)
+
+
+def _permutation_histogram(samples_counts, n_permutations, random_state, n_jobs=None):
+    """ `_CountsHistogram` of the counts of permuted datasets, with the cells in the order of
+    `samples_counts.values.ravel()`.
+
+    Shuffling one variable relative to the other keeps both marginal counts exactly, and the
+    count of each cell is then hypergeometric. The histogram of the counts of each cell is
+    drawn directly for whole blocks of permutations, see `_CountDistributions`, at a cost that
+    depends neither on the number of samples nor on the number of permutations in a block.
+    For sparse counts, only the observed cells are drawn. For dense counts, the observed cells
+    are drawn first, so that the same seed gives the same histograms for dense and sparse
+    counts.
+    """
+    if isinstance(samples_counts, pd.Series):
+        rows, values1 = pd.factorize(samples_counts.index.get_level_values(0), sort=True)
+        columns, values2 = pd.factorize(samples_counts.index.get_level_values(1), sort=True)
+        counts = samples_counts.values
+        row_counts = np.bincount(rows, weights=counts, minlength=len(values1)).astype(np.int64)
+        column_counts = np.bincount(columns, weights=counts,
+                                    minlength=len(values2)).astype(np.int64)
+        cells = rows.astype(np.int64) * len(values2) + columns
+        # The observed cells, in the order of the dense counts
+        order = np.argsort(cells, kind='stable')
+        n_observed = len(cells)
+    else:
+        counts = samples_counts.values
+        row_counts = counts.sum(axis=1)
+        column_counts = counts.sum(axis=0)
+        observed = counts.ravel() > 0
+        order = np.concatenate([np.flatnonzero(observed), np.flatnonzero(~observed)])
+        cells = np.arange(counts.size)
+        n_observed = np.count_nonzero(observed)
+
+    cell_rows, cell_columns = np.divmod(cells[order], len(column_counts))
+    distributions = _hypergeometric_distributions(int(row_counts.sum()), row_counts[cell_rows],
+                                                  column_counts[cell_columns],
+                                                  n_first=n_observed)
+    histogram = _CountsHistogram(len(cells))
+    for block in _map_blocks(distributions.draw_histogram, n_permutations, _BLOCK_SIZE,
+                             random_state, n_jobs):
+        histogram.merge(block)
+    # Back to the order of `samples_counts`
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    return histogram.take(inverse)
+
+
+def _assign_significance(samples_counts, quantiles, p_levels_low):
+    """ Label each cell of `samples_counts` with the significance level it reaches.
+
+    `quantiles` holds the thresholds of each quantile level, in the order returned by
+    `significance_from_bootstrap`.
+    """
+    with _stage('threshold_assignment'):
+        counts = samples_counts.values
+        n_levels = len(p_levels_low)
+        significance = np.zeros_like(counts)
+        # More frequent than uniform
+        quantile_levels_labels_high = [i+1 for i in range(n_levels)]
+        for v in quantile_levels_labels_high:
+            significance[counts >= quantiles[n_levels + v]] = v
+
+        # Less frequent than uniform
+        quantile_levels_labels_low = [-(i+1) for i in range(n_levels)]
+        for v in quantile_levels_labels_low:
+            significance[counts <= quantiles[n_levels + v]] = v
+        if isinstance(samples_counts, pd.Series):
+            return pd.Series(data=significance, index=samples_counts.index)
+        significance = pd.DataFrame(
+            data=significance,
+            index=samples_counts.index,
+            columns=samples_counts.columns
         )
-        counts = joint_counts(bootstrap_samples)
-        bootstrap_counts.append(counts.unstack())
+        return significance
 
-    bootstrap_counts = pd.concat(bootstrap_counts, axis=1).fillna(0)
-    return bootstrap_counts
 
+def _null_quantiles(samples_counts, n_bootstraps, quantile_levels, random_state, method,
+                    n_jobs=None, low_memory=False):
+    """ Quantiles of the counts under independence, as an array of size (n_quantiles, n1, n2),
+    or (n_quantiles, n_cells) for sparse counts, see `significance_from_counts`. """
+    if method == 'analytic':
+        return _analytic_quantiles(samples_counts, quantile_levels)
+    if method == 'bootstrap' and isinstance(samples_counts, pd.Series):
+        return _binomial_quantiles(samples_counts, n_bootstraps, quantile_levels, random_state,
+                                   n_jobs=n_jobs)
+    if method == 'bootstrap':
+        return _multinomial_quantiles(samples_counts, n_bootstraps, quantile_levels,
+                                      random_state, n_jobs=n_jobs, low_memory=low_memory)
+    if method == 'permutation':
+        return _permutation_quantiles(samples_counts, n_bootstraps, quantile_levels,
+                                      random_state, n_jobs=n_jobs)
+    raise ValueError(f"Unknown method {method!r}, expected 'bootstrap', 'analytic' or "
+                     f"'permutation'")
+
+
+def _null_fingerprint(samples_counts, n_bootstraps, quantile_levels, random_state, method):
+    """ Key of the quantiles of the counts under independence in a `NullCache`.
+
+    The quantiles only depend on the marginal counts of the two variables (and, for sparse
+    counts, on which combinations of values are observed), on the method, the number of
+    bootstrapped datasets, the quantile levels, and the seed. Returns None if the quantiles are
+    not reproducible, i.e. if `random_state` is not an integer or a `SeedSequence`.
+    """
+    if method == 'analytic':
+        n_bootstraps, seed = None, None
+    elif isinstance(random_state, (int, np.integer)):
+        seed = int(random_state)
+    elif isinstance(random_state, np.random.SeedSequence):
+        seed = (random_state.entropy, random_state.spawn_key)
+    else:
+        return None
+
+    if isinstance(samples_counts, pd.Series):
+        rows, values1 = pd.factorize(samples_counts.index.get_level_values(0), sort=True)
+        columns, values2 = pd.factorize(samples_counts.index.get_level_values(1), sort=True)
+        counts = samples_counts.values
+        arrays = [np.bincount(rows, weights=counts, minlength=len(values1)),
+                  np.bincount(columns, weights=counts, minlength=len(values2)), rows, columns]
+    else:
+        counts = samples_counts.values
+        arrays = [counts.sum(axis=1), counts.sum(axis=0)]
 
-def significance_from_bootstrap(samples, n_bootstraps, p_levels_low, random_state=np.random):
+    hasher = hashlib.sha256()
+    hasher.update(repr((method, n_bootstraps, [float(q) for q in quantile_levels], seed,
+                        len(arrays))).encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        hasher.update(np.int64(array.shape[0]).tobytes())
+        hasher.update(array.tobytes())
+    return hasher.hexdigest()
+
+
+def significance_from_counts(samples_counts, n_bootstraps, p_levels_low, random_state=np.random,
+                             method='bootstrap', n_jobs=None, low_memory=False, cache=None):
+    """ Compute thresholds for significance under the 0-hypothesis of independence, from the
+    joint counts of the two variables.
+
+    This is `significance_from_bootstrap` for data that is already aggregated, e.g. a table of
+    counts computed in a database. The bootstrapped datasets are drawn from the marginal
+    distributions of the counts, with the same results as on the samples the counts come from.
+
+    Parameters
+    ----------
+    samples_counts : DataFrame or Series
+        Counts for each combination of the values of the two variables, as returned by
+        `joint_counts`. If a Series of the observed combinations of values, the significance is
+        computed as with `sparse=True` in `significance_from_bootstrap`.
+    n_bootstraps : int
+        Number of bootstrapped (or permuted) datasets. Ignored if `method` is `'analytic'`.
+    p_levels_low: list of floats
+        List of significance levels for the low tail, between 0 and 0.5 .
+        The function adds significance levels for the high tail.
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator. Default is `numpy.random`.
+    method : {'bootstrap', 'analytic', 'permutation'}
+        How to compute the distribution of the counts under independence, see
+        `significance_from_bootstrap`.
+    n_jobs : int or None
+        Number of threads used to draw the bootstrapped datasets, see `_bootstrap_independently`.
+    low_memory : bool
+        Accumulate the bootstrapped counts in histograms, see `significance_from_bootstrap`.
+    cache : NullCache or None
+        Cache of the quantiles of the counts under independence, see
+        `significance_from_bootstrap`.
+
+    Returns
+    -------
+    quantile_levels : list of floats
+        List of significance levels for the low and high tail.
+    quantile_levels_labels : list of int
+        List of labels for the significance levels.
+    significance : DataFrame or Series
+        The significance label of each combination of values, in the same layout as
+        `samples_counts`.
+    """
+    quantile_levels, quantile_levels_labels = _quantile_levels(p_levels_low)
+
+    key = None
+    if cache is not None:
+        key = _null_fingerprint(samples_counts, n_bootstraps, quantile_levels, random_state,
+                                method)
+    quantiles = cache.get(key) if key is not None else None
+    if quantiles is None:
+        quantiles = _null_quantiles(samples_counts, n_bootstraps, quantile_levels, random_state,
+                                    method, n_jobs=n_jobs, low_memory=low_memory)
+        if key is not None:
+            cache.put(key, quantiles)
+
+    significance = _assign_significance(samples_counts, quantiles, p_levels_low)
+    return quantile_levels, quantile_levels_labels, significance
+
+
+def significance_from_bootstrap(samples, n_bootstraps, p_levels_low, random_state=np.random,
+                                engine='vectorized', method='bootstrap', n_jobs=None,
+                                low_memory=False, sparse=False, weights=None, cache=None):
     """ Compute thresholds for significance under the 0-hypothesis of independence.
 
     Parameters
@@ -57,12 +903,46 @@ def significance_from_bootstrap(samples, n_bootstraps, p_levels_low, random_stat
         discrete random variables. The dtype of the columns does not matter, but it is expected
         a number of unique values per column much smaller than the number of samples.
     n_bootstraps : int
-        Number of bootstrapped datasets.
+        Number of bootstrapped (or permuted) datasets. Ignored if `method` is `'analytic'`.
     p_levels_low: list of floats
         List of significance levels for the low tail, between 0 and 0.5 .
         The function adds significance levels for the high tail.
-    random_state : numpy.RandomState
-        Random number generator. Default is `numpy.random`.
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator. Default is `numpy.random`.
+    engine : {'vectorized', 'loop'}
+        Bootstrap engine, see `_bootstrap_independently`. Default is `'vectorized'`. The
+        `'loop'` engine requires the `'bootstrap'` method.
+    method : {'bootstrap', 'analytic', 'permutation'}
+        How to compute the distribution of the counts under independence. `'bootstrap'`
+        (default) estimates it by resampling the two variables independently. `'analytic'` uses
+        the exact distribution of the resampled counts, a binomial with probability
+        pmf1[i] * pmf2[j] for cell (i, j), and is free of Monte Carlo noise. `'permutation'`
+        shuffles one variable relative to the other, which keeps both marginal distributions
+        exactly; the counts of a cell then vary less than when resampling, which matters for
+        the combinations of rare values. The permuted counts are accumulated as with
+        `low_memory`.
+    n_jobs : int or None
+        Number of threads used to draw the bootstrapped datasets, see `_bootstrap_independently`.
+    low_memory : bool
+        If True, accumulate a histogram of the bootstrapped counts of each combination of values
+        instead of keeping all bootstrapped counts in memory. The quantiles are the same, but
+        memory does not grow with `n_bootstraps`. Requires the `'vectorized'` engine.
+    sparse : bool
+        If True, only compute the significance of the observed combinations of values, with
+        memory scaling with their number rather than with the number of possible combinations.
+        The bootstrapped counts of each observed combination are drawn directly from their
+        distribution and accumulated as with `low_memory`. Requires the `'vectorized'` engine.
+    weights : None, label or array-like
+        Number of times each row of `samples` was observed, e.g. the counts of a table
+        aggregated by the two variables. Either the label of a third column of `samples`, or
+        an array with one (integer) weight per row. The bootstrapped datasets are drawn from the
+        weighted marginal distributions, with the same results as on the rows repeated
+        according to their weights. Default is None, each row was observed once.
+    cache : NullCache or None
+        If given, the quantiles of the counts under independence are looked up in the cache,
+        and stored in it after they are computed, see `NullCache`. They are only cached if
+        they are reproducible: with the `'analytic'` method, or if `random_state` is an integer
+        or a `SeedSequence`. Requires the `'vectorized'` engine. Default is None.
 
     Returns
     -------
@@ -70,40 +950,357 @@ def significance_from_bootstrap(samples, n_bootstraps, p_levels_low, random_stat
         List of significance levels for the low and high tail.
     quantile_levels_labels : list of int
         List of labels for the significance levels.
-    significance : DataFrame
+    significance : DataFrame or Series
         A table containing the significance label for all combinations of values for the two
-        variables.
+        variables. If `sparse` is True, a Series indexed by the observed combinations of values,
+        see `joint_counts`; the combinations that were never observed have a count of 0, and
+        thus always have the lowest label.
     """
+    if engine not in _BOOTSTRAP_ENGINES:
+        raise ValueError(f"Unknown bootstrap engine {engine!r}, expected one of "
+                         f"{sorted(_BOOTSTRAP_ENGINES)}")
+    if engine != 'vectorized' and method != 'bootstrap':
+        raise ValueError(f"The {engine!r} engine requires the 'bootstrap' method, got "
+                         f"{method!r}")
+    samples, weights = _split_weights(samples, weights)
 
-    n_levels = len(p_levels_low)
-    p_levels_high = [1.0 - l for l in reversed(p_levels_low)]
-    quantile_levels = p_levels_low + [0] + p_levels_high
-    quantile_levels_labels = (
-            [-(n_levels - i) for i in range(n_levels)]
-            + [0]
-            + [i+1 for i in range(n_levels)]
-    )
+    if engine == 'vectorized':
+        samples_counts = joint_counts(samples, sparse=sparse, weights=weights)
+        return significance_from_counts(samples_counts, n_bootstraps, p_levels_low,
+                                        random_state=random_state, method=method,
+                                        n_jobs=n_jobs, low_memory=low_memory, cache=cache)
 
-    bootstrap_counts = _bootstrap_independently(samples, n_bootstraps, random_state)
-    bootstrap_quantiles = bootstrap_counts.quantile(quantile_levels, axis=1).stack()
-
-    samples_counts = joint_counts(samples)
-    significance = np.zeros_like(samples_counts)
-    # More frequent than uniform
-    quantile_levels_high = p_levels_high
-    quantile_levels_labels_high = [i+1 for i in range(n_levels)]
-    for v, q in zip(quantile_levels_labels_high, quantile_levels_high):
-        significance[samples_counts >= bootstrap_quantiles.loc[q]] = v
-
-    # Less frequent than uniform
-    quantile_levels_low = p_levels_low[::-1]
-    quantile_levels_labels_low = [-(i+1) for i in range(n_levels)]
-    for v, q in zip(quantile_levels_labels_low, quantile_levels_low):
-        significance[samples_counts <= bootstrap_quantiles.loc[q]] = v
-    significance = pd.DataFrame(
-        data=significance,
-        index=samples_counts.index,
-        columns=samples_counts.columns
-    )
+    if sparse or low_memory or cache is not None:
+        raise ValueError("sparse=True, low_memory=True and cache require the 'vectorized' "
+                         "engine")
+    quantile_levels, quantile_levels_labels = _quantile_levels(p_levels_low)
+    samples_counts = joint_counts(samples, weights=weights)
+    bootstrap_counts = _bootstrap_independently(samples, n_bootstraps, random_state,
+                                                engine=engine, weights=weights)
+    with _stage('quantile_estimation'):
+        quantiles = bootstrap_counts.quantile(quantile_levels, axis=1).T
+        quantiles = _align_quantiles(samples_counts, quantiles)
+    significance = _assign_significance(samples_counts, quantiles, p_levels_low)
+    return quantile_levels, quantile_levels_labels, significance
+
+
+def _null_histogram(samples_counts, n_bootstraps, random_state, method, n_jobs=None):
+    """ `_CountsHistogram` of the counts of each cell under independence, with the cells in the
+    order of `samples_counts.values.ravel()`.
+
+    `method` is `'bootstrap'` or `'permutation'`, see `significance_from_bootstrap`.
+    """
+    if method == 'permutation':
+        return _permutation_histogram(samples_counts, n_bootstraps, random_state, n_jobs=n_jobs)
+    if isinstance(samples_counts, pd.Series):
+        return _binomial_histogram(samples_counts, n_bootstraps, random_state, n_jobs=n_jobs)
+
+    n_samples, cells_pmf = _cells_pmf(samples_counts)
+    n1, n2 = cells_pmf.shape
+    histogram = _CountsHistogram(n1 * n2)
+    for block in _multinomial_blocks(n_samples, cells_pmf.T.ravel(), n_bootstraps, random_state,
+                                     n_jobs):
+        # The blocks are drawn with the first variable varying fastest
+        histogram.update(block.reshape(-1, n2, n1).transpose(0, 2, 1).reshape(-1, n1 * n2))
+    return histogram
+
+
+def _adjust_fdr(pvalues):
+    """ Benjamini-Hochberg adjustment of the p-values, for a false discovery rate. NaN values
+    are ignored. """
+    adjusted = np.full_like(pvalues, np.nan, dtype=float)
+    valid = np.flatnonzero(~np.isnan(pvalues))
+    order = valid[np.argsort(pvalues[valid], kind='stable')]
+    n_tests = len(order)
+    scaled = pvalues[order] * n_tests / np.arange(1, n_tests + 1)
+    # Each adjusted p-value is the smallest scaled p-value of the larger p-values
+    adjusted[order] = np.minimum(1.0, np.minimum.accumulate(scaled[::-1])[::-1])
+    return adjusted
+
+
+def pvalues_from_counts(samples_counts, n_bootstraps, random_state=np.random, method='bootstrap',
+                        n_jobs=None, adjust=None):
+    """ Compute the two-sided p-value of each combination of values under the 0-hypothesis of
+    independence, from the joint counts of the two variables.
+
+    The p-values are computed in a single pass over the distribution of the counts under
+    independence, and can then be mapped to significance labels for any significance levels
+    with `significance_from_pvalues`, without drawing the datasets again.
 
+    Parameters
+    ----------
+    samples_counts : DataFrame or Series
+        Counts for each combination of the values of the two variables, as returned by
+        `joint_counts`.
+    n_bootstraps : int
+        Number of bootstrapped (or permuted) datasets. Ignored if `method` is `'analytic'`.
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator. Default is `numpy.random`.
+    method : {'bootstrap', 'analytic', 'permutation'}
+        How to compute the distribution of the counts under independence, see
+        `significance_from_bootstrap`.
+    n_jobs : int or None
+        Number of threads used to draw the bootstrapped datasets, see `_bootstrap_independently`.
+    adjust : {None, 'fdr_bh'}
+        If `'fdr_bh'`, adjust the p-values for multiple comparisons over all the combinations
+        of values, controlling the false discovery rate (Benjamini-Hochberg). Default is None.
+
+    Returns
+    -------
+    pvalues : DataFrame or Series
+        The p-value of each combination of values, in the same layout as `samples_counts`:
+        twice the probability under independence of a count at least as extreme as the
+        observed one, in the direction of the smaller tail, capped at 1. With `'bootstrap'`
+        and `'permutation'`, the observed dataset is counted among the drawn ones, so that
+        p-values are never 0.
+    """
+    counts = samples_counts.values.ravel()
+    with _stage('quantile_estimation'):
+        if method == 'analytic':
+            n_samples, cells_pmf = _cells_pmf(samples_counts)
+            cells_pmf = cells_pmf.ravel()
+            p_below = binom.cdf(counts, n_samples, cells_pmf)
+            p_above = binom.sf(counts - 1, n_samples, cells_pmf)
+        elif method in ('bootstrap', 'permutation'):
+            histogram = _null_histogram(samples_counts, n_bootstraps, random_state, method,
+                                        n_jobs=n_jobs)
+            n_below, n_above = histogram.tail_counts(counts)
+            p_below = (n_below + 1) / (n_bootstraps + 1)
+            p_above = (n_above + 1) / (n_bootstraps + 1)
+        else:
+            raise ValueError(f"Unknown method {method!r}, expected 'bootstrap', 'analytic' or "
+                             f"'permutation'")
+        pvalues = np.minimum(1.0, 2 * np.minimum(p_below, p_above))
+
+    if adjust == 'fdr_bh':
+        pvalues = _adjust_fdr(pvalues)
+    elif adjust is not None:
+        raise ValueError(f"Unknown adjustment {adjust!r}, expected None or 'fdr_bh'")
+
+    if isinstance(samples_counts, pd.Series):
+        return pd.Series(data=pvalues, index=samples_counts.index)
+    return pd.DataFrame(data=pvalues.reshape(samples_counts.shape), index=samples_counts.index,
+                        columns=samples_counts.columns)
+
+
+def pvalues_from_bootstrap(samples, n_bootstraps, random_state=np.random, method='bootstrap',
+                           n_jobs=None, sparse=False, weights=None, adjust=None):
+    """ Compute the two-sided p-value of each combination of values under the 0-hypothesis of
+    independence.
+
+    Parameters
+    ----------
+    samples : DataFrame
+        Pandas DataFrame with two columns, each row representing a sample from two
+        discrete random variables.
+    n_bootstraps : int
+        Number of bootstrapped (or permuted) datasets. Ignored if `method` is `'analytic'`.
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator. Default is `numpy.random`.
+    method : {'bootstrap', 'analytic', 'permutation'}
+        How to compute the distribution of the counts under independence, see
+        `significance_from_bootstrap`.
+    n_jobs : int or None
+        Number of threads used to draw the bootstrapped datasets, see `_bootstrap_independently`.
+    sparse : bool
+        If True, only compute the p-values of the observed combinations of values, see
+        `significance_from_bootstrap`.
+    weights : None, label or array-like
+        Number of times each row of `samples` was observed, see `significance_from_bootstrap`.
+    adjust : {None, 'fdr_bh'}
+        Adjustment for multiple comparisons, see `pvalues_from_counts`.
+
+    Returns
+    -------
+    pvalues : DataFrame or Series
+        The p-value of each combination of values, see `pvalues_from_counts`.
+    """
+    samples, weights = _split_weights(samples, weights)
+    samples_counts = joint_counts(samples, sparse=sparse, weights=weights)
+    return pvalues_from_counts(samples_counts, n_bootstraps, random_state=random_state,
+                               method=method, n_jobs=n_jobs, adjust=adjust)
+
+
+def significance_from_pvalues(pvalues, samples_counts, p_levels_low):
+    """ Label each combination of values with the significance level its p-value reaches.
+
+    A combination of values gets the label of the smallest level `p` in `p_levels_low` for
+    which its p-value is at most `2 * p`, i.e. its one-sided tail probability at most `p`. The
+    label is positive if the combination is observed more often than expected under
+    independence, and negative otherwise. Up to the discreteness of the counts, the labels are
+    those of `significance_from_bootstrap`.
+
+    Parameters
+    ----------
+    pvalues : DataFrame or Series
+        The p-value of each combination of values, as returned by `pvalues_from_counts` or
+        `pvalues_from_bootstrap`.
+    samples_counts : DataFrame or Series
+        Counts for each combination of the values of the two variables, in the same layout as
+        `pvalues`, as returned by `joint_counts`.
+    p_levels_low: list of floats
+        List of significance levels for the low tail, between 0 and 0.5 .
+
+    Returns
+    -------
+    quantile_levels : list of floats
+        List of significance levels for the low and high tail.
+    quantile_levels_labels : list of int
+        List of labels for the significance levels.
+    significance : DataFrame or Series
+        The significance label of each combination of values, in the same layout as
+        `samples_counts`.
+    """
+    quantile_levels, quantile_levels_labels = _quantile_levels(p_levels_low)
+    with _stage('threshold_assignment'):
+        n_samples, cells_pmf = _cells_pmf(samples_counts)
+        sign = np.where(samples_counts.values >= n_samples * cells_pmf, 1, -1)
+        values = pvalues.values
+        labels = np.zeros(values.shape, dtype=np.int64)
+        n_levels = len(p_levels_low)
+        # From the least to the most significant level, as in `_quantile_levels`
+        for i in reversed(range(n_levels)):
+            labels[values <= 2 * p_levels_low[i]] = n_levels - i
+        labels *= sign
+    if isinstance(samples_counts, pd.Series):
+        significance = pd.Series(data=labels, index=samples_counts.index)
+    else:
+        significance = pd.DataFrame(data=labels, index=samples_counts.index,
+                                    columns=samples_counts.columns)
     return quantile_levels, quantile_levels_labels, significance
+
+
+def _analytic_pairs_quantiles(samples, pairs, quantile_levels):
+    """ Analytic quantiles of the joint counts of each pair, see `_bootstrap_pairs_quantiles`.
+    """
+    for pair in pairs:
+        samples_counts = joint_counts(samples[list(pair)])
+        yield pair, samples_counts, _analytic_quantiles(samples_counts, quantile_levels)
+
+
+def _bootstrap_pairs_quantiles(samples, columns, pairs, n_bootstraps, quantile_levels,
+                               random_state, n_jobs):
+    """ Bootstrap quantiles of the joint counts of all pairs, drawn together for batches of
+    pairs.
+
+    Each batch has at most `_MAX_PAIRS_HISTOGRAM_BINS` bins in its histograms, so that memory
+    does not grow with the number of pairs. Each batch draws from its own random stream,
+    spawned from `random_state`.
+
+    Yields
+    ------
+    pair, samples_counts, quantiles
+        For each pair, its joint counts and its quantiles as an array of size
+        (n_quantiles, n1, n2), aligned to the joint counts.
+    """
+    n_samples = samples.shape[0]
+    uniques = {}
+    pmfs = {}
+    for column in columns:
+        codes, uniques[column] = factorize(samples[column])
+        pmfs[column] = marginal_counts_from_codes(codes, len(uniques[column])) / n_samples
+
+    def pair_cells_pmf(pair):
+        # The second variable varies fastest
+        return np.outer(pmfs[pair[0]], pmfs[pair[1]]).ravel()
+
+    def n_bins(cells_pmf):
+        # Width of the range of counts drawn for each cell, see `_CountDistributions`
+        std = np.sqrt(n_samples * cells_pmf * (1 - cells_pmf))
+        return np.minimum(2 * np.ceil(_TAIL_WIDTH * (std + 1)) + 1, n_samples + 1).sum()
+
+    seed_sequence = _seed_sequence(random_state)
+    batch = []
+    batch_bins = 0
+    for index, pair in enumerate(pairs):
+        batch.append(pair)
+        batch_bins += n_bins(pair_cells_pmf(pair))
+        if index < len(pairs) - 1 and batch_bins < _MAX_PAIRS_HISTOGRAM_BINS:
+            continue
+        cells_pmf = np.concatenate([pair_cells_pmf(pair) for pair in batch])
+        distributions = _binomial_distributions(n_samples, cells_pmf)
+        histogram = _CountsHistogram(len(cells_pmf))
+        for block in _map_blocks(distributions.draw_histogram, n_bootstraps, _BLOCK_SIZE,
+                                 seed_sequence.spawn(1)[0], n_jobs):
+            histogram.merge(block)
+        all_quantiles = histogram.quantile(quantile_levels)
+        del distributions, histogram
+
+        start = 0
+        for column1, column2 in batch:
+            cells = pd.MultiIndex.from_product([uniques[column1], uniques[column2]]).swaplevel()
+            pair_quantiles = pd.DataFrame(data=all_quantiles[start:start + len(cells)],
+                                          index=cells)
+            start += len(cells)
+            samples_counts = joint_counts(samples[[column1, column2]])
+            yield ((column1, column2), samples_counts,
+                   _align_quantiles(samples_counts, pair_quantiles))
+        batch = []
+        batch_bins = 0
+
+
+def significance_from_bootstrap_pairs(samples, n_bootstraps, p_levels_low, columns=None,
+                                      random_state=np.random, method='bootstrap', n_jobs=None):
+    """ Compute significance under the 0-hypothesis of independence for every pair of columns.
+
+    Resampling the columns of a pair independently puts each bootstrapped sample in a
+    combination of values with the product of their marginal probabilities, so that the count
+    of each combination is binomial. The significance only depends on the distribution of each
+    count separately, so that the histograms of the counts of all pairs are drawn together, for
+    whole blocks of bootstrapped datasets at once, see `_CountDistributions`. The samples are
+    only encoded once per column, and neither the cost nor the memory grows with the number of
+    samples or with `n_bootstraps`.
+
+    Rows with a missing value in any of `columns` are dropped, so that all columns are resampled
+    with the same number of samples.
+
+    Parameters
+    ----------
+    samples : DataFrame
+        Pandas DataFrame with one column per discrete random variable, each row representing a
+        sample.
+    n_bootstraps : int
+        Number of bootstrapped datasets. Ignored if `method` is `'analytic'`.
+    p_levels_low: list of floats
+        List of significance levels for the low tail, between 0 and 0.5 .
+        The function adds significance levels for the high tail.
+    columns : list or None
+        The columns to pair. Default is all the columns of `samples`.
+    random_state : None, int, SeedSequence, Generator or RandomState
+        Seed or random number generator. Default is `numpy.random`.
+    method : {'bootstrap', 'analytic'}
+        How to compute the distribution of the counts under independence, see
+        `significance_from_bootstrap`.
+    n_jobs : int or None
+        Number of threads used to draw the bootstrapped datasets, see `_bootstrap_independently`.
+
+    Returns
+    -------
+    quantile_levels : list of floats
+        List of significance levels for the low and high tail.
+    quantile_levels_labels : list of int
+        List of labels for the significance levels.
+    significances : dict
+        For each pair of columns `(column1, column2)`, with `column1` before `column2` in
+        `columns`, the significance table as returned by `significance_from_bootstrap`.
+    """
+    if columns is None:
+        columns = samples.columns.tolist()
+    samples = samples[columns].dropna()
+    quantile_levels, quantile_levels_labels = _quantile_levels(p_levels_low)
+    pairs = list(itertools.combinations(columns, 2))
+
+    if method == 'analytic':
+        pairs_quantiles = _analytic_pairs_quantiles(samples, pairs, quantile_levels)
+    elif method == 'bootstrap':
+        pairs_quantiles = _bootstrap_pairs_quantiles(samples, columns, pairs, n_bootstraps,
+                                                     quantile_levels, random_state, n_jobs)
+    else:
+        raise ValueError(f"Unknown method {method!r}, expected 'bootstrap' or 'analytic'")
+
+    # Only the significance of each pair is kept
+    significances = {
+        pair: _assign_significance(samples_counts, quantiles, p_levels_low)
+        for pair, samples_counts, quantiles in pairs_quantiles
+    }
+    return quantile_levels, quantile_levels_labels, significances
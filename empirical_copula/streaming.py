@@ -0,0 +1,432 @@
+import collections
+
+import numpy as np
+import pandas as pd
+
+from empirical_copula import _joint_pmf_details
+from empirical_copula.codes import _descending_order, _inferred_index
+from empirical_copula.significance import significance_from_counts
+
+
+def _encode_growing(categories, values):
+    """ Integer codes of `values`, extending the known categories with the new values.
+
+    Parameters
+    ----------
+    categories : Index or None
+        The values seen so far, None if none was seen yet.
+    values : array
+        The values to encode.
+
+    Returns
+    -------
+    categories : Index
+        The values seen so far, including the new ones in `values`.
+    codes : array
+        Position of each of `values` in `categories`, -1 for missing values.
+    """
+    missing = pd.isna(values)
+    if categories is None:
+        categories = pd.Index(pd.unique(values[~missing]), dtype=values.dtype)
+    codes = categories.get_indexer(values)
+    new = (codes == -1) & ~missing
+    if new.any():
+        categories = categories.append(pd.Index(pd.unique(values[new]), dtype=values.dtype))
+        codes = categories.get_indexer(values)
+    codes[missing] = -1
+    return categories, codes
+
+
+def _grow(counts, size):
+    """ Extend `counts` with zeros up to `size` entries. """
+    return np.concatenate([counts, np.zeros(size - counts.shape[0], dtype=counts.dtype)])
+
+
+class CopulaAccumulator:
+    """ Accumulate the counts of two discrete variables, one chunk of samples at a time.
+
+    The accumulator keeps the marginal and joint counts of the samples seen so far, so that the
+    empirical copula of a dataset can be computed without holding all samples in memory.
+    Accumulators built on different parts of a dataset can be merged.
+
+    Examples
+    --------
+    >>> accumulator = CopulaAccumulator()
+    >>> for chunk in pd.read_csv('samples.csv', usecols=['v1', 'v2'], chunksize=10**6):
+    ...     accumulator.update(chunk)
+    >>> pmf1, pmf2, empirical_pmf = accumulator.result()
+    """
+
+    def __init__(self):
+        self.columns = None
+        self._categories1 = None
+        self._categories2 = None
+        self._counts1 = np.zeros(0, dtype=np.int64)
+        self._counts2 = np.zeros(0, dtype=np.int64)
+        self._joint = np.zeros((0, 0), dtype=np.int64)
+
+    def _resize(self):
+        """ Grow the count arrays to the current number of categories. """
+        n1, n2 = len(self._categories1), len(self._categories2)
+        if self._joint.shape == (n1, n2):
+            return
+        joint = np.zeros((n1, n2), dtype=np.int64)
+        joint[:self._joint.shape[0], :self._joint.shape[1]] = self._joint
+        self._joint = joint
+        self._counts1 = _grow(self._counts1, n1)
+        self._counts2 = _grow(self._counts2, n2)
+
+    def _add(self, codes1, codes2, sign=1):
+        """ Add (or, with `sign=-1`, remove) samples given as integer codes. """
+        np.add.at(self._counts1, codes1[codes1 >= 0], sign)
+        np.add.at(self._counts2, codes2[codes2 >= 0], sign)
+        complete = (codes1 >= 0) & (codes2 >= 0)
+        np.add.at(self._joint, (codes1[complete], codes2[complete]), sign)
+
+    def _encode(self, chunk):
+        """ Integer codes of the two columns of `chunk`, extending the known categories. """
+        if self.columns is None:
+            self.columns = list(chunk.columns[:2])
+        return self._encode_values(chunk.iloc[:, 0].to_numpy(), chunk.iloc[:, 1].to_numpy())
+
+    def _encode_values(self, values1, values2):
+        """ Integer codes of arrays of values of the two variables. """
+        self._categories1, codes1 = _encode_growing(self._categories1, values1)
+        self._categories2, codes2 = _encode_growing(self._categories2, values2)
+        self._resize()
+        return codes1, codes2
+
+    def update(self, chunk):
+        """ Add a chunk of samples.
+
+        Parameters
+        ----------
+        chunk : DataFrame of size (n, 2)
+            The observed values of two discrete variables (two columns).
+        """
+        codes1, codes2 = self._encode(chunk)
+        self._add(codes1, codes2)
+
+    def merge(self, other):
+        """ Add the counts accumulated by another accumulator.
+
+        Parameters
+        ----------
+        other : CopulaAccumulator
+            Accumulator of other samples of the same two variables.
+
+        Returns
+        -------
+        self : CopulaAccumulator
+            This accumulator, updated in place.
+        """
+        if other._categories1 is None:
+            return self
+        if self.columns is None:
+            self.columns = other.columns
+        self._categories1, codes1 = _encode_growing(self._categories1,
+                                                    other._categories1.to_numpy())
+        self._categories2, codes2 = _encode_growing(self._categories2,
+                                                    other._categories2.to_numpy())
+        self._resize()
+        self._counts1[codes1] += other._counts1
+        self._counts2[codes2] += other._counts2
+        self._joint[np.ix_(codes1, codes2)] += other._joint
+        return self
+
+    def _marginal_pmf(self, counts, categories, name):
+        counts = pd.Series(data=counts, index=_inferred_index(categories), name=name)
+        counts = counts[counts > 0].sort_index()
+        # Ties are ordered by value, as in `empirical_joint_pmf`
+        return (counts / counts.sum()).iloc[_descending_order(counts.to_numpy())]
+
+    def _joint_counts(self):
+        """ Joint counts of the samples seen so far, as returned by `joint_counts`. """
+        col1, col2 = self.columns
+        counts = pd.DataFrame(
+            data=self._joint,
+            index=_inferred_index(self._categories1).rename(col1),
+            columns=_inferred_index(self._categories2).rename(col2),
+        )
+        counts = counts.loc[counts.sum(axis=1) > 0, counts.sum(axis=0) > 0]
+        return counts.sort_index().sort_index(axis=1)
+
+    def result_details(self):
+        """ Compute the empirical joint probability of the samples seen so far.
+
+        Returns
+        -------
+        pmf1, pmf2, empirical_pmf, others
+            The same values as `empirical_joint_pmf_details` on all the samples seen so far.
+        """
+        col1, col2 = self.columns
+        pmf1 = self._marginal_pmf(self._counts1, self._categories1, col1)
+        pmf2 = self._marginal_pmf(self._counts2, self._categories2, col2)
+        return _joint_pmf_details(pmf1, pmf2, self._joint_counts())
+
+    def result(self):
+        """ Compute the empirical joint probability of the samples seen so far.
+
+        Returns
+        -------
+        pmf1, pmf2, empirical_pmf
+            The same values as `empirical_joint_pmf` on all the samples seen so far.
+        """
+        pmf1, pmf2, empirical_pmf, _ = self.result_details()
+        return pmf1, pmf2, empirical_pmf
+
+    def significance(self, p_levels_low, n_bootstraps=None, method='analytic', **kwargs):
+        """ Compute thresholds for significance for the samples seen so far.
+
+        The significance is computed from the accumulated joint counts with
+        `significance_from_counts`, without going back to the samples. With the default
+        `'analytic'` method, no resampling is needed at all.
+
+        Parameters
+        ----------
+        p_levels_low: list of floats
+            List of significance levels for the low tail, between 0 and 0.5 .
+        n_bootstraps : int or None
+            Number of bootstrapped datasets, only used if `method` is `'bootstrap'`.
+        method : {'analytic', 'bootstrap'}
+            How to compute the distribution of the counts under independence, see
+            `significance_from_bootstrap`. Default is `'analytic'`.
+        **kwargs : dict
+            Additional keyword arguments are passed on to `significance_from_counts`.
+
+        Returns
+        -------
+        quantile_levels, quantile_levels_labels, significance
+            The same values as `significance_from_counts` on the accumulated joint counts.
+        """
+        return significance_from_counts(self._joint_counts(), n_bootstraps, p_levels_low,
+                                        method=method, **kwargs)
+
+
+def _pair_keys(codes1, codes2):
+    """ Single integer key of each pair of codes of the two variables. """
+    return (codes1.astype(np.int64) << 32) | codes2
+
+
+def _pair_codes(keys):
+    """ Codes of the two variables of each of the keys made by `_pair_keys`. """
+    return keys >> 32, keys & 0xFFFFFFFF
+
+
+def _compact_codes(counts, *codes):
+    """ Drop the unused entries (zero count) of `counts`, and renumber `codes` accordingly.
+
+    Returns
+    -------
+    used : array of bool
+        Which entries of `counts` are kept.
+    codes : list of arrays
+        The new codes, -1 for missing values.
+    """
+    used = counts > 0
+    new_codes = np.cumsum(used) - 1
+    return used, [np.where(code >= 0, new_codes[code], -1) for code in codes]
+
+
+class SlidingWindowCopula:
+    """ Counts of two discrete variables over a sliding window of the most recent samples.
+
+    Arriving samples are added to the marginal and joint counts, and the samples that fall out
+    of the window are subtracted from them, so that each update only costs time proportional to
+    the number of added and removed samples. The window is defined by a maximum number of
+    samples, by a maximum age, or both.
+
+    Only the combinations of values observed in the window are counted, and the values that
+    are no longer in the window are forgotten, so that memory stays proportional to the
+    content of the window even when the values drift over time.
+
+    Parameters
+    ----------
+    max_rows : int or None
+        Maximum number of samples in the window.
+    max_age : scalar or None
+        Maximum age of the samples in the window, in the units of the timestamps passed to
+        `update` (e.g. a `pandas.Timedelta` for datetime timestamps). Samples with a timestamp
+        at or before `now - max_age` are removed, see `expire`.
+
+    Examples
+    --------
+    >>> window = SlidingWindowCopula(max_age=pd.Timedelta('10min'))
+    >>> for events in stream:
+    ...     window.update(events[['v1', 'v2']], timestamps=events['time'])
+    ...     pmf1, pmf2, empirical_pmf = window.result()
+    """
+
+    def __init__(self, max_rows=None, max_age=None):
+        if max_rows is None and max_age is None:
+            raise ValueError('At least one of max_rows and max_age is required')
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.columns = None
+        self._categories1 = None
+        self._categories2 = None
+        self._counts1 = np.zeros(0, dtype=np.int64)
+        self._counts2 = np.zeros(0, dtype=np.int64)
+        # Combinations of values seen in the window, as `_pair_keys` of their codes, and counts
+        self._pairs = pd.Index(np.zeros(0, dtype=np.int64))
+        self._joint = np.zeros(0, dtype=np.int64)
+        # Codes and timestamps of the samples in the window, one entry per update
+        self._batches = collections.deque()
+        self._latest = None
+        self.n_rows = 0
+
+    def _encode(self, chunk):
+        """ Codes of the values and of the combinations of values of `chunk`. """
+        if self.columns is None:
+            self.columns = list(chunk.columns[:2])
+        self._categories1, codes1 = _encode_growing(self._categories1,
+                                                    chunk.iloc[:, 0].to_numpy())
+        self._categories2, codes2 = _encode_growing(self._categories2,
+                                                    chunk.iloc[:, 1].to_numpy())
+        complete = (codes1 >= 0) & (codes2 >= 0)
+        pairs = pd.Index(_pair_keys(codes1[complete], codes2[complete]))
+        pair_codes = self._pairs.get_indexer(pairs)
+        new = pair_codes == -1
+        if new.any():
+            self._pairs = self._pairs.append(pairs[new].unique())
+            pair_codes = self._pairs.get_indexer(pairs)
+        self._counts1 = _grow(self._counts1, len(self._categories1))
+        self._counts2 = _grow(self._counts2, len(self._categories2))
+        self._joint = _grow(self._joint, len(self._pairs))
+        return codes1, codes2, pair_codes
+
+    def _add(self, codes1, codes2, pair_codes, sign=1):
+        """ Add (or, with `sign=-1`, remove) samples given as integer codes. """
+        np.add.at(self._counts1, codes1[codes1 >= 0], sign)
+        np.add.at(self._counts2, codes2[codes2 >= 0], sign)
+        np.add.at(self._joint, pair_codes, sign)
+
+    def update(self, chunk, timestamps=None):
+        """ Add a chunk of samples, and remove the samples that fall out of the window.
+
+        Parameters
+        ----------
+        chunk : DataFrame of size (n, 2)
+            The observed values of two discrete variables (two columns).
+        timestamps : array-like or None
+            The time of each sample, in increasing order and not earlier than the samples of
+            previous updates. Required if the window has a `max_age`.
+        """
+        if self.max_age is not None and timestamps is None:
+            raise ValueError('timestamps are required for a window with a max_age')
+        if timestamps is not None:
+            timestamps = np.asarray(timestamps)
+            if len(timestamps) > 0:
+                self._latest = timestamps[-1]
+        codes1, codes2, pair_codes = self._encode(chunk)
+        self._add(codes1, codes2, pair_codes)
+        self._batches.append((codes1, codes2, pair_codes, timestamps))
+        self.n_rows += len(codes1)
+        self.expire()
+
+    def _remove_oldest(self, n):
+        """ Remove the `n` oldest samples, up to the size of the oldest update. """
+        codes1, codes2, pair_codes, timestamps = self._batches[0]
+        n = min(n, len(codes1))
+        n_pairs = np.count_nonzero((codes1[:n] >= 0) & (codes2[:n] >= 0))
+        self._add(codes1[:n], codes2[:n], pair_codes[:n_pairs], sign=-1)
+        if n == len(codes1):
+            self._batches.popleft()
+        else:
+            self._batches[0] = (codes1[n:], codes2[n:], pair_codes[n_pairs:],
+                                None if timestamps is None else timestamps[n:])
+        self.n_rows -= n
+
+    def _forget_expired_values(self):
+        """ Drop the values and combinations of values that are no longer in the window.
+
+        The codes are renumbered once the unused entries outnumber the used ones, so that the
+        cost is proportional to the number of removed samples on average.
+        """
+        all_counts = (self._counts1, self._counts2, self._joint)
+        n_unused = [np.count_nonzero(counts == 0) for counts in all_counts]
+        n_used = [len(counts) - unused for counts, unused in zip(all_counts, n_unused)]
+        if all(unused <= max(used, 64) for unused, used in zip(n_unused, n_used)):
+            return
+        used1, codes1 = _compact_codes(self._counts1, *[batch[0] for batch in self._batches])
+        used2, codes2 = _compact_codes(self._counts2, *[batch[1] for batch in self._batches])
+        used, pair_codes = _compact_codes(self._joint, *[batch[2] for batch in self._batches])
+        self._categories1 = self._categories1[used1]
+        self._categories2 = self._categories2[used2]
+        self._counts1 = self._counts1[used1]
+        self._counts2 = self._counts2[used2]
+        pair_codes1, pair_codes2 = _pair_codes(self._pairs.to_numpy()[used])
+        self._pairs = pd.Index(_pair_keys((np.cumsum(used1) - 1)[pair_codes1],
+                                          (np.cumsum(used2) - 1)[pair_codes2]))
+        self._joint = self._joint[used]
+        self._batches = collections.deque(
+            (batch_codes1, batch_codes2, batch_pair_codes, batch[3])
+            for batch, batch_codes1, batch_codes2, batch_pair_codes
+            in zip(self._batches, codes1, codes2, pair_codes)
+        )
+
+    def expire(self, now=None):
+        """ Remove the samples that are outside of the window.
+
+        Parameters
+        ----------
+        now : scalar or None
+            Current time, to remove the samples older than `max_age` when no samples arrive.
+            Default is the timestamp of the most recent sample.
+        """
+        if self.max_rows is not None:
+            while self.n_rows > self.max_rows:
+                self._remove_oldest(self.n_rows - self.max_rows)
+        if self.max_age is not None:
+            if now is None:
+                now = self._latest
+            if now is not None:
+                cutoff = now - self.max_age
+                while self._batches:
+                    timestamps = self._batches[0][3]
+                    n_expired = np.searchsorted(
+                        timestamps, np.array(cutoff, dtype=timestamps.dtype), side='right')
+                    if n_expired == 0:
+                        break
+                    self._remove_oldest(n_expired)
+        self._forget_expired_values()
+
+    def accumulator(self):
+        """ Counts of the samples in the window, as a `CopulaAccumulator`.
+
+        The accumulator is independent of the window, and can for example be merged with the
+        accumulators of other windows.
+
+        Returns
+        -------
+        accumulator : CopulaAccumulator
+            Accumulator of the samples currently in the window.
+        """
+        accumulator = CopulaAccumulator()
+        if self._categories1 is None:
+            return accumulator
+        accumulator.columns = self.columns
+        accumulator._categories1 = self._categories1
+        accumulator._categories2 = self._categories2
+        accumulator._counts1 = self._counts1.copy()
+        accumulator._counts2 = self._counts2.copy()
+        joint = np.zeros((len(self._categories1), len(self._categories2)), dtype=np.int64)
+        joint[_pair_codes(self._pairs.to_numpy())] = self._joint
+        accumulator._joint = joint
+        return accumulator
+
+    def result_details(self):
+        """ Compute the empirical joint probability of the samples in the window, see
+        `CopulaAccumulator.result_details`. """
+        return self.accumulator().result_details()
+
+    def result(self):
+        """ Compute the empirical joint probability of the samples in the window, see
+        `CopulaAccumulator.result`. """
+        return self.accumulator().result()
+
+    def significance(self, p_levels_low, n_bootstraps=None, method='analytic', **kwargs):
+        """ Compute thresholds for significance for the samples in the window, see
+        `CopulaAccumulator.significance`. """
+        return self.accumulator().significance(p_levels_low, n_bootstraps, method=method,
+                                               **kwargs)
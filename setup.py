@@ -11,5 +11,5 @@ setup(
     author_email='pietro.berkes@gmail.com',
     url='https://github.com/pberkes/empirical_copula',
     packages=['empirical_copula'],
-    install_requires=['numpy', 'pandas']
+    install_requires=['numpy', 'pandas', 'scipy']
 )
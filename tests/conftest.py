@@ -0,0 +1,10 @@
+import pandas as pd
+
+
+def random_samples(n, random_state):
+    """ Samples of two independent discrete variables, shared by the tests of several modules. """
+    samples = pd.DataFrame({
+        'v1': random_state.choice(['A', 'B', 'C', 'D'], p=[0.4, 0.3, 0.2, 0.1], size=n),
+        'v2': random_state.choice([100, 200, 300], p=[0.5, 0.3, 0.2], size=n),
+    })
+    return samples
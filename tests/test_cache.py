@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+from pandas.testing import assert_frame_equal
+
+from empirical_copula import significance
+from empirical_copula.cache import NullCache
+from empirical_copula.significance import significance_from_bootstrap
+
+from tests.conftest import random_samples
+
+
+def _count_calls(monkeypatch, name):
+    calls = []
+    function = getattr(significance, name)
+
+    def wrapper(*args, **kwargs):
+        calls.append(1)
+        return function(*args, **kwargs)
+
+    monkeypatch.setattr(significance, name, wrapper)
+    return calls
+
+
+def test_cache_in_memory(monkeypatch):
+    samples = random_samples(500, np.random.RandomState(51))
+    cache = NullCache()
+    calls = _count_calls(monkeypatch, '_multinomial_quantiles')
+
+    expected = significance_from_bootstrap(samples, 200, [0.01, 0.1], random_state=0)
+    first = significance_from_bootstrap(samples, 200, [0.01, 0.1], random_state=0, cache=cache)
+    # Same marginals, different joint distribution
+    shuffled = samples.assign(v2=np.random.RandomState(52).permutation(samples['v2']))
+    second = significance_from_bootstrap(shuffled, 200, [0.01, 0.1], random_state=0,
+                                         cache=cache)
+
+    assert len(calls) == 2
+    assert_frame_equal(first[2], expected[2])
+    expected_shuffled = significance_from_bootstrap(shuffled, 200, [0.01, 0.1], random_state=0)
+    assert_frame_equal(second[2], expected_shuffled[2])
+
+    # A different seed or number of bootstraps is a different null distribution
+    significance_from_bootstrap(samples, 200, [0.01, 0.1], random_state=1, cache=cache)
+    significance_from_bootstrap(samples, 300, [0.01, 0.1], random_state=0, cache=cache)
+    assert len(calls) == 5
+
+
+def test_cache_on_disk(monkeypatch, tmp_path):
+    samples = random_samples(500, np.random.RandomState(53))
+    calls = _count_calls(monkeypatch, '_multinomial_quantiles')
+
+    first = significance_from_bootstrap(samples, 200, [0.01, 0.1], random_state=0,
+                                        cache=NullCache(tmp_path))
+    assert len(list(tmp_path.glob('*.npy'))) == 1
+    second = significance_from_bootstrap(samples, 200, [0.01, 0.1], random_state=0,
+                                         cache=NullCache(tmp_path))
+
+    assert len(calls) == 1
+    assert_frame_equal(first[2], second[2])
+
+
+def test_cache_unseeded(monkeypatch):
+    samples = random_samples(500, np.random.RandomState(54))
+    cache = NullCache()
+    calls = _count_calls(monkeypatch, '_multinomial_quantiles')
+
+    significance_from_bootstrap(samples, 100, [0.1], cache=cache)
+    significance_from_bootstrap(samples, 100, [0.1], cache=cache)
+    significance_from_bootstrap(samples, 100, [0.1], random_state=np.random.RandomState(0),
+                                cache=cache)
+
+    assert len(calls) == 3
+    assert len(cache._memory) == 0
+
+
+def test_cache_analytic(monkeypatch):
+    samples = random_samples(500, np.random.RandomState(55))
+    cache = NullCache()
+    calls = _count_calls(monkeypatch, '_analytic_quantiles')
+
+    first = significance_from_bootstrap(samples, None, [0.1], method='analytic', cache=cache)
+    second = significance_from_bootstrap(samples, None, [0.1], method='analytic', cache=cache)
+
+    assert len(calls) == 1
+    assert_frame_equal(first[2], second[2])
+
+
+def test_cache_eviction(tmp_path):
+    cache = NullCache(tmp_path, max_memory=300, max_disk=600)
+    values = {key: np.full(16, i, dtype=np.float64) for i, key in enumerate('abc')}
+
+    cache.put('a', values['a'])
+    cache.put('b', values['b'])
+    # Touch 'a', so that 'b' is the least recently used one in memory
+    cache.get('a')
+    cache.put('c', values['c'])
+
+    assert list(cache._memory) == ['a', 'c']
+    # On disk, the oldest file is evicted
+    assert sorted(path.stem for path in tmp_path.glob('*.npy')) == ['b', 'c']
+    assert cache.get('b') is not None
+    np.testing.assert_array_equal(cache.get('c'), values['c'])
+
+    cache.clear()
+    assert cache.get('c') is None
+    assert list(tmp_path.glob('*.npy')) == []
+
+
+def test_cache_loop_engine():
+    samples = random_samples(100, np.random.RandomState(56))
+    with pytest.raises(ValueError):
+        significance_from_bootstrap(samples, 10, [0.1], random_state=0, engine='loop',
+                                    cache=NullCache())
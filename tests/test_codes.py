@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal, assert_index_equal, assert_series_equal
+
+from empirical_copula import (
+    empirical_joint_pmf_details,
+    empirical_joint_pmf_from_codes,
+    joint_counts,
+)
+from empirical_copula.codes import (
+    factorize,
+    joint_counts_from_codes,
+    marginal_counts_from_codes,
+    sparse_joint_counts_from_codes,
+)
+
+from tests.conftest import random_samples
+
+
+def test_factorize():
+    codes, categories = factorize(pd.Series(['b', None, 'a', 'b']))
+    np.testing.assert_array_equal(codes, [1, -1, 0, 1])
+    assert_index_equal(categories, pd.Index(['a', 'b']))
+
+    # Categorical values keep their codes and all their categories
+    values = pd.Categorical(['y', 'x', None], categories=['z', 'y', 'x'])
+    codes, categories = factorize(pd.Series(values))
+    np.testing.assert_array_equal(codes, [1, 2, -1])
+    assert_index_equal(categories, pd.CategoricalIndex(['z', 'y', 'x'], dtype=values.dtype))
+
+
+def test_counts_from_codes():
+    codes1 = np.array([0, 1, 1, -1, 2, 0])
+    codes2 = np.array([1, 0, 0, 1, -1, 1])
+    weights = np.array([1, 2, 3, 4, 5, 6])
+
+    np.testing.assert_array_equal(marginal_counts_from_codes(codes1, 4), [2, 2, 1, 0])
+    np.testing.assert_array_equal(marginal_counts_from_codes(codes1, 4, weights=weights),
+                                  [7, 5, 5, 0])
+    expected = np.array([[0, 7], [5, 0], [0, 0], [0, 0]])
+    counts = joint_counts_from_codes(codes1, codes2, 4, 2, weights=weights)
+    assert counts.dtype == np.int64
+    np.testing.assert_array_equal(counts, expected)
+
+    # Both the dense and the sorting strategies of the sparse counts
+    for n_categories2 in [2, 1000]:
+        rows, columns, counts = sparse_joint_counts_from_codes(codes1, codes2, 4, n_categories2,
+                                                               weights=weights)
+        np.testing.assert_array_equal(rows, [0, 1])
+        np.testing.assert_array_equal(columns, [1, 0])
+        np.testing.assert_array_equal(counts, [7, 5])
+
+
+def test_empirical_joint_pmf_from_codes():
+    samples = random_samples(1000, np.random.RandomState(61)).astype('category')
+    codes1, categories1 = samples['v1'].cat.codes, samples['v1'].cat.categories
+    codes2, categories2 = samples['v2'].cat.codes, samples['v2'].cat.categories
+
+    for sparse in [False, True]:
+        expected = empirical_joint_pmf_details(samples.astype(object), sparse=sparse)
+        result = empirical_joint_pmf_from_codes(codes1, codes2, categories1, categories2,
+                                                names=['v1', 'v2'], sparse=sparse)
+        assert_series_equal(expected[0], result[0], check_index_type=False)
+        assert_series_equal(expected[1], result[1], check_index_type=False)
+        compare = assert_series_equal if sparse else assert_frame_equal
+        compare(expected[2], result[2], check_index_type=False)
+        for key in ['counts', 'joint_freq', 'ind_pmf']:
+            compare(expected[3][key], result[3][key], check_index_type=False)
+
+
+def test_missing_values():
+    samples = pd.DataFrame({
+        'v1': ['A', 'A', 'B', 'C', None],
+        'v2': [1, 2, 1, None, 3],
+    })
+
+    pmf1, pmf2, empirical_pmf, others = empirical_joint_pmf_details(samples)
+
+    # Each marginal counts the values of its variable
+    assert pmf1.to_dict() == {'A': 0.5, 'B': 0.25, 'C': 0.25}
+    assert pmf2.to_dict() == {1.0: 0.5, 2.0: 0.25, 3.0: 0.25}
+    # Values only observed together with a missing value are not in the joint counts
+    expected_counts = pd.DataFrame(
+        data=[[1, 1], [1, 0]],
+        index=pd.Index(['A', 'B'], name='v1'),
+        columns=pd.Index([1.0, 2.0], name='v2'),
+    )
+    assert_frame_equal(expected_counts, others['counts'])
+    assert_frame_equal(expected_counts, joint_counts(samples))
+    assert_index_equal(empirical_pmf.index, expected_counts.index)
+    assert_index_equal(empirical_pmf.columns, expected_counts.columns)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from empirical_copula import empirical_joint_pmf, joint_counts
+from empirical_copula.confidence import (
+    confidence_interval_from_bootstrap,
+    confidence_interval_from_counts,
+)
+
+
+def _random_samples(n, random_state):
+    samples = pd.DataFrame({
+        'v1': random_state.choice(['A', 'B', 'C'], p=[0.5, 0.3, 0.2], size=n),
+        'v2': random_state.choice([1, 2, 3, 4], size=n),
+    })
+    # v2 depends on v1
+    samples.loc[samples['v1'] == 'C', 'v2'] = 4
+    return samples
+
+
+def test_confidence_interval_contains_empirical_pmf():
+    samples = _random_samples(2000, np.random.RandomState(91))
+    _, _, empirical_pmf = empirical_joint_pmf(samples)
+
+    lower, upper = confidence_interval_from_bootstrap(samples, 500, random_state=0)
+
+    assert lower.shape == empirical_pmf.shape
+    assert (lower <= empirical_pmf + 1e-6).all().all()
+    assert (empirical_pmf <= upper + 1e-6).all().all()
+    assert ((lower < upper) | (empirical_pmf == 0)).all().all()
+    # The combinations that were not observed are never resampled
+    unobserved = (empirical_pmf == 0).to_numpy()
+    assert (lower.to_numpy()[unobserved] == 0).all()
+    assert (upper.to_numpy()[unobserved] == 0).all()
+
+
+def test_confidence_interval_sparse():
+    samples = _random_samples(1000, np.random.RandomState(92))
+
+    lower, upper = confidence_interval_from_bootstrap(samples, 200, random_state=0)
+    sparse_lower, sparse_upper = confidence_interval_from_bootstrap(samples, 200, random_state=0,
+                                                                    sparse=True)
+
+    _, _, sparse_empirical_pmf = empirical_joint_pmf(samples, sparse=True)
+    assert sparse_lower.index.equals(sparse_empirical_pmf.index)
+    for bound, sparse_bound in [(lower, sparse_lower), (upper, sparse_upper)]:
+        np.testing.assert_allclose(bound.stack().loc[sparse_bound.index].to_numpy(),
+                                   sparse_bound.to_numpy())
+
+
+def test_confidence_interval_reproducible():
+    counts = joint_counts(_random_samples(1000, np.random.RandomState(93)))
+
+    lower, upper = confidence_interval_from_counts(counts, 300, random_state=42)
+    lower_jobs, upper_jobs = confidence_interval_from_counts(counts, 300, random_state=42,
+                                                             n_jobs=2)
+
+    assert_frame_equal(lower, lower_jobs)
+    assert_frame_equal(upper, upper_jobs)
+
+
+def test_confidence_interval_shrinks_with_samples():
+    random_state = np.random.RandomState(94)
+    small = joint_counts(_random_samples(500, random_state))
+    large = joint_counts(_random_samples(50000, random_state))
+
+    small_lower, small_upper = confidence_interval_from_counts(small, 300, confidence=0.9,
+                                                               random_state=0)
+    large_lower, large_upper = confidence_interval_from_counts(large, 300, confidence=0.9,
+                                                               random_state=0)
+
+    observed = ((small > 0) & (large > 0)).to_numpy()
+    small_width = (small_upper - small_lower).to_numpy()[observed]
+    large_width = (large_upper - large_lower).to_numpy()[observed]
+    assert (large_width < small_width).all()
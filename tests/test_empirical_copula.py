@@ -2,7 +2,9 @@ import pandas as pd
 from pandas.testing import assert_frame_equal, assert_series_equal
 
 from empirical_copula import (
+    empirical_joint_pmf,
     empirical_joint_pmf_details,
+    empirical_joint_pmf_from_counts,
     empirical_marginal_pmf,
     independent_pmf,
     joint_counts,
@@ -108,3 +110,100 @@ def test_order_from_pmf():
     order = ordered_pmf.index.tolist()
     assert order == expected
     assert_series_equal(ordered_pmf, pmf.loc[order])
+
+
+def test_sparse_joint_counts():
+    samples = pd.DataFrame(
+        data=[['A', 'A', 'A', 'B', 'B', 'F'],
+              [100, 200, 100, 100, 300, 300]],
+        index=['v1', 'v2']
+    ).T
+    expected = pd.Series(
+        index=pd.MultiIndex.from_tuples(
+            [('A', 100), ('A', 200), ('B', 100), ('B', 300), ('F', 300)], names=['v1', 'v2']),
+        data=[2, 1, 1, 1, 1],
+    )
+    counts = joint_counts(samples, sparse=True)
+    assert_series_equal(expected.loc[counts.index], counts)
+
+
+def test_sparse_empirical_pmf():
+    samples = pd.DataFrame(
+        data=[['A', 'A', 'A', 'B', 'B', 'F', 'B', 'B'],
+              [100, 200, 100, 100, 200, 200, 200, 200]],
+        index=['v1', 'v2']
+    ).T
+
+    pmf1, pmf2, empirical_pmf, others = empirical_joint_pmf_details(samples, sparse=True)
+    dense_pmf1, dense_pmf2, dense_empirical_pmf, dense_others = empirical_joint_pmf_details(
+        samples)
+
+    assert_series_equal(dense_pmf1, pmf1)
+    assert_series_equal(dense_pmf2, pmf2)
+    # The sparse results are the dense ones for the observed combinations of values
+    assert empirical_pmf.index.tolist() == [('A', 100), ('A', 200), ('B', 100), ('B', 200),
+                                            ('F', 200)]
+    for sparse, dense in [(empirical_pmf, dense_empirical_pmf),
+                          (others['counts'], dense_others['counts']),
+                          (others['joint_freq'], dense_others['joint_freq']),
+                          (others['ind_pmf'], dense_others['ind_pmf'])]:
+        expected = dense.stack().loc[sparse.index]
+        assert_series_equal(expected, sparse, check_names=False, check_dtype=False)
+
+
+def test_weighted_empirical_pmf():
+    aggregated = pd.DataFrame(
+        data=[['A', 'A', 'B', 'B', 'F'],
+              [100, 200, 100, 200, 200],
+              [2, 1, 1, 3, 1]],
+        index=['v1', 'v2', 'count']
+    ).T
+    aggregated['count'] = aggregated['count'].astype(int)
+    expanded = aggregated.loc[aggregated.index.repeat(aggregated['count']), ['v1', 'v2']]
+
+    expected_pmf1, expected_pmf2, expected_empirical_pmf, expected_others = (
+        empirical_joint_pmf_details(expanded))
+    for weights in ['count', aggregated['count'].values]:
+        pmf1, pmf2, empirical_pmf, others = empirical_joint_pmf_details(aggregated,
+                                                                        weights=weights)
+        # Re-order according to the pmf indices to be order-agnostic
+        assert_series_equal(expected_pmf1.loc[pmf1.index], pmf1)
+        assert_series_equal(expected_pmf2.loc[pmf2.index], pmf2)
+        assert_frame_equal(expected_empirical_pmf, empirical_pmf)
+        assert_frame_equal(expected_others['counts'], others['counts'], check_dtype=False)
+
+
+def test_empirical_joint_pmf_from_counts():
+    samples = pd.DataFrame(
+        data=[['A', 'A', 'A', 'B', 'B', 'F', 'B', 'B'],
+              [100, 200, 100, 100, 200, 200, 200, 200]],
+        index=['v1', 'v2']
+    ).T
+    expected_pmf1, expected_pmf2, expected_empirical_pmf = empirical_joint_pmf(samples)
+
+    for sparse in [False, True]:
+        counts = joint_counts(samples, sparse=sparse)
+        pmf1, pmf2, empirical_pmf = empirical_joint_pmf_from_counts(counts)
+        # Re-order according to the pmf indices to be order-agnostic
+        assert_series_equal(expected_pmf1.loc[pmf1.index], pmf1, check_index_type=False)
+        assert_series_equal(expected_pmf2.loc[pmf2.index], pmf2, check_index_type=False)
+        if sparse:
+            expected_empirical_pmf = expected_empirical_pmf.stack().loc[empirical_pmf.index]
+            assert_series_equal(expected_empirical_pmf, empirical_pmf, check_names=False)
+        else:
+            assert_frame_equal(expected_empirical_pmf, empirical_pmf)
+
+
+def test_empirical_joint_pmf_from_counts_tied_marginals():
+    samples = pd.DataFrame({
+        'v1': ['D', 'B', 'C', 'A', 'B', 'D', 'C', 'A', 'E', 'E'],
+        'v2': [300, 100, 200, 300, 200, 100, 100, 200, 300, 400],
+    })
+    expected_pmf1, expected_pmf2, _ = empirical_joint_pmf(samples)
+
+    for counts in [joint_counts(samples), joint_counts(samples, sparse=True),
+                   joint_counts(samples).iloc[::-1, ::-1]]:
+        pmf1, pmf2, _ = empirical_joint_pmf_from_counts(counts)
+        # The ties are in the same order
+        assert_series_equal(expected_pmf1, pmf1, check_names=False)
+        assert_series_equal(expected_pmf2, pmf2, check_names=False)
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal, assert_series_equal
+
+from empirical_copula import empirical_joint_pmf_details
+from empirical_copula.grouped import (
+    grouped_empirical_joint_pmf,
+    grouped_empirical_joint_pmf_details,
+)
+
+
+def _grouped_samples(n, random_state):
+    samples = pd.DataFrame({
+        'v1': random_state.choice(['A', 'B', 'C', 'D'], p=[0.4, 0.3, 0.2, 0.1], size=n),
+        'v2': random_state.choice([100, 200, 300], p=[0.5, 0.3, 0.2], size=n),
+        'region': random_state.choice(['north', 'south', 'east'], size=n),
+    })
+    # Value 'D' is never observed in region 'east'
+    samples.loc[(samples['region'] == 'east') & (samples['v1'] == 'D'), 'v1'] = 'A'
+    samples.loc[[3, 17], 'v2'] = np.nan
+    return samples
+
+
+def _assert_group_equal(details, expected):
+    pmf1, pmf2, empirical_pmf, others = details
+    expected_pmf1, expected_pmf2, expected_empirical_pmf, expected_others = expected
+    # Values not observed in the group have a pmf of 0
+    assert_series_equal(expected_pmf1, pmf1.loc[expected_pmf1.index], check_index_type=False)
+    assert (pmf1.drop(expected_pmf1.index) == 0).all()
+    assert_series_equal(expected_pmf2, pmf2.loc[expected_pmf2.index], check_index_type=False)
+    index, columns = expected_empirical_pmf.index, expected_empirical_pmf.columns
+    assert_frame_equal(expected_empirical_pmf, empirical_pmf.loc[index, columns],
+                       check_index_type=False, check_column_type=False)
+    for key in ['counts', 'joint_freq', 'ind_pmf']:
+        expected_other = expected_others[key]
+        other = others[key].loc[expected_other.index, expected_other.columns]
+        assert_frame_equal(expected_other, other,
+                           check_index_type=False, check_column_type=False)
+
+
+def test_grouped_empirical_joint_pmf_details():
+    samples = _grouped_samples(600, np.random.RandomState(21))
+
+    results = grouped_empirical_joint_pmf_details(samples, by='region')
+
+    assert list(results.keys()) == ['east', 'north', 'south']
+    for group, details in results.items():
+        group_samples = samples[samples['region'] == group].drop(columns=['region'])
+        _assert_group_equal(details, empirical_joint_pmf_details(group_samples))
+
+    # All groups share the same values, ordered by decreasing pmf over all samples
+    pmf1, pmf2, empirical_pmf, _ = results['east']
+    assert pmf1.index.tolist() == samples['v1'].value_counts().index.tolist()
+    assert pmf2.index.tolist() == samples['v2'].value_counts().index.tolist()
+    assert pmf1['D'] == 0
+    assert empirical_pmf.loc['D'].isna().all()
+    for other_pmf1, other_pmf2, other_empirical_pmf, _ in results.values():
+        assert other_pmf1.index.equals(pmf1.index)
+        assert other_pmf2.index.equals(pmf2.index)
+        assert other_empirical_pmf.index.equals(empirical_pmf.index)
+        assert other_empirical_pmf.columns.equals(empirical_pmf.columns)
+
+
+def test_weighted_grouped_empirical_joint_pmf():
+    samples = _grouped_samples(300, np.random.RandomState(22)).dropna()
+    aggregated = samples.groupby(['v1', 'v2', 'region']).size().rename('n').reset_index()
+
+    results = grouped_empirical_joint_pmf_details(aggregated, by='region', weights='n')
+    expected = grouped_empirical_joint_pmf_details(samples, by='region')
+
+    assert results.keys() == expected.keys()
+    for group in results:
+        pmf1, pmf2, empirical_pmf, others = results[group]
+        expected_pmf1, expected_pmf2, expected_empirical_pmf, expected_others = expected[group]
+        assert_series_equal(expected_pmf1, pmf1, check_index_type=False)
+        assert_series_equal(expected_pmf2, pmf2, check_index_type=False)
+        assert_frame_equal(expected_empirical_pmf, empirical_pmf, check_index_type=False,
+                           check_column_type=False)
+        assert_frame_equal(expected_others['counts'], others['counts'], check_index_type=False,
+                           check_column_type=False)
+
+    simple = grouped_empirical_joint_pmf(aggregated, by='region', weights='n')
+    for group in results:
+        assert len(simple[group]) == 3
+        assert_frame_equal(simple[group][2], results[group][2])
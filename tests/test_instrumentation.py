@@ -0,0 +1,47 @@
+import numpy as np
+
+from empirical_copula import empirical_joint_pmf
+from empirical_copula.instrumentation import Profiler
+from empirical_copula.significance import significance_from_bootstrap
+
+from tests.conftest import random_samples
+
+
+def test_profiler_stages():
+    samples = random_samples(1000, np.random.RandomState(41))
+    events = []
+
+    with Profiler(callback=events.append) as profiler:
+        empirical_joint_pmf(samples)
+        significance_from_bootstrap(samples, 2500, [0.01, 0.1], random_state=0, low_memory=True)
+
+    assert list(profiler.stages) == ['marginals', 'joint_counts', 'resampling',
+                                     'quantile_estimation', 'threshold_assignment']
+    for record in profiler.stages.values():
+        assert record['calls'] >= 1
+        assert record['wall_time'] >= 0
+        assert record['peak_memory'] >= 0
+    frame = profiler.to_frame()
+    assert frame.columns.tolist() == ['calls', 'wall_time', 'peak_memory']
+    assert frame.loc['resampling', 'calls'] == 3
+
+    progress = [event for event in events if event['event'] == 'progress']
+    assert [event['done'] for event in progress] == [0, 1024, 2048, 2500]
+    assert all(event['total'] == 2500 for event in progress)
+    assert progress[-1]['eta'] == 0
+    assert profiler.progress == progress[-1]
+    stage_events = [event for event in events if event['event'] == 'stage']
+    assert sum(record['calls'] for record in profiler.stages.values()) == len(stage_events)
+
+
+def test_profiler_inactive():
+    samples = random_samples(100, np.random.RandomState(42))
+    with Profiler(trace_memory=False) as profiler:
+        pass
+    significance_from_bootstrap(samples, 10, [0.1], random_state=0)
+    assert profiler.stages == {}
+
+    with Profiler(trace_memory=False) as profiler:
+        significance_from_bootstrap(samples, None, [0.1], method='analytic')
+    assert profiler.stages['quantile_estimation']['peak_memory'] is None
+    assert 'resampling' not in profiler.stages
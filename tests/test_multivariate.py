@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal, assert_series_equal
+
+from empirical_copula import empirical_joint_pmf_details, joint_counts
+from empirical_copula.codes import sparse_tensor_counts_from_codes
+from empirical_copula.multivariate import (
+    conditional_empirical_joint_pmf,
+    conditional_joint_counts,
+    multivariate_empirical_joint_pmf_details,
+    multivariate_independent_pmf,
+    multivariate_joint_counts,
+    multivariate_significance_from_bootstrap,
+)
+from empirical_copula.significance import significance_from_bootstrap
+
+
+def _random_samples(n, random_state):
+    """ Three variables, where `v3` depends on `v1` and `v2` jointly, but on neither alone. """
+    samples = pd.DataFrame({
+        'v1': random_state.choice(['A', 'B'], size=n),
+        'v2': random_state.choice([100, 200, 300], p=[0.5, 0.3, 0.2], size=n),
+    })
+    xor = (samples['v1'] == 'A') ^ (samples['v2'] == 100)
+    noise = random_state.uniform(size=n) < 0.3
+    samples['v3'] = np.where(noise, random_state.choice(['x', 'y'], size=n),
+                             np.where(xor, 'x', 'y'))
+    return samples
+
+
+def test_multivariate_joint_counts():
+    samples = _random_samples(1000, np.random.RandomState(71))
+    samples.loc[[5, 17], 'v3'] = None
+
+    counts = multivariate_joint_counts(samples)
+
+    assert_series_equal(samples.groupby(['v1', 'v2', 'v3']).size(), counts)
+    # With two variables, the sparse joint counts
+    assert_series_equal(joint_counts(samples[['v1', 'v2']], sparse=True),
+                        multivariate_joint_counts(samples[['v1', 'v2']]))
+
+
+def test_sparse_tensor_counts_many_combinations():
+    codes = [np.array([2**40, 0, 2**40]), np.array([1, 2**40, 1]), np.array([0, 0, -1])]
+    cells, counts = sparse_tensor_counts_from_codes(codes, [2**41, 2**41, 2**41])
+    np.testing.assert_array_equal(cells, [[0, 2**40, 0], [2**40, 1, 0]])
+    np.testing.assert_array_equal(counts, [1, 1])
+
+
+def test_multivariate_independent_pmf():
+    samples = _random_samples(1000, np.random.RandomState(72))
+    counts = multivariate_joint_counts(samples)
+    n = len(samples)
+    cells = counts.index.to_frame(index=False)
+
+    ind_pmf = multivariate_independent_pmf(counts)
+    expected = np.ones(len(cells))
+    for column in ['v1', 'v2', 'v3']:
+        expected *= cells[column].map(samples[column].value_counts() / n).to_numpy()
+    np.testing.assert_allclose(ind_pmf.to_numpy(), expected)
+
+    ind_pmf = multivariate_independent_pmf(counts, groups=[['v1', 'v2']])
+    pairs = samples.groupby(['v1', 'v2']).size() / n
+    expected = (pairs.reindex(pd.MultiIndex.from_frame(cells[['v1', 'v2']])).to_numpy()
+                * cells['v3'].map(samples['v3'].value_counts() / n).to_numpy())
+    np.testing.assert_allclose(ind_pmf.to_numpy(), expected)
+
+    with pytest.raises(ValueError):
+        multivariate_independent_pmf(counts, groups=[['v1', 'v2'], ['v2', 'v3']])
+    with pytest.raises(ValueError):
+        multivariate_independent_pmf(counts, groups=[['v4']])
+
+
+def test_multivariate_empirical_pmf_two_variables():
+    samples = _random_samples(1000, np.random.RandomState(73))[['v1', 'v3']]
+
+    pmfs, empirical_pmf, others = multivariate_empirical_joint_pmf_details(samples)
+
+    pmf1, pmf2, expected_empirical_pmf, expected_others = empirical_joint_pmf_details(
+        samples, sparse=True)
+    assert_series_equal(pmf1, pmfs[0])
+    assert_series_equal(pmf2, pmfs[1])
+    assert_series_equal(expected_empirical_pmf, empirical_pmf)
+    for key in ['counts', 'joint_freq', 'ind_pmf']:
+        assert_series_equal(expected_others[key], others[key])
+
+
+def test_multivariate_significance():
+    samples = _random_samples(2000, np.random.RandomState(74))
+
+    # With two variables, the sparse significance
+    for method in ['analytic', 'bootstrap']:
+        expected = significance_from_bootstrap(samples[['v1', 'v3']], 200, [0.01, 0.1],
+                                               random_state=0, method=method, sparse=True)
+        result = multivariate_significance_from_bootstrap(samples[['v1', 'v3']], 200,
+                                                          [0.01, 0.1], random_state=0,
+                                                          method=method)
+        assert expected[:2] == result[:2]
+        assert_series_equal(expected[2], result[2])
+
+    # v3 only depends on v1 and v2 jointly
+    _, _, significance = multivariate_significance_from_bootstrap(
+        samples, None, [0.01], groups=[['v1', 'v2'], ['v3']], method='analytic')
+    assert significance.loc[('A', 200, 'x')] == 1
+    assert significance.loc[('A', 200, 'y')] == -1
+    _, _, significance = multivariate_significance_from_bootstrap(
+        samples[['v1', 'v3']], None, [0.01], method='analytic')
+    assert (significance == 0).all()
+
+    with pytest.raises(ValueError):
+        multivariate_significance_from_bootstrap(samples, 10, [0.1], method='permutation')
+
+
+def test_conditional_joint_counts():
+    samples = _random_samples(1000, np.random.RandomState(75))
+    counts = multivariate_joint_counts(samples)
+    given = samples[samples['v2'] == 200][['v1', 'v3']]
+
+    assert_frame_equal(joint_counts(given), conditional_joint_counts(counts, {'v2': 200}))
+    assert_series_equal(joint_counts(given, sparse=True),
+                        conditional_joint_counts(counts, {'v2': 200}, sparse=True))
+    pmf1, pmf2, empirical_pmf = conditional_empirical_joint_pmf(counts, {'v2': 200})
+    expected_pmf1, expected_pmf2, expected_empirical_pmf, _ = empirical_joint_pmf_details(given)
+    assert_series_equal(expected_pmf1, pmf1)
+    assert_series_equal(expected_pmf2, pmf2)
+    assert_frame_equal(expected_empirical_pmf, empirical_pmf)
+
+    with pytest.raises(ValueError):
+        conditional_joint_counts(counts, {'v2': 200, 'v3': 'x'})
@@ -0,0 +1,56 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal, assert_series_equal
+
+from empirical_copula import empirical_joint_pmf
+from empirical_copula.pairs import all_pairs_empirical_joint_pmf, summarize_pairs
+
+
+def _wide_samples(n, random_state):
+    a = random_state.choice(['A', 'B', 'C'], p=[0.5, 0.3, 0.2], size=n)
+    samples = pd.DataFrame({
+        'a': a,
+        # 'b' is strongly dependent on 'a'
+        'b': np.where(random_state.uniform(size=n) < 0.8, a, 'D'),
+        'c': random_state.choice([1, 2, 3, 4], size=n),
+        'd': random_state.choice([0.5, 1.5], size=n),
+    })
+    samples.loc[[2, 30], 'c'] = np.nan
+    return samples
+
+
+@pytest.mark.parametrize('n_jobs', [None, 2])
+def test_all_pairs_empirical_joint_pmf(n_jobs):
+    samples = _wide_samples(500, np.random.RandomState(11))
+    # Values only observed together with missing values of some of the other columns
+    samples.loc[[2, 30], 'a'] = 'E'
+    samples.loc[[7], 'b'] = np.nan
+    samples.loc[[7], 'd'] = 2.5
+
+    results = all_pairs_empirical_joint_pmf(samples, n_jobs=n_jobs)
+
+    assert list(results.keys()) == list(itertools.combinations(samples.columns, 2))
+    for (column1, column2), (pmf1, pmf2, empirical_pmf) in results.items():
+        expected_pmf1, expected_pmf2, expected_empirical_pmf = empirical_joint_pmf(
+            samples[[column1, column2]])
+        # Re-order according to the pmf indices to be order-agnostic
+        assert_series_equal(expected_pmf1.loc[pmf1.index], pmf1)
+        assert_series_equal(expected_pmf2.loc[pmf2.index], pmf2)
+        assert_frame_equal(expected_empirical_pmf, empirical_pmf, check_names=False)
+
+
+def test_summarize_pairs():
+    samples = _wide_samples(2000, np.random.RandomState(12))
+
+    results = all_pairs_empirical_joint_pmf(samples, columns=['c', 'a', 'b'])
+    summary = summarize_pairs(results)
+
+    assert summary.shape == (3, 2)
+    # The dependent pair is ranked first
+    assert summary.index[0] == ('a', 'b')
+    assert (summary['mutual_information'] >= 0).all()
+    assert summary.loc[('a', 'b'), 'max_abs_log_copula'] > summary.loc[('c', 'a'),
+                                                                        'max_abs_log_copula']
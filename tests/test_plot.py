@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+matplotlib = pytest.importorskip('matplotlib')
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # noqa: E402
+from matplotlib.collections import LineCollection  # noqa: E402
+
+from empirical_copula import empirical_joint_pmf  # noqa: E402
+from empirical_copula.plot import (  # noqa: E402
+    _significance_cmap, _thin_positions, copula_pcolormesh, render_copula_figures,
+)
+from empirical_copula.significance import significance_from_bootstrap  # noqa: E402
+
+
+def test_thin_positions():
+    positions = np.array([0.0, 0.05, 0.1, 0.3, 0.32, 0.5])
+    np.testing.assert_array_equal(_thin_positions(positions, 0.1), [0, 2, 3, 5])
+    np.testing.assert_array_equal(_thin_positions(positions, 0.0), np.arange(6))
+
+
+@pytest.mark.parametrize('n_values', [3, 500])
+def test_fast_copula_pcolormesh(n_values):
+    labels = [f'value_{i}' for i in range(n_values)]
+    pmf = pd.Series(np.full(n_values, 1 / n_values), index=labels)
+    data = pd.DataFrame(np.eye(n_values), index=labels, columns=labels)
+
+    fig = plt.figure(figsize=(8, 8))
+    ax, pcm = copula_pcolormesh(fig, pmf, pmf, data, fast=True)
+    fig.canvas.draw()
+
+    # All grid lines are in a single collection
+    lines = [c for c in ax.collections if isinstance(c, LineCollection)]
+    assert len(lines) == 1
+    assert len(lines[0].get_segments()) == 2 * (n_values + 1)
+    assert pcm.get_rasterized()
+    np.testing.assert_array_equal(pcm.get_array().reshape(n_values, n_values), np.eye(n_values))
+
+    # Labels are only thinned out when they do not fit
+    n_annotations = len(ax.texts)
+    if n_values == 3:
+        assert n_annotations == 2 * n_values
+        assert len(ax.get_xticks()) == n_values + 1
+    else:
+        assert 0 < n_annotations < 2 * n_values
+        assert len(ax.get_xticks()) < n_values + 1
+    plt.close(fig)
+
+
+@pytest.mark.parametrize('n_jobs', [None, 2])
+def test_render_copula_figures(tmp_path, n_jobs):
+    random_state = np.random.RandomState(42)
+    samples = pd.DataFrame({
+        'v1': random_state.choice(['A', 'B', 'C'], size=200),
+        'v2': random_state.choice([1, 2, 3, 4], size=200),
+    })
+    pmf1, pmf2, empirical_pmf = empirical_joint_pmf(samples)
+    quantile_levels, _, significance = significance_from_bootstrap(
+        samples, None, [0.01, 0.1], method='analytic')
+
+    filenames = [str(tmp_path / f'copula_{i}.png') for i in range(3)]
+    items = [(filename, pmf1, pmf2, empirical_pmf) for filename in filenames]
+    assert render_copula_figures(items, n_jobs=n_jobs, fast=True) == filenames
+
+    significance_filenames = [str(tmp_path / f'significance_{i}.png') for i in range(3)]
+    items = [(filename, pmf1, pmf2, significance, quantile_levels)
+             for filename in significance_filenames]
+    assert render_copula_figures(items, kind='significance', n_jobs=n_jobs, chunksize=2,
+                                 figsize=(4, 4), dpi=50) == significance_filenames
+
+    for filename in filenames + significance_filenames:
+        with open(filename, 'rb') as f:
+            assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+
+
+def test_render_copula_figures_unknown_kind():
+    with pytest.raises(ValueError):
+        render_copula_figures([], kind='histogram')
+
+
+def test_significance_cmap_is_not_shared():
+    cmap = _significance_cmap(2)
+    cmap.set_bad('white')
+
+    other = _significance_cmap(2)
+    assert other is not cmap
+    assert other.N == 5
+    assert other.get_bad().tolist() != cmap.get_bad().tolist()
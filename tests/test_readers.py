@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from pandas.testing import assert_frame_equal, assert_series_equal
+
+from empirical_copula import empirical_joint_pmf_details
+from empirical_copula.readers import copula_accumulator_from_npy, copula_accumulator_from_parquet
+
+from tests.conftest import random_samples
+
+
+def _assert_result_equal(accumulator, samples):
+    pmf1, pmf2, empirical_pmf = accumulator.result()
+    expected_pmf1, expected_pmf2, expected_empirical_pmf, _ = empirical_joint_pmf_details(samples)
+    # Re-order according to the pmf indices to be order-agnostic
+    assert_series_equal(expected_pmf1.loc[pmf1.index], pmf1)
+    assert_series_equal(expected_pmf2.loc[pmf2.index], pmf2)
+    assert_frame_equal(expected_empirical_pmf, empirical_pmf)
+
+
+@pytest.mark.parametrize('n_jobs', [None, 2])
+def test_copula_accumulator_from_parquet(tmp_path, n_jobs):
+    pytest.importorskip('pyarrow')
+    samples = random_samples(1000, np.random.RandomState(31))
+    samples['other'] = np.arange(1000)
+    samples.loc[[3, 500], 'v1'] = None
+    # A dataset in two files, with several row groups each
+    samples.iloc[:600].to_parquet(tmp_path / 'part0.parquet', row_group_size=250)
+    samples.iloc[600:].to_parquet(tmp_path / 'part1.parquet', row_group_size=250)
+
+    accumulator = copula_accumulator_from_parquet(tmp_path, ['v1', 'v2'], n_jobs=n_jobs)
+
+    _assert_result_equal(accumulator, samples[['v1', 'v2']])
+
+
+@pytest.mark.parametrize('n_jobs', [None, 2])
+def test_copula_accumulator_from_npy(tmp_path, n_jobs):
+    samples = random_samples(1000, np.random.RandomState(32))
+    np.save(tmp_path / 'v1.npy', samples['v1'].to_numpy().astype('U1'))
+    np.save(tmp_path / 'v2.npy', samples['v2'].to_numpy())
+
+    accumulator = copula_accumulator_from_npy(tmp_path / 'v1.npy', tmp_path / 'v2.npy',
+                                              chunk_size=300, n_jobs=n_jobs)
+
+    assert accumulator.columns == ['v1', 'v2']
+    _assert_result_equal(accumulator, samples)
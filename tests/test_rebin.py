@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal, assert_series_equal
+
+from empirical_copula import joint_counts
+from empirical_copula.multivariate import multivariate_joint_counts
+from empirical_copula.rebin import merge_rare_categories, quantile_bin_categories, rebin_counts
+from empirical_copula.significance import significance_from_bootstrap, significance_from_counts
+
+
+def _random_samples(n, random_state):
+    samples = pd.DataFrame({
+        'v1': random_state.choice(['A', 'B', 'C', 'D', 'E'], p=[0.4, 0.3, 0.2, 0.06, 0.04],
+                                  size=n),
+        'v2': random_state.poisson(10, size=n),
+    })
+    return samples
+
+
+def _assert_counts_equal(expected, counts):
+    if isinstance(expected, pd.Series):
+        assert_series_equal(expected, counts, check_index_type=False)
+    else:
+        assert_frame_equal(expected, counts, check_index_type=False, check_column_type=False)
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_rebin_counts(sparse):
+    samples = _random_samples(2000, np.random.RandomState(81))
+    counts = joint_counts(samples, sparse=sparse)
+    mapping1 = {'A': 'AB', 'B': 'AB', 'E': None}
+
+    def mapping2(value):
+        return value // 5 * 5
+
+    rebinned = rebin_counts(counts, {'v1': mapping1, 'v2': mapping2})
+
+    mapped = pd.DataFrame({
+        'v1': samples['v1'].map(lambda value: mapping1.get(value, value)),
+        'v2': samples['v2'].map(mapping2),
+    })
+    _assert_counts_equal(joint_counts(mapped, sparse=sparse), rebinned)
+
+
+def test_rebin_multivariate_counts():
+    samples = _random_samples(2000, np.random.RandomState(82))
+    samples['v3'] = samples['v2'] % 3
+    mapping = pd.Series({'C': 'rare', 'D': 'rare', 'E': 'rare'})
+
+    rebinned = rebin_counts(multivariate_joint_counts(samples), {'v1': mapping})
+
+    mapped = samples.assign(v1=samples['v1'].replace(mapping.to_dict()))
+    _assert_counts_equal(multivariate_joint_counts(mapped), rebinned)
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_merge_rare_categories(sparse):
+    samples = _random_samples(2000, np.random.RandomState(83))
+    counts = joint_counts(samples, sparse=sparse)
+    expected = joint_counts(samples.replace({'v1': {'D': 'other', 'E': 'other'}}),
+                            sparse=sparse)
+
+    _assert_counts_equal(expected, merge_rare_categories(counts, 'v1', min_pmf=0.1))
+    _assert_counts_equal(expected, merge_rare_categories(counts, 'v1', max_categories=4))
+    # Nothing to merge
+    _assert_counts_equal(counts, merge_rare_categories(counts, 'v1', min_pmf=0.01))
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_quantile_bin_categories(sparse):
+    samples = _random_samples(2000, np.random.RandomState(84))
+    counts = joint_counts(samples, sparse=sparse)
+
+    rebinned = quantile_bin_categories(counts, 'v2', 4)
+
+    bins = pd.Series(pd.unique(rebinned.index.get_level_values('v2')) if sparse
+                     else rebinned.columns)
+    assert len(bins) == 4
+    # The bins cover all the values, in order
+    assert bins.iloc[0].left == samples['v2'].min()
+    assert bins.iloc[-1].right == samples['v2'].max()
+    assert all(bins.iloc[i].right < bins.iloc[i + 1].left for i in range(len(bins) - 1))
+    mapped = samples.assign(
+        v2=samples['v2'].map(lambda value: next(bin for bin in bins if value in bin)))
+    _assert_counts_equal(joint_counts(mapped, sparse=sparse), rebinned)
+
+
+def test_quantile_bin_categories_heavy_values():
+    samples = pd.DataFrame({
+        'v1': ['A', 'B'] * 50,
+        'v2': [1] + [2] * 98 + [3],
+    })
+    counts = joint_counts(samples)
+
+    rebinned = quantile_bin_categories(counts, 'v2', 4)
+
+    # The frequent value has its own bin, and the rare values around it are not merged into it
+    assert list(rebinned.columns) == [pd.Interval(value, value, closed='both')
+                                      for value in [1, 2, 3]]
+    np.testing.assert_array_equal(rebinned.to_numpy(), counts.to_numpy())
+
+    rebinned = quantile_bin_categories(counts, 'v2', 2)
+
+    assert list(rebinned.columns) == [pd.Interval(1, 1, closed='both'),
+                                      pd.Interval(2, 3, closed='both')]
+
+
+def test_rebinned_significance():
+    samples = _random_samples(2000, np.random.RandomState(85))
+    mapping = {'C': 'rare', 'D': 'rare', 'E': 'rare'}
+    rebinned = rebin_counts(joint_counts(samples), {'v1': mapping})
+
+    _, _, significance = significance_from_counts(rebinned, None, [0.01, 0.1], method='analytic')
+
+    _, _, expected = significance_from_bootstrap(samples.replace({'v1': mapping}), None,
+                                                 [0.01, 0.1], method='analytic')
+    assert_frame_equal(expected, significance)
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from pandas.testing import assert_frame_equal
+
+from empirical_copula import empirical_joint_pmf
+from empirical_copula.instrumentation import ComputationCancelled, cancellable
+from empirical_copula.service import CopulaService, dataset_fingerprint
+from empirical_copula.significance import significance_from_bootstrap
+
+from tests.conftest import random_samples
+
+
+def _random_samples(n, random_state):
+    samples = random_samples(n, random_state)
+    samples['v3'] = random_state.uniform(size=n)
+    return samples
+
+
+def test_dataset_fingerprint():
+    samples = _random_samples(100, np.random.RandomState(101))
+
+    assert dataset_fingerprint(samples) == dataset_fingerprint(samples.copy())
+    assert (dataset_fingerprint(samples)
+            == dataset_fingerprint(samples.set_index(samples.index + 10)))
+    changed = samples.copy()
+    changed.loc[3, 'v2'] = 400
+    assert dataset_fingerprint(samples) != dataset_fingerprint(changed)
+    assert (dataset_fingerprint(samples[['v1', 'v2']])
+            != dataset_fingerprint(samples[['v2', 'v1']]))
+
+
+def test_service_results():
+    samples = _random_samples(1000, np.random.RandomState(102))
+
+    async def main():
+        async with CopulaService(max_workers=2) as service:
+            return await asyncio.gather(
+                service.empirical_joint_pmf(samples, columns=['v1', 'v2']),
+                service.significance_from_bootstrap(samples, 500, [0.01, 0.1],
+                                                    columns=['v1', 'v2'], random_state=0),
+            )
+
+    (_, _, empirical_pmf), (_, _, significance) = asyncio.run(main())
+
+    _, _, expected = empirical_joint_pmf(samples[['v1', 'v2']])
+    assert_frame_equal(expected, empirical_pmf)
+    _, _, expected = significance_from_bootstrap(samples[['v1', 'v2']], 500, [0.01, 0.1],
+                                                 random_state=0)
+    assert_frame_equal(expected, significance)
+
+
+def test_service_coalesces_identical_requests():
+    samples = _random_samples(1000, np.random.RandomState(103))
+    calls = []
+    release = threading.Event()
+
+    def compute(samples, n_bootstraps, random_state=None):
+        calls.append(n_bootstraps)
+        release.wait(10)
+        return significance_from_bootstrap(samples, n_bootstraps, [0.01],
+                                           random_state=random_state)
+
+    async def main():
+        async with CopulaService(max_workers=4) as service:
+            requests = [
+                service.run(compute, samples.copy(), 100, columns=['v1', 'v2'], random_state=0)
+                for _ in range(5)
+            ]
+            requests.append(service.run(compute, samples, 200, columns=['v1', 'v2'],
+                                        random_state=0))
+            requests.append(service.run(compute, samples, 100, columns=['v1', 'v2'],
+                                        random_state=0, dataset_key='other'))
+            tasks = [asyncio.ensure_future(request) for request in requests]
+            # Only the requests arriving while the computation runs are merged
+            while sum(computation.n_waiters for computation in service._running.values()) < 7:
+                await asyncio.sleep(0.01)
+            release.set()
+            return await asyncio.gather(*tasks)
+
+    results = asyncio.run(main())
+
+    assert sorted(calls) == [100, 100, 200]
+    assert all(result is results[0] for result in results[:5])
+    assert results[5] is not results[0]
+
+
+def test_service_cancels_abandoned_computations():
+    samples = _random_samples(1000, np.random.RandomState(104))
+    started = threading.Event()
+    outcomes = []
+
+    def compute(samples, n_bootstraps):
+        started.set()
+        try:
+            return significance_from_bootstrap(samples, n_bootstraps, [0.01], random_state=0)
+        except ComputationCancelled:
+            outcomes.append('cancelled')
+            raise
+
+    async def main():
+        async with CopulaService(max_workers=1) as service:
+            long_request = asyncio.ensure_future(
+                service.run(compute, samples, 10**7, columns=['v1', 'v2']))
+            other_request = asyncio.ensure_future(
+                service.run(compute, samples, 10**7, columns=['v1', 'v2']))
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, started.wait, 10)
+            while sum(computation.n_waiters for computation in service._running.values()) < 2:
+                await asyncio.sleep(0.01)
+            # The computation continues as long as a request waits for it
+            long_request.cancel()
+            await asyncio.sleep(0.1)
+            assert not outcomes
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(other_request, 0.1)
+            # The worker is free for the next requests
+            _, _, significance = await asyncio.wait_for(
+                service.significance_from_bootstrap(samples, 100, [0.01],
+                                                    columns=['v1', 'v2'], random_state=0), 30)
+            return significance
+
+    significance = asyncio.run(main())
+
+    assert outcomes == ['cancelled']
+    _, _, expected = significance_from_bootstrap(samples[['v1', 'v2']], 100, [0.01],
+                                                 random_state=0)
+    assert_frame_equal(expected, significance)
+
+
+def test_service_close_cancels_queued_computations():
+    samples = _random_samples(100, np.random.RandomState(106))
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute(samples, name):
+        calls.append(name)
+        started.set()
+        release.wait(10)
+        return name
+
+    async def main():
+        service = CopulaService(max_workers=1)
+        # An explicit dataset key submits the requests in order, without hashing the samples
+        running = asyncio.ensure_future(service.run(compute, samples, 'running',
+                                                    dataset_key='samples'))
+        queued = asyncio.ensure_future(service.run(compute, samples, 'queued',
+                                                   dataset_key='samples'))
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, started.wait, 10)
+        while len(service._running) < 2:
+            await asyncio.sleep(0.01)
+        service.close()
+        release.set()
+        for request in [running, queued]:
+            with pytest.raises(asyncio.CancelledError):
+                await request
+        await loop.run_in_executor(None, service.executor.shutdown)
+
+    asyncio.run(main())
+
+    assert calls == ['running']
+
+
+def test_cancellable():
+    samples = _random_samples(1000, np.random.RandomState(105))[['v1', 'v2']]
+    event = threading.Event()
+
+    with cancellable(event):
+        significance_from_bootstrap(samples, 100, [0.01], random_state=0)
+        event.set()
+        with pytest.raises(ComputationCancelled):
+            significance_from_bootstrap(samples, 100, [0.01], random_state=0)
+    # Only the computations in the block are cancelled
+    significance_from_bootstrap(samples, 100, [0.01], random_state=0)
@@ -1,10 +1,24 @@
+import tracemalloc
+
 import numpy as np
 import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal, assert_series_equal
+from scipy.stats import binom, hypergeom
 
-from empirical_copula.significance import _bootstrap_independently, significance_from_bootstrap
+from empirical_copula import joint_counts, significance
+from empirical_copula.significance import (
+    _bootstrap_independently,
+    pvalues_from_bootstrap,
+    pvalues_from_counts,
+    significance_from_bootstrap,
+    significance_from_bootstrap_pairs,
+    significance_from_pvalues,
+)
 
 
-def test__bootstrap_independently():
+@pytest.mark.parametrize('engine', ['vectorized', 'loop'])
+def test__bootstrap_independently(engine):
     samples = pd.DataFrame(
         data=[['A', 'A', 'B', 'B', 'B'],
               [100, 200, 100, 300, 500]],
@@ -13,7 +27,8 @@ def test__bootstrap_independently():
 
     random_state = np.random.RandomState(98)
     n_bootstraps = 3
-    bootstrap_counts = _bootstrap_independently(samples, n_bootstraps, random_state=random_state)
+    bootstrap_counts = _bootstrap_independently(samples, n_bootstraps, random_state=random_state,
+                                                engine=engine)
 
     # There should be no missing values, those are counts of 0
     assert (~bootstrap_counts.isnull()).all().all()
@@ -21,6 +36,119 @@ def test__bootstrap_independently():
     # only <= because we cannot guarantee that all values are bootstrapped
     # 2: A, B;  4: 100, 200, 300, 500
     assert bootstrap_counts.shape[0] <= 2 * 4
+    # Each bootstrapped dataset has as many samples as the original one
+    assert (bootstrap_counts.sum(axis=0) == samples.shape[0]).all()
+
+
+def test_significance_from_bootstrap_invalid_engine():
+    samples = pd.DataFrame({'a': ['A', 'A', 'B', 'B'], 'b': [100, 200, 100, 300]})
+
+    for method in ['analytic', 'permutation']:
+        with pytest.raises(ValueError, match="'loop' engine"):
+            significance_from_bootstrap(samples, 10, [0.1], engine='loop', method=method)
+    with pytest.raises(ValueError, match='Unknown bootstrap engine'):
+        significance_from_bootstrap(samples, 10, [0.1], engine='gpu')
+    with pytest.raises(ValueError, match="require the 'vectorized' engine"):
+        significance_from_bootstrap(samples, 10, [0.1], engine='loop', sparse=True)
+
+
+def test__bootstrap_independently_vectorized_marginals():
+    samples = pd.DataFrame(
+        data=[['A', 'A', 'B', 'B', 'B'],
+              [100, 200, 100, 300, 500]],
+        index=['a', 'b']
+    ).T
+
+    random_state = np.random.RandomState(98)
+    n_bootstraps = 20000
+    bootstrap_counts = _bootstrap_independently(samples, n_bootstraps, random_state=random_state)
+
+    # All combinations of values are present, even if never bootstrapped
+    assert bootstrap_counts.shape == (2 * 4, n_bootstraps)
+    # The average counts are those expected under independence
+    mean_counts = bootstrap_counts.mean(axis=1)
+    expected = 5 * (2 / 5) * (2 / 5)
+    assert abs(mean_counts.loc[(100, 'A')] - expected) < 0.05
+    expected = 5 * (3 / 5) * (1 / 5)
+    assert abs(mean_counts.loc[(500, 'B')] - expected) < 0.05
+
+
+def test__bootstrap_independently_n_jobs(monkeypatch):
+    # Use small blocks to have more blocks than workers
+    monkeypatch.setattr(significance, '_BLOCK_SIZE', 7)
+    samples = pd.DataFrame(
+        data=[['A', 'A', 'B', 'B', 'B'],
+              [100, 200, 100, 300, 500]],
+        index=['a', 'b']
+    ).T
+
+    n_bootstraps = 100
+    serial = _bootstrap_independently(samples, n_bootstraps, random_state=42)
+    # Same seed, same result
+    assert_frame_equal(_bootstrap_independently(samples, n_bootstraps, random_state=42), serial)
+    # The result does not depend on the number of workers
+    for n_jobs in [2, 3, -1]:
+        parallel = _bootstrap_independently(samples, n_bootstraps, random_state=42, n_jobs=n_jobs)
+        assert_frame_equal(parallel, serial)
+    # Seeding from a SeedSequence is reproducible as well
+    assert_frame_equal(
+        _bootstrap_independently(samples, n_bootstraps, random_state=np.random.SeedSequence(42)),
+        _bootstrap_independently(samples, n_bootstraps, random_state=np.random.SeedSequence(42),
+                                 n_jobs=4),
+    )
+
+
+@pytest.mark.parametrize('n_jobs', [0, -2])
+def test_invalid_n_jobs(n_jobs):
+    samples = pd.DataFrame({'a': ['A', 'A', 'B', 'B'], 'b': [100, 200, 100, 300]})
+
+    with pytest.raises(ValueError, match='n_jobs must be'):
+        _bootstrap_independently(samples, 10, random_state=42, n_jobs=n_jobs)
+    with pytest.raises(ValueError, match='n_jobs must be'):
+        significance_from_bootstrap(samples, 10, [0.1], random_state=42, n_jobs=n_jobs)
+
+
+def test__counts_histogram_quantiles():
+    random_state = np.random.RandomState(7)
+    counts = random_state.poisson(lam=[1.0, 20.0, 300.0], size=(500, 3))
+    levels = [0.01, 0.1, 0, 0.5, 0.9, 0.99, 1]
+
+    histogram = significance._CountsHistogram(n_cells=3)
+    # Blocks with increasing range of counts, the histogram has to be extended
+    for block in [counts[:10], counts[10:11], counts[11:]]:
+        histogram.update(block)
+
+    expected = pd.DataFrame(counts).quantile(levels).values.T
+    np.testing.assert_allclose(histogram.quantile(levels), expected)
+    # Each cell only stores the bins of its own range of counts
+    ranges = counts.max(axis=0) - counts.min(axis=0) + 1
+    assert histogram.histogram.shape == (ranges.sum(),)
+
+
+@pytest.mark.parametrize('n_jobs', [None, 3])
+def test_low_memory_significance(monkeypatch, n_jobs):
+    monkeypatch.setattr(significance, '_BLOCK_SIZE', 16)
+    random_state = np.random.RandomState(123)
+    samples = pd.DataFrame({
+        'x': random_state.choice(['A', 'B', 'C', 'D'], p=[0.4, 0.3, 0.2, 0.1], size=200),
+        'y': random_state.choice([1, 2, 3], p=[0.5, 0.3, 0.2], size=200),
+    })
+    quantile_levels = [0.01, 0.1, 0, 0.9, 0.99]
+
+    samples_counts = joint_counts(samples)
+    quantiles = significance._multinomial_quantiles(
+        samples_counts, 300, quantile_levels, random_state=5, n_jobs=n_jobs, low_memory=True)
+    bootstrap_counts = _bootstrap_independently(samples, 300, random_state=5)
+    expected = significance._align_quantiles(
+        samples_counts, bootstrap_counts.quantile(quantile_levels, axis=1).T)
+    np.testing.assert_allclose(quantiles, expected)
+
+    _, _, significance_low_memory = significance_from_bootstrap(
+        samples, n_bootstraps=300, p_levels_low=[0.01, 0.1], random_state=5, n_jobs=n_jobs,
+        low_memory=True)
+    _, _, expected_significance = significance_from_bootstrap(
+        samples, n_bootstraps=300, p_levels_low=[0.01, 0.1], random_state=5)
+    assert_frame_equal(significance_low_memory, expected_significance)
 
 
 def test_significance_from_bootstrap():
@@ -35,7 +163,7 @@ def test_significance_from_bootstrap():
 
     random_state = np.random.RandomState(98)
     quantile_levels, quantile_levels_labels, significance = significance_from_bootstrap(
-        samples, n_bootstraps=100, p_levels_low=[0.01, 0.1], random_state=random_state)
+        samples, n_bootstraps=10000, p_levels_low=[0.01, 0.1], random_state=random_state)
 
     assert quantile_levels == [0.01, 0.1, 0, 0.9, 0.99]
     assert quantile_levels_labels == [-2, -1, 0, 1, 2]
@@ -60,3 +188,303 @@ def test_low_significance_from_bootstrap():
     assert quantile_levels == [0.01, 0.1, 0, 0.9, 0.99]
     assert quantile_levels_labels == [-2, -1, 0, 1, 2]
     assert significance.loc['A', 300] == -2
+
+
+def test_analytic_significance():
+    # Same dataset as in `test_significance_from_bootstrap`
+    samples = pd.DataFrame(
+        data=[['A', 'A', 'A', 'A', 'B', 'B', 'B', 'B', 'C', 'C', 'C', 'C'],
+              [100, 100, 100, 100, 200, 300, 200, 300, 200, 300, 200, 300]],
+        index=['c', 'd']
+    ).T
+
+    quantile_levels, quantile_levels_labels, significance = significance_from_bootstrap(
+        samples, n_bootstraps=None, p_levels_low=[0.01, 0.1], method='analytic')
+
+    assert quantile_levels == [0.01, 0.1, 0, 0.9, 0.99]
+    assert quantile_levels_labels == [-2, -1, 0, 1, 2]
+    assert significance.loc['A', 100] == 2
+    assert significance.loc['A', 300] == -2
+    assert (significance.loc['B':'C', 200:300] == 0).all().all()
+
+
+def test_analytic_significance_matches_bootstrap():
+    random_state = np.random.RandomState(123)
+    samples = pd.DataFrame({
+        'x': random_state.choice(['A', 'B', 'C', 'D'], p=[0.4, 0.3, 0.2, 0.1], size=200),
+        'y': random_state.choice([1, 2, 3], p=[0.5, 0.3, 0.2], size=200),
+    })
+
+    _, _, significance_bootstrap = significance_from_bootstrap(
+        samples, n_bootstraps=20000, p_levels_low=[0.01, 0.1], random_state=random_state)
+    _, _, significance_analytic = significance_from_bootstrap(
+        samples, n_bootstraps=None, p_levels_low=[0.01, 0.1], method='analytic')
+
+    assert_frame_equal(significance_analytic, significance_bootstrap)
+
+
+def test__binomial_distributions():
+    cells_pmf = np.array([0.001, 0.2, 0.5, 1.0])
+    distributions = significance._binomial_distributions(300, cells_pmf)
+
+    histogram = distributions.draw_histogram(np.random.default_rng(3), 20000)
+
+    assert histogram.n_bootstraps == 20000
+    quantiles = histogram.quantile([0.01, 0.5, 0.99])
+    expected = binom.ppf([[0.01, 0.5, 0.99]], 300, cells_pmf[:, None])
+    np.testing.assert_allclose(quantiles, expected, atol=1)
+    np.testing.assert_array_equal(quantiles[3], [300, 300, 300])
+
+
+@pytest.mark.parametrize('method', ['bootstrap', 'analytic'])
+def test_significance_from_bootstrap_pairs(method):
+    random_state = np.random.RandomState(321)
+    n = 300
+    x = random_state.choice(['A', 'B', 'C'], p=[0.5, 0.3, 0.2], size=n)
+    samples = pd.DataFrame({
+        'x': x,
+        'y': np.where(random_state.uniform(size=n) < 0.5, x, 'D'),
+        'z': random_state.choice([1, 2, 3, 4], size=n),
+    })
+
+    quantile_levels, quantile_levels_labels, significances = significance_from_bootstrap_pairs(
+        samples, n_bootstraps=20000, p_levels_low=[0.01, 0.1], random_state=5, method=method)
+
+    assert quantile_levels == [0.01, 0.1, 0, 0.9, 0.99]
+    assert quantile_levels_labels == [-2, -1, 0, 1, 2]
+    assert list(significances.keys()) == [('x', 'y'), ('x', 'z'), ('y', 'z')]
+    for pair, pair_significance in significances.items():
+        _, _, expected = significance_from_bootstrap(
+            samples[list(pair)], n_bootstraps=None, p_levels_low=[0.01, 0.1], method='analytic')
+        assert_frame_equal(pair_significance, expected)
+
+
+def test_significance_from_bootstrap_pairs_memory(monkeypatch):
+    monkeypatch.setattr(significance, '_MAX_PAIRS_HISTOGRAM_BINS', 50000)
+    random_state = np.random.RandomState(322)
+
+    peaks = []
+    for n_columns in [5, 20]:
+        samples = pd.DataFrame({f'v{i}': random_state.randint(5, size=2000)
+                                for i in range(n_columns)})
+        tracemalloc.start()
+        try:
+            significance_from_bootstrap_pairs(samples, n_bootstraps=200, p_levels_low=[0.01, 0.1],
+                                              random_state=5)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    # The pairs are drawn in batches: 16 times more pairs need much less than 16 times the memory
+    assert peaks[1] < 2 * peaks[0]
+
+
+@pytest.mark.parametrize('method', ['bootstrap', 'analytic'])
+def test_sparse_significance(method):
+    random_state = np.random.RandomState(123)
+    samples = pd.DataFrame({
+        'x': random_state.choice(['A', 'B', 'C', 'D'], p=[0.4, 0.3, 0.2, 0.1], size=200),
+        'y': random_state.choice([1, 2, 3], p=[0.5, 0.3, 0.2], size=200),
+    })
+    # Remove a combination of values
+    samples = samples[(samples['x'] != 'D') | (samples['y'] != 3)]
+
+    quantile_levels, quantile_levels_labels, significance = significance_from_bootstrap(
+        samples, n_bootstraps=20000, p_levels_low=[0.01, 0.1], random_state=3, method=method,
+        sparse=True)
+    _, _, expected = significance_from_bootstrap(
+        samples, n_bootstraps=None, p_levels_low=[0.01, 0.1], method='analytic')
+
+    assert quantile_levels == [0.01, 0.1, 0, 0.9, 0.99]
+    assert isinstance(significance, pd.Series)
+    assert ('D', 3) not in significance.index
+    assert significance.shape[0] == 4 * 3 - 1
+    expected = expected.stack().loc[significance.index]
+    assert_series_equal(significance, expected, check_names=False)
+
+
+@pytest.mark.parametrize('method', ['bootstrap', 'analytic', 'permutation'])
+def test_weighted_significance(method):
+    random_state = np.random.RandomState(123)
+    samples = pd.DataFrame({
+        'x': random_state.choice(['A', 'B', 'C'], p=[0.5, 0.3, 0.2], size=200),
+        'y': random_state.choice([1, 2, 3], p=[0.5, 0.3, 0.2], size=200),
+    })
+    aggregated = samples.groupby(['x', 'y']).size().rename('count').reset_index()
+
+    _, _, expected = significance_from_bootstrap(
+        samples, n_bootstraps=500, p_levels_low=[0.01, 0.1], random_state=8, method=method)
+    _, _, weighted = significance_from_bootstrap(
+        aggregated, n_bootstraps=500, p_levels_low=[0.01, 0.1], random_state=8, method=method,
+        weights='count')
+    assert_frame_equal(weighted, expected)
+
+    # Directly from a table of counts
+    _, _, from_counts = significance.significance_from_counts(
+        joint_counts(samples), n_bootstraps=500, p_levels_low=[0.01, 0.1], random_state=8,
+        method=method)
+    assert_frame_equal(from_counts, expected)
+
+
+def test__hypergeometric_distributions():
+    row_counts = np.array([5, 1, 3, 2, 900])
+    column_counts = np.array([1, 6, 4, 0, 900])
+    distributions = significance._hypergeometric_distributions(1000, row_counts, column_counts)
+
+    histogram = significance._CountsHistogram(5)
+    for start in range(0, 20000, 5000):
+        histogram.merge(distributions.draw_histogram(np.random.default_rng(start), 5000))
+
+    assert histogram.n_bootstraps == 20000
+    # The counts of each cell are hypergeometric
+    for cell in range(5):
+        expected = hypergeom(1000, column_counts[cell], row_counts[cell])
+        values = histogram.offset[cell] + np.arange(histogram.width[cell])
+        bins = histogram.histogram[histogram.starts[cell]:histogram.starts[cell + 1]]
+        assert values[bins > 0].min() >= expected.support()[0]
+        assert values[bins > 0].max() <= expected.support()[1]
+        mean = (values * bins).sum() / 20000
+        variance = ((values - mean) ** 2 * bins).sum() / 20000
+        np.testing.assert_allclose(mean, expected.mean(), atol=0.05 * (1 + expected.std()))
+        np.testing.assert_allclose(variance, expected.var(), rtol=0.05, atol=0.01)
+    # Taking cells keeps their histograms
+    taken = histogram.take(np.array([4, 1]))
+    np.testing.assert_allclose(taken.quantile([0.1, 0.5]), histogram.quantile([0.1, 0.5])[[4, 1]])
+
+
+def test_permutation_significance():
+    random_state = np.random.RandomState(124)
+    samples = pd.DataFrame({
+        'x': random_state.choice(['A', 'B', 'C', 'D'], p=[0.4, 0.3, 0.2, 0.1], size=60),
+        'y': random_state.choice([1, 2, 3], p=[0.5, 0.3, 0.2], size=60),
+    })
+
+    quantile_levels, quantile_levels_labels, permutation = significance_from_bootstrap(
+        samples, n_bootstraps=5000, p_levels_low=[0.01, 0.1], random_state=3,
+        method='permutation')
+    _, _, sparse_permutation = significance_from_bootstrap(
+        samples, n_bootstraps=5000, p_levels_low=[0.01, 0.1], random_state=3,
+        method='permutation', sparse=True)
+    _, _, bootstrap = significance_from_bootstrap(
+        samples, n_bootstraps=5000, p_levels_low=[0.01, 0.1], random_state=3)
+
+    assert quantile_levels == [0.01, 0.1, 0, 0.9, 0.99]
+    assert permutation.shape == bootstrap.shape
+    # Keeping the marginals exactly gives a narrower null distribution, hence more
+    # significant combinations of values
+    assert (permutation.abs() >= bootstrap.abs()).all().all()
+    # The same permutations are drawn for sparse counts
+    expected = permutation.stack().loc[sparse_permutation.index]
+    assert_series_equal(sparse_permutation, expected, check_names=False)
+
+
+def test_sparse_permutation_draws_observed_cells(monkeypatch):
+    random_state = np.random.RandomState(126)
+    samples = pd.DataFrame({
+        'x': random_state.randint(500, size=300),
+        'y': random_state.randint(500, size=300),
+    })
+    sizes = []
+    hypergeometric_distributions = significance._hypergeometric_distributions
+
+    def wrapper(n_samples, row_counts, column_counts, **kwargs):
+        sizes.append(len(row_counts))
+        return hypergeometric_distributions(n_samples, row_counts, column_counts, **kwargs)
+
+    monkeypatch.setattr(significance, '_hypergeometric_distributions', wrapper)
+    _, _, sparse_permutation = significance_from_bootstrap(
+        samples, n_bootstraps=200, p_levels_low=[0.01, 0.1], random_state=3,
+        method='permutation', sparse=True)
+
+    # Memory scales with the observed combinations of values, not with all of them
+    assert sizes == [len(sparse_permutation)]
+
+
+def test__counts_histogram_tail_counts():
+    random_state = np.random.RandomState(5)
+    counts = random_state.poisson([2.0, 10.0, 30.0], size=(500, 3))
+    histogram = significance._CountsHistogram(3)
+    for start in range(0, 500, 100):
+        histogram.update(counts[start:start + 100])
+
+    values = np.array([-1, 10, 100])
+    n_below, n_above = histogram.tail_counts(values)
+    np.testing.assert_array_equal(n_below, (counts <= values).sum(axis=0))
+    np.testing.assert_array_equal(n_above, (counts >= values).sum(axis=0))
+
+
+@pytest.mark.parametrize('method', ['bootstrap', 'permutation'])
+def test_pvalues_from_bootstrap(method):
+    random_state = np.random.RandomState(125)
+    samples = pd.DataFrame({
+        'x': random_state.choice(['A', 'B', 'C', 'D'], p=[0.4, 0.3, 0.2, 0.1], size=200),
+        'y': random_state.choice([1, 2, 3], p=[0.5, 0.3, 0.2], size=200),
+    })
+    counts = joint_counts(samples)
+
+    analytic = pvalues_from_bootstrap(samples, None, method='analytic')
+    n, p = 200, (counts.loc['A'].sum() / 200) * (counts[1].sum() / 200)
+    observed = counts.loc['A', 1]
+    expected = min(1, 2 * min(binom.cdf(observed, n, p), binom.sf(observed - 1, n, p)))
+    assert analytic.loc['A', 1] == pytest.approx(expected)
+    assert ((analytic > 0) & (analytic <= 1)).all().all()
+
+    pvalues = pvalues_from_bootstrap(samples, 20000, random_state=6, method=method)
+    assert pvalues.shape == analytic.shape
+    if method == 'bootstrap':
+        np.testing.assert_allclose(pvalues.values, analytic.values, atol=0.02)
+    sparse_pvalues = pvalues_from_bootstrap(samples, 20000, random_state=6, method=method,
+                                            sparse=True)
+    if method == 'permutation':
+        # The same permutations are drawn for sparse counts
+        assert_series_equal(sparse_pvalues, pvalues.stack().loc[sparse_pvalues.index],
+                            check_names=False)
+
+
+def test_significance_from_pvalues():
+    # Same dataset as in `test_significance_from_bootstrap`
+    samples = pd.DataFrame(
+        data=[['A', 'A', 'A', 'A', 'B', 'B', 'B', 'B', 'C', 'C', 'C', 'C'],
+              [100, 100, 100, 100, 200, 300, 200, 300, 200, 300, 200, 300]],
+        index=['c', 'd']
+    ).T
+    counts = joint_counts(samples)
+
+    pvalues = pvalues_from_counts(counts, None, method='analytic')
+    assert pvalues.loc['A', 100] == pytest.approx(2 * binom.sf(3, 12, 1 / 9))
+    quantile_levels, quantile_levels_labels, significance = significance_from_pvalues(
+        pvalues, counts, p_levels_low=[0.01, 0.1])
+
+    assert quantile_levels == [0.01, 0.1, 0, 0.9, 0.99]
+    assert quantile_levels_labels == [-2, -1, 0, 1, 2]
+    assert significance.loc['A', 100] == 1
+    assert (significance.drop(index='A') == 0).all().all()
+    # Other levels do not require computing the p-values again
+    _, _, significance = significance_from_pvalues(pvalues, counts, p_levels_low=[0.01, 0.03])
+    assert (significance == 0).all().all()
+
+    # Up to the discreteness of the counts, the labels are those of the quantiles
+    random_state = np.random.RandomState(126)
+    x = random_state.choice(['A', 'B', 'C'], p=[0.5, 0.3, 0.2], size=1000)
+    samples = pd.DataFrame({
+        'x': x,
+        'y': np.where(random_state.uniform(size=1000) < 0.2, x, 'D'),
+    })
+    counts = joint_counts(samples)
+    pvalues = pvalues_from_counts(counts, None, method='analytic')
+    _, _, significance = significance_from_pvalues(pvalues, counts, p_levels_low=[0.01, 0.1])
+    _, _, expected = significance_from_bootstrap(samples, None, [0.01, 0.1], method='analytic')
+    assert_frame_equal(significance, expected)
+
+
+def test_pvalues_fdr_adjustment():
+    pvalues = np.array([0.01, 0.04, np.nan, 0.03, 0.5])
+    adjusted = significance._adjust_fdr(pvalues)
+    np.testing.assert_allclose(adjusted, [0.04, 0.16 / 3, np.nan, 0.16 / 3, 0.5])
+
+    samples = pd.DataFrame({'x': ['A', 'A', 'B', 'B', 'B'], 'y': [1, 2, 1, 1, 2]})
+    raw = pvalues_from_bootstrap(samples, None, method='analytic')
+    fdr = pvalues_from_bootstrap(samples, None, method='analytic', adjust='fdr_bh')
+    assert (fdr.values >= raw.values).all()
+    with pytest.raises(ValueError):
+        pvalues_from_bootstrap(samples, None, method='analytic', adjust='bonferroni')
@@ -0,0 +1,158 @@
+import pickle
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal, assert_series_equal
+
+from empirical_copula import empirical_joint_pmf, empirical_joint_pmf_details, joint_counts
+from empirical_copula.significance import significance_from_counts
+from empirical_copula.streaming import CopulaAccumulator, SlidingWindowCopula
+
+from tests.conftest import random_samples
+
+
+def _assert_details_equal(details, expected):
+    pmf1, pmf2, empirical_pmf, others = details
+    expected_pmf1, expected_pmf2, expected_empirical_pmf, expected_others = expected
+    # Re-order according to the pmf indices to be order-agnostic
+    assert_series_equal(expected_pmf1.loc[pmf1.index], pmf1)
+    assert_series_equal(expected_pmf2.loc[pmf2.index], pmf2)
+    assert_frame_equal(expected_empirical_pmf, empirical_pmf)
+    for key in ['counts', 'joint_freq', 'ind_pmf']:
+        assert_frame_equal(expected_others[key].loc[others[key].index, others[key].columns],
+                           others[key])
+
+
+def test_accumulator_update():
+    samples = random_samples(1000, np.random.RandomState(3))
+    # Missing values are ignored as in `empirical_joint_pmf_details`
+    samples.loc[[3, 50, 70], 'v1'] = np.nan
+    samples.loc[[50, 80], 'v2'] = np.nan
+
+    accumulator = CopulaAccumulator()
+    for start in range(0, samples.shape[0], 150):
+        accumulator.update(samples.iloc[start:start + 150])
+
+    _assert_details_equal(accumulator.result_details(), empirical_joint_pmf_details(samples))
+
+
+def test_accumulator_merge():
+    samples = random_samples(1000, np.random.RandomState(4))
+    # Values appear in different orders in the two parts
+    part1 = samples.iloc[:400].sort_values('v1', ascending=False)
+    part2 = samples.iloc[400:]
+
+    accumulator1 = CopulaAccumulator()
+    accumulator1.update(part1)
+    accumulator2 = CopulaAccumulator()
+    accumulator2.update(part2)
+    # Accumulators can be shipped between processes
+    accumulator2 = pickle.loads(pickle.dumps(accumulator2))
+    merged = CopulaAccumulator().merge(accumulator1).merge(accumulator2)
+
+    _assert_details_equal(merged.result_details(), empirical_joint_pmf_details(samples))
+    pmf1, pmf2, empirical_pmf = merged.result()
+    assert_frame_equal(empirical_pmf, empirical_joint_pmf_details(samples)[2])
+
+
+def test_accumulator_tied_marginals():
+    # Values with the same counts, appearing in a different order than sorted
+    samples = pd.DataFrame({
+        'v1': ['D', 'B', 'C', 'A', 'B', 'D', 'C', 'A', 'E', 'E'],
+        'v2': [300, 100, 200, 300, 200, 100, 100, 200, 300, 400],
+    })
+
+    accumulator = CopulaAccumulator()
+    for start in range(0, samples.shape[0], 3):
+        accumulator.update(samples.iloc[start:start + 3])
+
+    # The ties are in the same order, as well as all the values
+    expected_pmf1, expected_pmf2, expected_empirical_pmf = empirical_joint_pmf(samples)
+    pmf1, pmf2, empirical_pmf = accumulator.result()
+    assert_series_equal(expected_pmf1, pmf1)
+    assert_series_equal(expected_pmf2, pmf2)
+    assert_frame_equal(expected_empirical_pmf, empirical_pmf)
+
+
+def test_accumulator_object_values():
+    samples = pd.DataFrame({
+        'v1': np.array([1, 2, None, 3, 1, 2], dtype=object),
+        'v2': ['a', 'b', 'a', 'c', 'b', 'b'],
+    })
+
+    accumulator = CopulaAccumulator()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', FutureWarning)
+        for start in range(0, samples.shape[0], 3):
+            accumulator.update(samples.iloc[start:start + 3])
+
+    _assert_details_equal(accumulator.result_details(), empirical_joint_pmf_details(samples))
+
+
+def test_sliding_window_max_rows():
+    samples = random_samples(1000, np.random.RandomState(5))
+    samples.loc[[620, 700], 'v1'] = np.nan
+
+    window = SlidingWindowCopula(max_rows=300)
+    for start in range(0, samples.shape[0], 70):
+        window.update(samples.iloc[start:start + 70])
+        stop = min(start + 70, samples.shape[0])
+        assert window.n_rows == min(stop, 300)
+        _assert_details_equal(window.result_details(),
+                              empirical_joint_pmf_details(samples.iloc[max(0, stop - 300):stop]))
+
+
+def test_sliding_window_max_age():
+    samples = random_samples(500, np.random.RandomState(6))
+    times = pd.Series(pd.date_range('2022-01-01', periods=500, freq='1min'))
+
+    window = SlidingWindowCopula(max_age=pd.Timedelta('60min'))
+    for start in range(0, samples.shape[0], 45):
+        window.update(samples.iloc[start:start + 45], timestamps=times.iloc[start:start + 45])
+    # Samples at or before 60 minutes from the last one are expired
+    _assert_details_equal(window.result_details(), empirical_joint_pmf_details(samples.iloc[-60:]))
+
+    window.expire(now=times.iloc[-1] + pd.Timedelta('30min'))
+    assert window.n_rows == 30
+    _assert_details_equal(window.result_details(), empirical_joint_pmf_details(samples.iloc[-30:]))
+
+    with pytest.raises(ValueError):
+        window.update(samples.iloc[:10])
+
+
+def test_accumulator_significance():
+    samples = random_samples(1000, np.random.RandomState(7))
+
+    window = SlidingWindowCopula(max_rows=400)
+    window.update(samples)
+    quantile_levels, _, significance = window.significance([0.01, 0.1])
+
+    expected = significance_from_counts(joint_counts(samples.iloc[-400:]), None, [0.01, 0.1],
+                                        method='analytic')
+    assert quantile_levels == expected[0]
+    assert_frame_equal(expected[2], significance)
+
+
+def test_sliding_window_forgets_expired_values():
+    random_state = np.random.RandomState(8)
+    window = SlidingWindowCopula(max_rows=500)
+    chunks = []
+    for i in range(300):
+        # The values drift over time, so that most of them fall out of the window
+        samples = pd.DataFrame({
+            'v1': random_state.randint(10 * i, 10 * i + 10, size=100),
+            'v2': random_state.randint(10 * i, 10 * i + 10, size=100).astype(float),
+        })
+        samples.loc[:5, 'v2'] = np.nan
+        window.update(samples)
+        chunks.append(samples)
+        recent = pd.concat(chunks[-5:], ignore_index=True)
+        if i % 50 == 0:
+            _assert_details_equal(window.result_details(), empirical_joint_pmf_details(recent))
+
+    # Only the values in the window, and at most as many expired ones, are kept
+    assert len(window._categories1) <= 2 * 60 + 64
+    assert len(window._joint) <= 2 * 500 + 64
+    _assert_details_equal(window.result_details(), empirical_joint_pmf_details(recent))